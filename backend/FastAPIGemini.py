@@ -1,19 +1,45 @@
 #!/usr/bin/env python3
 
-from fastapi import FastAPI
+from typing import Optional
+
+from fastapi import APIRouter, FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from google import genai
 from dotenv import load_dotenv
+import asyncio
 import os
 import json
+import time
+
+import metrics
+from metrics import ERRORS, GEMINI_SECONDS, GEMINI_TTFT, PROMPT_TOKENS, RESPONSE_TOKENS
+from prompts import build_prompt
+from coalesce import Debouncer, SingleFlight, StreamFlight
+from llm_backends import get_backend
+from strategy_cache import StrategyCache, situation_key
+from strategy_engine import recommend
+from tracing import span
 
 # --- Load environment variables ---
 load_dotenv()
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 
-# --- Gemini client ---
-client = genai.Client(api_key=GEMINI_API_KEY)
+# --- Model backend (LLM_BACKEND=gemini, or stub for offline load tests; see llm_backends.py) ---
+llm = get_backend()
+
+# --- Gemini call limits ---
+GEMINI_CONCURRENCY = int(os.getenv("GEMINI_CONCURRENCY", "4"))  # calls in flight at once
+GEMINI_TIMEOUT = float(os.getenv("GEMINI_TIMEOUT", "20"))       # seconds per attempt
+GEMINI_RETRIES = int(os.getenv("GEMINI_RETRIES", "2"))          # extra attempts after a failure
+gemini_slots = asyncio.Semaphore(GEMINI_CONCURRENCY)
+
+# --- Strategy cache (repeated situations skip the model) ---
+strategy_cache = StrategyCache()
+
+# --- Coalescing (identical in-flight situations share a call; STRATEGY_DEBOUNCE_MS per session) ---
+flights = SingleFlight()
+debouncer = Debouncer()
+stream_flights = StreamFlight()  # the same for /api/strategy/stream
 
 # --- FastAPI setup ---
 app = FastAPI()
@@ -32,76 +58,281 @@ class StrategyInput(BaseModel):
 
 class StrategyResponse(BaseModel):
     strategy: str
+    local: Optional[dict] = None   # strategy_engine.recommend() for the same inputs
+    enriched: bool = True          # False: strategy is the local summary, not model text
+    error: Optional[str] = None
 
 
-# --- Prompt builder ---
 # --- Prompt builder ---
 def build_f1_prompt(req: StrategyInput) -> str:
-    # Convert incoming dicts to readable JSON strings
-    overtake_info = json.dumps(req.overtake_data, indent=2)
-    tire_info = json.dumps(req.tire_data, indent=2)
-    pit_info = json.dumps(req.pit_data, indent=2)
-
-    # Extract key metrics for easier reading in prompt
-    cliff_risk = "High ⚠️" if req.tire_data.get("risk_detected") else "Low ✅"
-    undercut_success = req.pit_data.get("relevant_matches", 0)
-    total_matches = req.pit_data.get("total_matches", 0)
-    undercut_recommendation = (
-        f"Recommended: Pit (Undercut successful in {undercut_success}/{total_matches} scenarios)"
-        if undercut_success < total_matches
-        else "Safe: No similar scenarios where rival is yet to pit"
-    )
-
-    # Build the final prompt
-    prompt = f"""
-**ROLE:** You are an elite Formula 1 Chief Race Strategist.
-
-**CURRENT AGGREGATED RACE SITUATION:**
-- Overtake probabilities per driver:
-{overtake_info}
-
-- Tire cliff risk (aggregated):
-{tire_info} → Risk Level: {cliff_risk}
-
-- Pit stop insights (Undercut/Overcut potential):
-{pit_info} → {undercut_recommendation}
-
-**TASK:**
-Based on the aggregated data above, provide a concise 1–2 line strategic recommendation for the current situation considering:
-- Immediate tire cliff risk
-- Pit strategy (overcut/undercut)
-- Optimal next move
-"""
+    # Decision-relevant fields only, within PROMPT_TOKEN_BUDGET (see prompts.py)
+    with span("strategy.prompt") as s:
+        prompt, tokens = build_prompt(req.overtake_data, req.tire_data, req.pit_data)
+        s.set(tokens=tokens)
+    PROMPT_TOKENS.inc(tokens, source="estimate")
+    print(f"🧮 Strategy prompt: ~{tokens} tokens ({len(prompt)} chars)")
     return prompt
 
 
+def log_usage(response):
+    """Log and count the exact token usage Gemini reports for one call."""
+    usage = getattr(response, "usage_metadata", None)
+    if usage is None:
+        return
+    prompt_tokens = getattr(usage, "prompt_token_count", None) or 0
+    response_tokens = getattr(usage, "candidates_token_count", None) or 0
+    PROMPT_TOKENS.inc(prompt_tokens, source="gemini")
+    RESPONSE_TOKENS.inc(response_tokens)
+    print(f"🧮 Gemini usage: {prompt_tokens} prompt + {response_tokens} response tokens")
+
+
 
 # --- Gemini call ---
 async def call_gemini(prompt: str) -> str:
+    """Non-blocking Gemini call: at most GEMINI_CONCURRENCY in flight, each
+    attempt bounded by GEMINI_TIMEOUT, failures retried GEMINI_RETRIES times
+    with backoff. Cancelling the caller cancels the request."""
+    error = None
+    for attempt in range(GEMINI_RETRIES + 1):
+        if attempt:
+            await asyncio.sleep(0.5 * 2 ** (attempt - 1))
+        started = time.perf_counter()
+        try:
+            async with gemini_slots:
+                started = time.perf_counter()  # latency excludes waiting for a slot
+                with span("gemini.call", backend=llm.name, attempt=attempt + 1):
+                    response = await asyncio.wait_for(
+                        llm.generate(prompt),
+                        timeout=GEMINI_TIMEOUT,
+                    )
+            GEMINI_SECONDS.observe(time.perf_counter() - started, outcome="ok")
+            log_usage(response)
+            return getattr(response, "text", None) or "No response from model."
+        except asyncio.TimeoutError:
+            error = f"Gemini timed out after {GEMINI_TIMEOUT:g}s"
+            GEMINI_SECONDS.observe(time.perf_counter() - started, outcome="timeout")
+        except Exception as e:
+            error = e
+            GEMINI_SECONDS.observe(time.perf_counter() - started, outcome="error")
+        print(f"❌ Gemini API error (attempt {attempt + 1}/{GEMINI_RETRIES + 1}): {error}")
+        ERRORS.inc(where="gemini")
+    return f"Error: {error}"
+
+
+async def stream_gemini(prompt: str):
+    """Yield Gemini text chunks as they arrive, under the same slot and timeout
+    limits as call_gemini. Failures before the first chunk are retried; after
+    that the error is raised to the caller. Per-chunk waits are bounded by
+    GEMINI_TIMEOUT.
+
+    A separate task reads the model stream into a buffer, so the slot is freed
+    as soon as the model finishes, however slowly the caller consumes chunks."""
+    chunks = asyncio.Queue()
+    reader = asyncio.ensure_future(read_gemini_stream(prompt, chunks))
     try:
-        response = client.models.generate_content(
-            model="gemini-2.0-flash",
-            contents=prompt
-        )
-        return getattr(response, "text", None) or "No response from model."
-    except Exception as e:
-        print(f"❌ Gemini API error: {e}")
-        return f"Error: {e}"
+        while True:
+            text = await chunks.get()
+            if text is None:
+                await reader  # raises the stream's error, if any
+                return
+            yield text
+    finally:
+        reader.cancel()  # consumer went away: stop the model stream too
+
+
+async def read_gemini_stream(prompt: str, chunks: asyncio.Queue):
+    """Put stream_gemini's text chunks on chunks while holding a slot; None marks the end."""
+    try:
+        for attempt in range(GEMINI_RETRIES + 1):
+            if attempt:
+                await asyncio.sleep(0.5 * 2 ** (attempt - 1))
+            first = True
+            async with gemini_slots:
+                with span("gemini.stream", backend=llm.name, attempt=attempt + 1) as trace:
+                    started = time.perf_counter()
+                    try:
+                        stream = await asyncio.wait_for(
+                            llm.stream(prompt),
+                            timeout=GEMINI_TIMEOUT,
+                        )
+                        iterator = stream.__aiter__()
+                        chunk = None
+                        while True:
+                            try:
+                                chunk = await asyncio.wait_for(iterator.__anext__(), timeout=GEMINI_TIMEOUT)
+                            except StopAsyncIteration:
+                                break
+                            text = getattr(chunk, "text", None)
+                            if not text:
+                                continue
+                            if first:
+                                GEMINI_TTFT.observe(time.perf_counter() - started)
+                                trace.set(ttft_ms=round((time.perf_counter() - started) * 1000, 1))
+                                first = False
+                            chunks.put_nowait(text)
+                        GEMINI_SECONDS.observe(time.perf_counter() - started, outcome="ok")
+                        log_usage(chunk)  # the last chunk carries the totals
+                        return
+                    except Exception as e:
+                        error = f"Gemini timed out after {GEMINI_TIMEOUT:g}s" if isinstance(e, asyncio.TimeoutError) else e
+                        GEMINI_SECONDS.observe(time.perf_counter() - started,
+                                               outcome="timeout" if isinstance(e, asyncio.TimeoutError) else "error")
+                        print(f"❌ Gemini stream error (attempt {attempt + 1}/{GEMINI_RETRIES + 1}): {error}")
+                        ERRORS.inc(where="gemini")
+                        if not first or attempt == GEMINI_RETRIES:
+                            raise RuntimeError(str(error)) from e
+    finally:
+        chunks.put_nowait(None)
+
+
+async def until_disconnect(request: Request, coro):
+    """Run coro, cancelling it if the HTTP client goes away first (returns None then)."""
+    task = asyncio.ensure_future(coro)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=0.5)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                print("🔌 Strategy client disconnected, cancelling Gemini call")
+                task.cancel()
+                return None
+    finally:
+        if not task.done():
+            task.cancel()
 
 
 # --- Endpoint ---
-@app.post("/api/strategy", response_model=StrategyResponse)
-async def generate_strategy(req: StrategyInput):
-    prompt = build_f1_prompt(req)
-    print(prompt)
-    result = await call_gemini(prompt)
-    return StrategyResponse(strategy=result)
+router = APIRouter()
+
+
+async def model_strategy(key, req: StrategyInput) -> str:
+    """Gemini text for one situation: cache first, identical calls coalesced, successes cached."""
+    with span("strategy.model") as trace:
+        cached = strategy_cache.peek(key)
+        trace.set(cached=cached is not None)
+        if cached is not None:
+            return cached
+        prompt = build_f1_prompt(req)
+        result = await flights.run(key, lambda: call_gemini(prompt))
+        if not result.startswith("Error:"):
+            strategy_cache.put(key, result)
+        return result
+
+
+async def model_stream(key, prompt):
+    """stream_gemini() for one situation, caching the full text once it completes."""
+    parts = []
+    async for text in stream_gemini(prompt):
+        parts.append(text)
+        yield text
+    strategy_cache.put(key, "".join(parts) or "No response from model.")
+
+
+# Background enrichments started by ?wait=0 requests (kept referenced until done)
+enrichments = set()
+
+
+@router.post("/api/strategy", response_model=StrategyResponse)
+async def generate_strategy(req: StrategyInput, request: Request, wait: bool = True):
+    """Local recommendation plus Gemini text.
+
+    wait=0 answers immediately with the local recommendation and generates the
+    model text in the background; the next request for the same situation gets
+    it from the cache. When the model fails, the local summary is returned.
+    """
+    local = recommend(req.overtake_data, req.tire_data, req.pit_data)
+    key = situation_key(req.overtake_data, req.tire_data, req.pit_data)
+    cached = strategy_cache.get(key)
+    if cached is not None:
+        return StrategyResponse(strategy=cached, local=local)
+
+    async def generate():
+        # Runs once per debounce window with the session's latest situation
+        return await model_strategy(key, req)
+
+    session = request.headers.get("x-session-id") or (request.client.host if request.client else "?")
+    if not wait:
+        task = asyncio.ensure_future(debouncer.submit(session, generate))
+        enrichments.add(task)
+        task.add_done_callback(enrichments.discard)
+        return StrategyResponse(strategy=local["summary"], local=local, enriched=False)
+
+    result = await until_disconnect(request, debouncer.submit(session, generate))
+    if result is None:
+        return StrategyResponse(strategy="Cancelled: client disconnected.", local=local, enriched=False)
+    if result.startswith("Error:"):
+        return StrategyResponse(strategy=local["summary"], local=local, enriched=False, error=result)
+    return StrategyResponse(strategy=result, local=local)
+
+
+@router.post("/api/strategy/local")
+async def local_strategy(req: StrategyInput):
+    """Only the local rule-based recommendation (no model call)."""
+    return recommend(req.overtake_data, req.tire_data, req.pit_data)
+
+
+def sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@router.post("/api/strategy/stream")
+async def stream_strategy(req: StrategyInput):
+    """Server-Sent Events: a "local" event with the local recommendation, then
+    "token" events ({"text"}) as the model writes, then one "done" event
+    ({"strategy", "cached", "ttft_ms", "total_ms"}) or "error"."""
+    key = situation_key(req.overtake_data, req.tire_data, req.pit_data)
+
+    async def events():
+        started = time.perf_counter()
+        yield sse("local", recommend(req.overtake_data, req.tire_data, req.pit_data))
+        cached = strategy_cache.get(key)
+        if cached is not None:
+            yield sse("token", {"text": cached})
+            elapsed = round((time.perf_counter() - started) * 1000, 2)
+            yield sse("done", {"strategy": cached, "cached": True, "ttft_ms": elapsed, "total_ms": elapsed})
+            return
+
+        prompt = build_f1_prompt(req)
+        parts, ttft = [], None
+        try:
+            # Identical concurrent streams share one model call. Starlette cancels this
+            # generator if the client disconnects; the model stream stops when no reader is left
+            async for text in stream_flights.stream(key, lambda: model_stream(key, prompt)):
+                if ttft is None:
+                    ttft = round((time.perf_counter() - started) * 1000, 2)
+                parts.append(text)
+                yield sse("token", {"text": text})
+        except Exception as e:
+            yield sse("error", {"error": str(e), "partial": "".join(parts)})
+            return
+        strategy = "".join(parts) or "No response from model."
+        yield sse("done", {"strategy": strategy, "cached": False, "ttft_ms": ttft,
+                           "total_ms": round((time.perf_counter() - started) * 1000, 2)})
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+
+@router.get("/api/strategy/cache")
+async def strategy_cache_stats():
+    """Strategy cache size, hit rate and evictions."""
+    return strategy_cache.stats()
+
+
+@router.get("/api/strategy/coalescing")
+async def strategy_coalescing_stats():
+    """Model calls started vs. requests that joined an in-flight call or were superseded."""
+    return {"single_flight": flights.stats(), "debounce": debouncer.stats(), "streams": stream_flights.stats()}
 
 
 # --- Health check ---
-@app.get("/health")
+@router.get("/health")
 async def health():
-    return {"ok": True}
+    return {"ok": True, "llm_backend": llm.name}
+
+
+app.include_router(router)
+app.include_router(metrics.router)
 
 
 # --- Run Server ---
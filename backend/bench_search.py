@@ -0,0 +1,128 @@
+# bench_search.py
+"""Recall / latency benchmark for the vector search backends.
+
+Example:
+    python bench_search.py --feed cliff --sizes 1000 100000 1000000 --backends exact ivf standin
+"""
+import argparse
+import random
+import time
+import tracemalloc
+import numpy as np
+
+from feeds import FEEDS, jitter_vector
+from vector_search import ExactIndex, IVFIndex, LatencyStandIn, load_feed_index, synthetic_corpus
+
+CLIFF_THRESHOLD = 0.85  # cliff_stream risk threshold
+
+
+# ---------- Workload ----------
+def build_queries(feed, n_queries, seed=0):
+    """Query vectors jittered around BASE_VECTORS, like the stream servers produce."""
+    rng = random.Random(seed)
+    base = FEEDS[feed]["base_vector"]
+    return np.array([jitter_vector(feed, base, rng) for _ in range(n_queries)], dtype=np.float32)
+
+
+def build_backend(name, vectors, args):
+    if name == "exact":
+        return ExactIndex(vectors)
+    if name == "ivf":
+        return IVFIndex(vectors, nlist=args.nlist, nprobe=args.nprobe)
+    if name == "standin":
+        return LatencyStandIn(ExactIndex(vectors), latency_ms=args.latency_ms)
+    raise ValueError(f"Unknown backend: {name}")
+
+
+# ---------- Measurement ----------
+def run_queries(backend, queries, top_k):
+    """Run queries one at a time (like a stream tick) and collect per-query latency."""
+    latencies = []
+    scores, positions = [], []
+    for q in queries:
+        start = time.perf_counter()
+        s, p = backend.search(q[None, :], top_k)
+        latencies.append(time.perf_counter() - start)
+        scores.append(s[0])
+        positions.append(p[0])
+    return np.array(latencies), scores, positions
+
+
+def recall_at_k(truth, found):
+    hits = [len(set(t.tolist()) & set(f.tolist())) / max(len(t), 1) for t, f in zip(truth, found)]
+    return float(np.mean(hits))
+
+
+def bench_size(feed, vectors, queries, args):
+    top_k = args.k or FEEDS[feed]["top_k"]
+    exact = ExactIndex(vectors)
+    _, truth_scores, truth = run_queries(exact, queries, top_k)
+    truth_risk = [s[0] > CLIFF_THRESHOLD if len(s) else False for s in truth_scores]
+
+    rows = []
+    for name in args.backends:
+        tracemalloc.start()
+        start = time.perf_counter()
+        backend = exact if name == "exact" else build_backend(name, vectors, args)
+        build_s = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        latencies, scores, found = run_queries(backend, queries, top_k)
+        risk = [s[0] > CLIFF_THRESHOLD if len(s) else False for s in scores]
+        rows.append({
+            "backend": name,
+            "n": len(vectors),
+            "build_s": build_s,
+            "mem_mb": max(getattr(backend, "nbytes", 0), peak) / 1e6,
+            "qps": len(queries) / latencies.sum(),
+            "p50_ms": np.percentile(latencies, 50) * 1000,
+            "p99_ms": np.percentile(latencies, 99) * 1000,
+            "recall": recall_at_k(truth, found),
+            "risk_agree": float(np.mean([a == b for a, b in zip(risk, truth_risk)])),
+        })
+    return rows
+
+
+def print_rows(rows):
+    header = f"{'backend':<10}{'n':>11}{'build s':>9}{'mem MB':>9}{'QPS':>10}{'p50 ms':>9}{'p99 ms':>9}{'recall':>8}{'risk=':>7}"
+    print(header)
+    print("-" * len(header))
+    for r in rows:
+        print(f"{r['backend']:<10}{r['n']:>11,}{r['build_s']:>9.2f}{r['mem_mb']:>9.1f}{r['qps']:>10.1f}"
+              f"{r['p50_ms']:>9.3f}{r['p99_ms']:>9.3f}{r['recall']:>8.3f}{r['risk_agree']:>7.2f}")
+
+
+# ---------- Main ----------
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark vector search backends.")
+    parser.add_argument("--feed", choices=sorted(FEEDS), default="cliff")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000, 1_000_000])
+    parser.add_argument("--backends", nargs="+", default=["exact", "ivf", "standin"])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=None, help="top_k (defaults to the feed's stream value)")
+    parser.add_argument("--nlist", type=int, default=256)
+    parser.add_argument("--nprobe", type=int, default=8)
+    parser.add_argument("--latency-ms", type=float, default=25.0)
+    parser.add_argument("--real-data", action="store_true",
+                        help="use the combined CSV (single size) instead of synthetic vectors")
+    args = parser.parse_args()
+
+    queries = build_queries(args.feed, args.queries)
+    print(f"\n🏁 Benchmarking '{args.feed}' ({queries.shape[1]}-D, {len(queries)} queries)\n")
+
+    rows = []
+    if args.real_data:
+        vectors = load_feed_index(args.feed).unit
+        rows += bench_size(args.feed, vectors, queries, args)
+    else:
+        for n in args.sizes:
+            print(f"⏱️ n = {n:,}")
+            rows += bench_size(args.feed, synthetic_corpus(args.feed, n), queries, args)
+
+    print()
+    print_rows(rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,271 @@
+# broadcast.py
+"""One producer per feed computing each tick once, fanned out to every WebSocket client."""
+import asyncio
+import json
+import os
+import time
+from collections import deque
+
+from frames import DeltaEncoder, encode
+from metrics import DROPPED_FRAMES, ERRORS, KICKED, SEND_SECONDS, SKIPPED_TICKS, TICK_LATENESS, TICK_SECONDS, connections
+from scheduler import TickScheduler
+from tracing import span
+from workers import get_bus
+
+
+# ---------- Backpressure Settings ----------
+# Frames buffered per client; when full the oldest frame is dropped (latest wins)
+SEND_QUEUE_SIZE = int(os.getenv("SEND_QUEUE_SIZE", "4"))
+# Clients more than this many frames behind the feed are disconnected
+MAX_LAG_FRAMES = int(os.getenv("MAX_LAG_FRAMES", "10"))
+# Load tests: add "tick_at" (wall-clock time the tick was due) to every frame
+STAMP_FRAMES = os.getenv("STAMP_FRAMES", "0") == "1"
+
+
+# ---------- Subscriber ----------
+class Subscriber:
+    """One client's bounded send queue, with lag measured in frames behind the feed."""
+
+    def __init__(self, client, maxsize=SEND_QUEUE_SIZE, path=""):
+        self.client = client
+        self.path = path  # WebSocket path, for metrics
+        self.frames = deque(maxlen=maxsize)  # (seq, text, keyframe)
+        self.ready = asyncio.Event()
+        self.published = 0  # seq of the newest frame offered to this client
+        self.acked = 0      # seq of the last frame fully written to the socket
+        self.sent = 0
+        self.dropped = 0
+        self.kicked = False
+        self.task = None
+
+    @property
+    def lag(self):
+        return self.published - self.acked
+
+    def push(self, payload, keyframe=True, seed=()):
+        """Queue a frame; when full, drop the oldest.
+
+        Deltas are only readable after their keyframe. When the dropped frame
+        is a keyframe, the deltas queued behind it go too. If that empties the
+        queue and payload is a delta, the hub's seed (current keyframe + this
+        delta) is queued instead.
+        """
+        if len(self.frames) == self.frames.maxlen:
+            lost = [self.frames.popleft()]
+            while lost[0][2] and self.frames and not self.frames[0][2]:
+                lost.append(self.frames.popleft())
+            self.dropped += len(lost)
+            DROPPED_FRAMES.inc(len(lost), path=self.path)
+            if lost[0][2] and not self.frames and not keyframe and seed:
+                for i, text in enumerate(seed):
+                    self._append(text, i == 0)
+                return
+        self._append(payload, keyframe)
+
+    def _append(self, payload, keyframe):
+        self.published += 1
+        self.frames.append((self.published, payload, keyframe))
+        self.ready.set()
+        if self.lag > MAX_LAG_FRAMES and not self.kicked:
+            self.kick()
+
+    async def get(self):
+        while not self.frames:
+            self.ready.clear()
+            await self.ready.wait()
+        seq, text, _ = self.frames.popleft()
+        return seq, text
+
+    def ack(self, seq):
+        self.acked = seq
+        self.sent += 1
+
+    def kick(self):
+        """Cancel the client's send loop; serve() turns that into a disconnect."""
+        self.kicked = True
+        KICKED.inc(path=self.path)
+        if self.task is not None:
+            self.task.cancel()
+
+    def stats(self):
+        return {
+            "client": self.client,
+            "queue_depth": len(self.frames),
+            "lag_frames": self.lag,
+            "sent": self.sent,
+            "dropped": self.dropped,
+        }
+
+
+# ---------- Hub ----------
+class BroadcastHub:
+    """Delivers the same pre-serialized frame to every subscriber queue."""
+
+    def __init__(self):
+        self.subscribers = set()
+        self.seed = []  # what a new subscriber receives first (latest keyframe + latest delta)
+
+    def __len__(self):
+        return len(self.subscribers)
+
+    def subscribe(self, client="?", path=""):
+        subscriber = Subscriber(client, path=path)
+        # New clients get the current frame right away instead of waiting a tick
+        for i, payload in enumerate(self.seed):
+            subscriber.push(payload, keyframe=i == 0)
+        self.subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        self.subscribers.discard(subscriber)
+        if not self.subscribers:
+            # Producers skip empty hubs, so the seed would go stale; the next client starts clean
+            self.seed = []
+
+    def publish(self, payload, keyframe=True):
+        self.seed = [payload] if keyframe else self.seed[:1] + [payload]
+        for subscriber in list(self.subscribers):
+            subscriber.push(payload, keyframe, self.seed)
+
+    def stats(self):
+        """Per-client queue depth, lag and drop counters."""
+        return [subscriber.stats() for subscriber in self.subscribers]
+
+
+# ---------- Producer ----------
+class FeedProducer:
+    """Runs compute_frame once per period while anyone is listening.
+
+    Ticks follow a TickScheduler (absolute deadlines, overruns skipped). Each
+    tick is encoded once per (proto, delta) variant that has subscribers; hub
+    is the plain JSON variant the dashboard uses.
+    """
+
+    def __init__(self, name, compute_frame, period):
+        self.name = name
+        self.compute_frame = compute_frame
+        self.scheduler = TickScheduler(period)
+        self.hubs = {("json", False): BroadcastHub()}
+        self.hub = self.hubs[("json", False)]
+        self.deltas = DeltaEncoder()
+        self.relays = []  # (hub, wrap) pairs, e.g. the gateway's /ws/race channel
+        self.refresh_count = 0
+        self.task = None
+        # Multi-worker mode: only the leader worker computes (see workers.py)
+        self.bus = get_bus()
+        if self.bus is not None:
+            self.bus.register(self)
+
+    @property
+    def listeners(self):
+        return sum(len(hub) for hub in self.hubs.values()) + sum(len(hub) for hub, _ in self.relays)
+
+    def hub_for(self, proto, delta):
+        """Hub for one negotiated encoding (see frames.negotiate)."""
+        return self.hubs.setdefault((proto, delta), BroadcastHub())
+
+    def stats(self):
+        return {
+            **({"worker": self.bus.stats()} if self.bus is not None else {}),
+            "ticks": self.scheduler.stats(),
+            "clients": {f"{proto}{'+delta' if delta else ''}": hub.stats() for (proto, delta), hub in self.hubs.items()},
+        }
+
+    def add_relay(self, hub, wrap):
+        """Also publish every frame to another hub, after wrap(text)."""
+        self.relays.append((hub, wrap))
+
+    def ensure_running(self):
+        if self.bus is not None:
+            self.bus.ensure_running()
+            if not self.bus.leader:
+                self.bus.report()  # the leader ticks while any worker has listeners
+                return  # frames arrive from the leader worker
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        self.scheduler.deadline = None  # restart the cadence after an idle spell
+        while self.listeners:
+            skipped = self.scheduler.skipped
+            await self.scheduler.wait()
+            if not self.listeners:
+                break
+            TICK_LATENESS.observe(self.scheduler.lateness[-1], feed=self.name)
+            if self.scheduler.skipped > skipped:
+                SKIPPED_TICKS.inc(self.scheduler.skipped - skipped, feed=self.name)
+            started = time.perf_counter()
+            tick_at = time.time() - self.scheduler.lateness[-1]
+            self.refresh_count += 1
+            try:
+                with span(f"{self.name}.tick", tick=self.refresh_count):
+                    frame = await self.compute_frame(self.refresh_count)
+            except Exception as e:
+                print(f"⚠️ {self.name} tick failed:", e)
+                ERRORS.inc(where=f"{self.name}_tick")
+            else:
+                if STAMP_FRAMES:
+                    frame["tick_at"] = round(tick_at, 6)
+                with span(f"{self.name}.publish", listeners=self.listeners):
+                    self.publish(frame)
+            elapsed = time.perf_counter() - started
+            self.scheduler.record(elapsed)
+            TICK_SECONDS.observe(elapsed, feed=self.name)
+
+    def publish(self, frame):
+        text = json.dumps(frame)
+        self.hub.publish(text)
+        for hub, wrap in self.relays:
+            hub.publish(wrap(text))
+
+        # Delta state advances every tick so keyframe cadence is stable for late joiners
+        is_key, message = self.deltas.update(frame)
+        for (proto, delta), hub in self.hubs.items():
+            if (proto, delta) == ("json", False) or not len(hub):
+                continue
+            try:
+                if delta and not is_key and not hub.seed:
+                    # Hub opened mid-cycle: its clients need the current keyframe first
+                    hub.publish(encode(proto, self.deltas.key_message))
+                hub.publish(encode(proto, message if delta else frame), keyframe=is_key or not delta)
+            except Exception as e:
+                # One encoding failing must not stop the feed for every other client
+                print(f"⚠️ {self.name} {proto}{'+delta' if delta else ''} encode failed:", e)
+                ERRORS.inc(where=f"{self.name}_encode")
+
+
+# ---------- WebSocket Serving ----------
+async def serve(websocket, hub, producers):
+    """Accept a client and forward hub frames to it until it disconnects or falls behind."""
+    await websocket.accept()
+    client = f"{websocket.client.host}:{websocket.client.port}" if websocket.client else "?"
+    path = websocket.url.path
+    subscriber = hub.subscribe(client, path)
+    subscriber.task = asyncio.current_task()
+    connections.setdefault(path, set()).add(subscriber)
+    for producer in producers:
+        producer.ensure_running()
+
+    try:
+        while True:
+            seq, payload = await subscriber.get()
+            with SEND_SECONDS.time(path=path), span("ws.send", path=path):
+                if isinstance(payload, bytes):
+                    await websocket.send_bytes(payload)
+                else:
+                    await websocket.send_text(payload)
+            subscriber.ack(seq)
+    except asyncio.CancelledError:
+        if not subscriber.kicked:
+            raise
+        print(f"🐢 Disconnecting slow client {client}: {subscriber.stats()}")
+        try:
+            await asyncio.wait_for(websocket.close(code=1013), timeout=1)
+        except Exception:
+            pass
+    except Exception as e:
+        print("WebSocket closed:", e)
+        ERRORS.inc(where="websocket")
+    finally:
+        hub.unsubscribe(subscriber)
+        connections[path].discard(subscriber)
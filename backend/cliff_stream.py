@@ -1,20 +1,34 @@
 # server_cliff.py
 import asyncio
-import random
-from fastapi import FastAPI, WebSocket
+from fastapi import APIRouter, FastAPI, WebSocket
 from fastapi.middleware.cors import CORSMiddleware
-from pinecone import Pinecone
 from dotenv import load_dotenv
 import os
 
+from broadcast import FeedProducer, serve
+from feeds import FEEDS, GRID_DRIVERS, jitter_grid
+from frames import negotiate
+from incremental import QueryCache
+import metrics
+from metrics import QUERY_SECONDS
+from replay import get_replay
+from risk_grid import RiskGrid
+from tracing import span
+from vector_search import get_routed_index
+
 load_dotenv()
 
-# ---------- Pinecone Setup ----------
-API_KEY = os.getenv("API_KEY")
-INDEX_NAME = "f1-cliff"
+# ---------- Index Setup ----------
+# SEARCH_BACKEND=pinecone (default) | exact | ivf | standin
+# RACE_TRACK / RACE_SEASONS route queries to the current track's partitions
+index = get_routed_index("cliff")
+
+# Optional precomputed lookup grid (risk_grid.py) answers queries without a search
+grid = RiskGrid.load(os.getenv("CLIFF_GRID")) if os.getenv("CLIFF_GRID") else None
 
-pc = Pinecone(api_key=API_KEY)
-index = pc.Index(INDEX_NAME)
+RISK_THRESHOLD = 0.85
+# matches_found counts similar cliffs among the top 30 records; 1 = existence check (stop at first hit)
+RISK_MATCH_LIMIT = int(os.getenv("RISK_MATCH_LIMIT", "30"))
 
 # ---------- FastAPI Setup ----------
 app = FastAPI()
@@ -26,8 +40,17 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# ---------- Telemetry Source ----------
+# TELEMETRY_SOURCE=replay streams a historical race instead of random jitter
+replay = get_replay()
+
+# Per-driver cached results: under replay only cars whose telemetry moved are re-queried
+cache = QueryCache("cliff", enabled=replay is not None)
+
 # ---------- Car / Drivers ----------
-drivers = ["MY_CAR"]  # can expand to other cars if needed
+# FULL_GRID=1 evaluates all 20 cars each tick instead of only MY_CAR
+FULL_GRID = os.getenv("FULL_GRID", "0") == "1"
+drivers = list(GRID_DRIVERS) if FULL_GRID else ["MY_CAR"]
 
 # Base vector template: TrackNormalized fixed, others will randomize
 BASE_VECTORS = {
@@ -41,63 +64,83 @@ BASE_VECTORS = {
         0.35   # Position
     ]
 }
+BASE_VECTORS.update({driver: FEEDS["cliff"]["base_vector"] for driver in drivers if driver not in BASE_VECTORS})
+BASE_GRID = [BASE_VECTORS[driver] for driver in drivers]  # (n_cars, 7), rows in drivers order
 
 # ---------- Helper Function ----------
-async def query_pinecone(driver, vector):
-    """Query Pinecone and get matches for tire cliff risk."""
-    results = index.query(
-        vector=vector,
-        top_k=30,
-        include_metadata=True
-    )
-    matches = results.get("matches", [])
-    max_score = max(m.get("score", 0) for m in matches) if matches else 0
-    return len(matches), round(max_score, 3), max_score > 0.85
+async def query_pinecone(vectors):
+    """Threshold search for tire cliff risk, all cars in one batch: any historical cliff above RISK_THRESHOLD?"""
+    if grid is not None:
+        answers = [grid.lookup(vector) for vector in vectors]
+        return [(min(round(a.get("matches_found", a["max_similarity"] > RISK_THRESHOLD)), RISK_MATCH_LIMIT),
+                 round(a["max_similarity"], 3), a["max_similarity"] > RISK_THRESHOLD) for a in answers]
+    # Search backends are blocking; keep the event loop free for the other feeds and the API
+    results = await asyncio.to_thread(index.count_above_many, vectors, RISK_THRESHOLD, limit=RISK_MATCH_LIMIT)
+    return [(count, round(best, 3), best > RISK_THRESHOLD) for count, best in results]
+
+# ---------- Tick ----------
+TICK_SECONDS = 2
+
+
+async def compute_frame(refresh_count):
+    """One telemetry tick: update every car's vector, query the index once, build the frame."""
+    response = {}
+
+    # --- Telemetry: replayed race lap (MY_CAR → REPLAY_MY_CAR, full grid = every car) ---
+    if replay is not None:
+        driver_vectors = replay.vectors("cliff", None if FULL_GRID else drivers)
+        names, vectors = list(driver_vectors), list(driver_vectors.values())
+    else:
+        # --- Randomize telemetry vectors: one (n_cars, 7) array update ---
+        names, vectors = drivers, jitter_grid("cliff", BASE_GRID).tolist()
+
+    # --- Query Pinecone for the cars that moved (one batched search) ---
+    lap = replay.served.get("cliff") if replay is not None else None
+    stale = cache.stale(names, vectors, lap)
+    if stale:
+        rows = dict(zip(names, vectors))
+        stale_vectors = [rows[driver] for driver in stale]
+        with QUERY_SECONDS.time(feed="cliff"), span("cliff.query", cars=len(stale_vectors)):
+            results = await query_pinecone(stale_vectors)
+        cache.store(stale, stale_vectors, results, lap)
+
+    for driver, vec in zip(names, vectors):
+        matches_count, max_score, risk_detected = cache.results[driver]
+        response[driver] = {
+            "matches_found": matches_count,
+            "max_similarity": max_score,
+            "risk_detected": risk_detected,
+            "simulated_vector": vec,
+            "fresh": driver in stale  # False = cached result from an earlier tick
+        }
+
+    # --- Add refresh count ---
+    response["refresh_count"] = refresh_count
+    return response
+
 
 # ---------- WebSocket Endpoint ----------
-@app.websocket("/ws/cliff")
+router = APIRouter()
+
+
+# One producer computes each tick; every client receives the same frame
+producer = FeedProducer("cliff", compute_frame, TICK_SECONDS)
+
+
+@router.websocket("/ws/cliff")
 async def cliff_stream(websocket: WebSocket):
-    await websocket.accept()
-    refresh_count = 0
-
-    try:
-        while True:
-            refresh_count += 1
-            driver_vectors = {}
-            response = {}
-
-            # --- Randomize telemetry vector ---
-            for driver in drivers:
-                base = BASE_VECTORS[driver]
-                driver_vectors[driver] = [
-                    base[0],  # TrackNormalized stays constant
-                    min(max(base[1] + random.uniform(-0.05, 0.05), 0), 1),  # Compound
-                    min(max(base[2] + random.uniform(-0.1, 0.1), 0), 1),    # TyreLife
-                    min(max(base[3] + random.uniform(-0.1, 0.1), 0), 1),    # TrackTemp
-                    min(max(base[4] + random.uniform(0, 0.05), 0), 1),      # Rainfall
-                    min(max(base[5] + random.uniform(-0.05, 0.05), 0), 1),  # LapNumber
-                    min(max(base[6] + random.uniform(-0.05, 0.05), 0), 1)   # Position
-                ]
-
-            # --- Query Pinecone ---
-            for driver, vec in driver_vectors.items():
-                matches_count, max_score, risk_detected = await query_pinecone(driver, vec)
-                response[driver] = {
-                    "matches_found": matches_count,
-                    "max_similarity": max_score,
-                    "risk_detected": risk_detected,
-                    "simulated_vector": vec
-                }
-
-            # --- Add refresh count and send JSON ---
-            response["refresh_count"] = refresh_count
-            await websocket.send_json(response)
-
-            # Wait 10 seconds before next telemetry update
-            await asyncio.sleep(2)
-
-    except Exception as e:
-        print("WebSocket closed:", e)
+    # ?proto=json|msgpack|binary&delta=1 (plain JSON by default)
+    await serve(websocket, producer.hub_for(*negotiate(websocket)), [producer])
+
+
+@router.get("/ws/cliff/stats")
+async def stream_stats():
+    """Tick timing, per-client queue depth, lag and drop counters, and query reuse."""
+    return {**producer.stats(), "recompute": cache.stats()}
+
+
+app.include_router(router)
+app.include_router(metrics.router)
 
 # ---------- Run Server ----------
 if __name__ == "__main__":
@@ -0,0 +1,160 @@
+# coalesce.py
+"""Fewer redundant strategy calls: single-flight coalescing and per-session debouncing.
+
+SingleFlight: concurrent requests for the same situation key share one
+in-flight generation. It is cancelled only when every waiter has gone away.
+
+StreamFlight: the same for token streams (SSE). Readers of one key share one
+model stream. A reader joining mid-stream first gets the chunks generated so
+far, then follows live.
+
+Debouncer: the first request from a session opens a STRATEGY_DEBOUNCE_MS
+window. When the window closes, only the latest situation posted in it is
+generated, and every request from that window receives that newest answer.
+The window does not slide, so a chatty dashboard still gets an answer every
+window. 0 disables debouncing.
+"""
+import asyncio
+import os
+
+from metrics import STRATEGY_COALESCED
+
+STRATEGY_DEBOUNCE_MS = float(os.getenv("STRATEGY_DEBOUNCE_MS", "0"))
+
+
+class SingleFlight:
+    def __init__(self):
+        self.inflight = {}  # key → [task, waiters]
+        self.started = 0
+        self.coalesced = 0
+
+    async def run(self, key, factory):
+        """Await factory() for key, joining the identical call already in flight if any."""
+        entry = self.inflight.get(key)
+        if entry is None:
+            task = asyncio.ensure_future(factory())
+            entry = self.inflight[key] = [task, 0]
+            task.add_done_callback(lambda _: self.inflight.pop(key, None))
+            self.started += 1
+        else:
+            self.coalesced += 1
+            STRATEGY_COALESCED.inc(how="single_flight")
+
+        entry[1] += 1
+        try:
+            return await asyncio.shield(entry[0])
+        except asyncio.CancelledError:
+            if entry[1] == 1:
+                entry[0].cancel()  # last waiter left
+            raise
+        finally:
+            entry[1] -= 1
+
+    def stats(self):
+        return {"in_flight": len(self.inflight), "started": self.started, "coalesced": self.coalesced}
+
+
+class SharedStream:
+    """One model stream, buffered so any number of readers can follow it."""
+
+    def __init__(self, chunks):
+        self.chunks = []
+        self.finished = False
+        self.error = None
+        self.readers = 0
+        self.changed = asyncio.Event()  # replaced after every chunk; readers wait on the one they saw
+        self.task = asyncio.ensure_future(self._pump(chunks))
+
+    async def _pump(self, chunks):
+        try:
+            async for text in chunks:
+                self.chunks.append(text)
+                self._notify()
+        except Exception as e:
+            self.error = e
+        finally:
+            self.finished = True
+            self._notify()
+
+    def _notify(self):
+        changed, self.changed = self.changed, asyncio.Event()
+        changed.set()
+
+
+class StreamFlight:
+    def __init__(self):
+        self.inflight = {}  # key → SharedStream
+        self.started = 0
+        self.coalesced = 0
+
+    async def stream(self, key, factory):
+        """Yield the chunks of factory() (an async iterator) for key, sharing one in-flight stream."""
+        shared = self.inflight.get(key)
+        if shared is None:
+            shared = self.inflight[key] = SharedStream(factory())
+            shared.task.add_done_callback(lambda _: self.inflight.pop(key, None))
+            self.started += 1
+        else:
+            self.coalesced += 1
+            STRATEGY_COALESCED.inc(how="single_flight")
+
+        shared.readers += 1
+        try:
+            seen = 0
+            while True:
+                changed = shared.changed
+                while seen < len(shared.chunks):
+                    seen += 1
+                    yield shared.chunks[seen - 1]
+                if shared.finished:
+                    if shared.error is not None:
+                        raise shared.error
+                    return
+                await changed.wait()
+        finally:
+            shared.readers -= 1
+            if not shared.readers and not shared.finished:
+                shared.task.cancel()  # last reader left
+
+    def stats(self):
+        return {"in_flight": len(self.inflight), "started": self.started, "coalesced": self.coalesced}
+
+
+class Debouncer:
+    def __init__(self, window_ms=STRATEGY_DEBOUNCE_MS):
+        self.window = window_ms / 1000
+        self.windows = {}  # session → {"latest": generate, "answer": Future}
+        self.flushes = set()  # pending _flush tasks, referenced until done
+        self.superseded = 0
+
+    async def submit(self, session, generate):
+        """Await generate() for the latest request of this session's window."""
+        if self.window <= 0:
+            return await generate()
+        window = self.windows.get(session)
+        if window is None:
+            answer = asyncio.get_running_loop().create_future()
+            # Retrieve the outcome even if every waiter has gone, so a failure is not reported as unhandled
+            answer.add_done_callback(lambda f: f.cancelled() or f.exception())
+            window = self.windows[session] = {"latest": generate, "answer": answer}
+            task = asyncio.ensure_future(self._flush(session, window))
+            self.flushes.add(task)
+            task.add_done_callback(self.flushes.discard)
+        else:
+            window["latest"] = generate
+            self.superseded += 1
+            STRATEGY_COALESCED.inc(how="debounce")
+        return await asyncio.shield(window["answer"])
+
+    async def _flush(self, session, window):
+        await asyncio.sleep(self.window)
+        self.windows.pop(session, None)  # later requests open a new window
+        try:
+            window["answer"].set_result(await window["latest"]())
+        except BaseException as e:
+            window["answer"].set_exception(e)
+            if isinstance(e, asyncio.CancelledError):
+                raise
+
+    def stats(self):
+        return {"window_ms": self.window * 1000, "open_windows": len(self.windows), "superseded": self.superseded}
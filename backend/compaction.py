@@ -0,0 +1,125 @@
+# compaction.py
+"""Near-duplicate merging for the upload path: one weighted representative per epsilon cell.
+
+Example (measure the effect before uploading):
+    python compaction.py --feed overtake --eps 0.02
+"""
+import argparse
+import random
+import numpy as np
+
+from feeds import FEEDS, jitter_vector
+
+# Exact-match columns per feed: records are only merged within the same group.
+# Year keeps every merged record in its own season's partition (PARTITION_BY_TRACK).
+GROUP_COLS = {
+    "cliff": ["TrackName", "Year", "Compound"],
+    "cuts": ["TrackName", "Year", "NewTireCompound", "Rival_Pitted_Lap"],
+    "overtake": ["TrackName", "Year", "Compound"],
+}
+
+
+# ---------- Compaction ----------
+def compact(df, feature_cols, eps, group_cols=("TrackName",)):
+    """Merge rows whose features fall in the same eps-wide cell (per dimension).
+
+    The representative is the cell mean. Weight holds the number of merged
+    records and Drivers a "VER:3|HAM:1" summary. LapTimeLoss is averaged and
+    every other column keeps its first value.
+    """
+    if eps <= 0 or df.empty:
+        return df
+
+    work = df.reset_index(drop=True).copy()
+    cells = np.floor(work[feature_cols].fillna(0).to_numpy() / eps).astype(np.int64)
+    cell_cols = [f"_cell{i}" for i in range(len(feature_cols))]
+    for i, col in enumerate(cell_cols):
+        work[col] = cells[:, i]
+
+    grouped = work.groupby(list(group_cols) + cell_cols, sort=False, dropna=False)
+    how = {col: "first" for col in df.columns if col not in group_cols}
+    for col in feature_cols:
+        if col not in group_cols:
+            how[col] = "mean"
+    if "LapTimeLoss" in df.columns:
+        how["LapTimeLoss"] = "mean"
+
+    merged = grouped.agg(how)
+    merged["Weight"] = grouped.size()
+    if "Driver" in df.columns:
+        merged["Driver"] = grouped["Driver"].agg(lambda s: s.value_counts().index[0])
+        merged["Drivers"] = grouped["Driver"].agg(
+            lambda s: "|".join(f"{d}:{n}" for d, n in s.value_counts().items())
+        )
+    merged = merged.reset_index().drop(columns=cell_cols)
+    return merged[list(df.columns) + [c for c in ("Weight", "Drivers") if c in merged.columns]]
+
+
+# ---------- Weighted Aggregation ----------
+def driver_weights(metadata):
+    """{driver: merged record count} for one match's metadata."""
+    drivers = metadata.get("Drivers")
+    if drivers:
+        pairs = (item.rsplit(":", 1) for item in str(drivers).split("|"))
+        return {d: int(n) for d, n in pairs}
+    if metadata.get("Driver"):
+        return {metadata["Driver"]: int(metadata.get("Weight", 1))}
+    return {}
+
+
+def match_weight(match, driver=None):
+    """How many original records a match stands for (optionally only this driver's)."""
+    metadata = match.get("metadata", {}) or {}
+    if driver is None:
+        return int(metadata.get("Weight", 1))
+    return driver_weights(metadata).get(driver, 0)
+
+
+def top_k_fractions(weights, top_k):
+    """Share of each ranked match that falls inside the first top_k original records.
+
+    A top-k over compacted vectors covers at least top_k records; counting only
+    the first top_k keeps aggregates comparable to the uncompacted index.
+    """
+    weights = np.asarray(weights, dtype=np.float32)
+    before = np.cumsum(weights, axis=-1) - weights
+    used = np.clip(top_k - before, 0, weights)
+    return np.divide(used, weights, out=np.zeros_like(weights), where=weights > 0)
+
+
+# ---------- Main ----------
+def main():
+    from risk_grid import aggregate
+    from vector_search import ExactIndex, load_combined, metadata_columns
+
+    parser = argparse.ArgumentParser(description="Measure index shrink and answer drift from compaction.")
+    parser.add_argument("--feed", choices=sorted(FEEDS), default="overtake")
+    parser.add_argument("--eps", type=float, default=0.02)
+    parser.add_argument("--queries", type=int, default=1000)
+    args = parser.parse_args()
+
+    spec = FEEDS[args.feed]
+    original = load_combined(args.feed)
+    compacted = compact(original, spec["feature_cols"], args.eps, GROUP_COLS[args.feed])
+
+    def build(df):
+        return ExactIndex(df[spec["feature_cols"]].fillna(0).values,
+                          df[metadata_columns(args.feed, df)].to_dict(orient="records"),
+                          weights=df["Weight"].values if "Weight" in df.columns else None)
+
+    rng = random.Random(0)
+    queries = np.array([jitter_vector(args.feed, spec["base_vector"], rng) for _ in range(args.queries)],
+                       dtype=np.float32)
+    names, before = aggregate(args.feed, build(original), queries)
+    names_after, after = aggregate(args.feed, build(compacted), queries)
+    after = after[:, [names_after.index(n) for n in names]]
+
+    diff = np.abs(np.round(after) - before)
+    print(f"🗜️ {args.feed}: {len(original)} → {len(compacted)} vectors "
+          f"({len(compacted) / max(len(original), 1):.1%} of original, eps={args.eps})")
+    print(f"📏 Answer drift over {args.queries} stream-shaped queries: "
+          f"max {diff.max():.3f}, mean {diff.mean():.4f}")
+
+
+if __name__ == "__main__":
+    main()
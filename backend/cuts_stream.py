@@ -1,22 +1,33 @@
 
 # server_cuts.py
 import asyncio
-import random
-from fastapi import FastAPI, WebSocket
+from fastapi import APIRouter, FastAPI, WebSocket
 from fastapi.middleware.cors import CORSMiddleware
-from pinecone import Pinecone
 from dotenv import load_dotenv
 import os
 
+from broadcast import FeedProducer, serve
+from compaction import match_weight, top_k_fractions
+from feeds import FEEDS, GRID_DRIVERS, jitter_grid
+from frames import negotiate
+from incremental import QueryCache
+import metrics
+from metrics import QUERY_SECONDS
+from replay import get_replay
+from risk_grid import RiskGrid
+from tracing import span
+from vector_search import get_routed_index
+
 load_dotenv()
 
-# ---------- Pinecone Setup ----------
-API_KEY = os.getenv("API_KEY")
-INDEX_NAME = "f1-cuts"
-NUM_TRACKS = 60  # for normalizing lap numbers
+# ---------- Index Setup ----------
+# SEARCH_BACKEND=pinecone (default) | exact | ivf | standin
+# RACE_TRACK / RACE_SEASONS route queries to the current track's partitions
+index = get_routed_index("cuts")
 
-pc = Pinecone(api_key=API_KEY)
-index = pc.Index(INDEX_NAME)
+# Optional precomputed lookup grid (risk_grid.py) answers queries without a search
+grid = RiskGrid.load(os.getenv("CUTS_GRID")) if os.getenv("CUTS_GRID") else None
+NUM_TRACKS = 60  # for normalizing lap numbers
 
 # ---------- FastAPI Setup ----------
 app = FastAPI()
@@ -28,8 +39,17 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# ---------- Telemetry Source ----------
+# TELEMETRY_SOURCE=replay streams a historical race instead of random jitter
+replay = get_replay()
+
+# Per-driver cached results: under replay only cars whose telemetry moved are re-queried
+cache = QueryCache("cuts", name="undercuts", enabled=replay is not None)
+
 # ---------- Car / Drivers ----------
-drivers = ["MY_CAR"]  # can expand to other cars
+# FULL_GRID=1 evaluates all 20 cars each tick instead of only MY_CAR
+FULL_GRID = os.getenv("FULL_GRID", "0") == "1"
+drivers = list(GRID_DRIVERS) if FULL_GRID else ["MY_CAR"]
 
 # Base vector template: TrackNormalized fixed, others will randomize
 BASE_VECTORS = {
@@ -45,70 +65,101 @@ BASE_VECTORS = {
         0.0        # Rainfall
     ]
 }
+BASE_VECTORS.update({driver: FEEDS["cuts"]["base_vector"] for driver in drivers if driver not in BASE_VECTORS})
+BASE_GRID = [BASE_VECTORS[driver] for driver in drivers]  # (n_cars, 9), rows in drivers order
 
 # ---------- Helper Function ----------
-async def query_pinecone(driver, vector):
-    """Query Pinecone and get relevant undercut matches."""
-    results = index.query(
-        vector=vector,
-        top_k=10,
-        include_metadata=True
-    )
-    matches = results.get("matches", [])
-
+def count_undercuts(vector, matches):
+    """(total, relevant) undercut matches for one car."""
     # Filter matches where rival hasn’t pitted yet (normalized)
     relevant_matches = [
         m for m in matches
         if (m.get("metadata", {}).get("Rival_Pitted_Lap", 0) / NUM_TRACKS) > vector[1]
     ]
 
-    return len(matches), len(relevant_matches), matches
+    # Compacted vectors count once per merged record, up to top_k records
+    weights = [match_weight(m) for m in matches]
+    used = [w * f for w, f in zip(weights, top_k_fractions(weights, 10))]
+    total = round(sum(used))
+    relevant = round(sum(u for m, u in zip(matches, used) if m in relevant_matches))
+    return total, relevant
+
+
+async def query_pinecone(vectors):
+    """Query Pinecone once for all cars and get each car's relevant undercut matches."""
+    if grid is not None:
+        answers = [grid.lookup(vector) for vector in vectors]
+        return [(round(a["total_matches"]), round(a["relevant_matches"]), []) for a in answers]
+
+    # Search backends are blocking; keep the event loop free for the other feeds and the API
+    results = await asyncio.to_thread(index.query_many, vectors, top_k=10, include_metadata=True)
+    return [
+        (*count_undercuts(vector, result.get("matches", [])), result.get("matches", []))
+        for vector, result in zip(vectors, results)
+    ]
+
+# ---------- Tick ----------
+TICK_SECONDS = 3
+
+
+async def compute_frame(refresh_count):
+    """One telemetry tick: update every car's vector, query the index once, build the frame."""
+    response = {}
+
+    # --- Telemetry: replayed race lap (MY_CAR → REPLAY_MY_CAR, full grid = every car) ---
+    if replay is not None:
+        driver_vectors = replay.vectors("cuts", None if FULL_GRID else drivers)
+        names, vectors = list(driver_vectors), list(driver_vectors.values())
+    else:
+        # --- Randomize telemetry vectors: one (n_cars, 9) array update ---
+        names, vectors = drivers, jitter_grid("cuts", BASE_GRID).tolist()
+
+    # --- Query Pinecone for the cars that moved (one batched search) and build response ---
+    lap = replay.served.get("cuts") if replay is not None else None
+    stale = cache.stale(names, vectors, lap)
+    if stale:
+        rows = dict(zip(names, vectors))
+        stale_vectors = [rows[driver] for driver in stale]
+        with QUERY_SECONDS.time(feed="undercuts"), span("undercuts.query", cars=len(stale_vectors)):
+            results = await query_pinecone(stale_vectors)
+        cache.store(stale, stale_vectors, results, lap)
+
+    for driver, vec in zip(names, vectors):
+        total_matches, relevant_matches_count, matches_list = cache.results[driver]
+        response[driver] = {
+            "total_matches": total_matches,
+            "relevant_matches": relevant_matches_count,
+            "simulated_vector": vec,
+            "fresh": driver in stale  # False = cached result from an earlier tick
+        }
+
+    # --- Add refresh count ---
+    response["refresh_count"] = refresh_count
+    return response
+
 
 # ---------- WebSocket Endpoint ----------
-@app.websocket("/ws/undercuts")
+router = APIRouter()
+
+
+# One producer computes each tick; every client receives the same frame
+producer = FeedProducer("undercuts", compute_frame, TICK_SECONDS)
+
+
+@router.websocket("/ws/undercuts")
 async def undercut_stream(websocket: WebSocket):
-    await websocket.accept()
-    refresh_count = 0
-
-    try:
-        while True:
-            refresh_count += 1
-            driver_vectors = {}
-            response = {}
-
-            # --- Randomize telemetry vector per driver ---
-            for driver in drivers:
-                base = BASE_VECTORS[driver]
-                driver_vectors[driver] = [
-                    base[0],  # TrackNormalized constant
-                    min(max(base[1] + random.uniform(-0.05, 0.05), 0), 1),  # LapNumber
-                    min(max(base[2] + random.uniform(-0.1, 0.1), 0), 1),    # Position
-                    min(max(base[3] + random.uniform(-0.05, 0.05), 0), 1),  # NewTireCompound
-                    min(max(base[4] + random.uniform(-0.05, 0.05), 0), 1),  # Rival_Compound
-                    min(max(base[5] + random.uniform(-0.1, 0.1), 0), 1),    # Rival_TyreLife
-                    min(max(base[6] + random.uniform(-0.1, 0.1), 0), 1),    # GapToRival_BeforePit
-                    min(max(base[7] + random.uniform(-0.05, 0.05), 0), 1),  # TrackTemp
-                    min(max(base[8] + random.uniform(0, 0.05), 0), 1)       # Rainfall
-                ]
-
-            # --- Query Pinecone and build response ---
-            for driver, vec in driver_vectors.items():
-                total_matches, relevant_matches_count, matches_list = await query_pinecone(driver, vec)
-                response[driver] = {
-                    "total_matches": total_matches,
-                    "relevant_matches": relevant_matches_count,
-                    "simulated_vector": vec
-                }
-
-            # --- Add refresh count and send JSON ---
-            response["refresh_count"] = refresh_count
-            await websocket.send_json(response)
-
-            # Wait 5 seconds before next telemetry update
-            await asyncio.sleep(3)
-
-    except Exception as e:
-        print("WebSocket closed:", e)
+    # ?proto=json|msgpack|binary&delta=1 (plain JSON by default)
+    await serve(websocket, producer.hub_for(*negotiate(websocket)), [producer])
+
+
+@router.get("/ws/undercuts/stats")
+async def stream_stats():
+    """Tick timing, per-client queue depth, lag and drop counters, and query reuse."""
+    return {**producer.stats(), "recompute": cache.stats()}
+
+
+app.include_router(router)
+app.include_router(metrics.router)
 
 # ---------- Run Server ----------
 if __name__ == "__main__":
@@ -6,6 +6,10 @@ from pinecone import Pinecone, ServerlessSpec
 from dotenv import load_dotenv
 import os
 
+from compaction import GROUP_COLS, compact
+from tracing import span
+from vector_search import partition_key
+
 load_dotenv()
 
 # ---------- Pinecone Setup ----------
@@ -13,6 +17,10 @@ API_KEY = os.getenv("API_KEY")
 INDEX_NAME = "f1-cuts"
 INDEX_DIM = 8 
 MAX_BATCH = 1000
+# Also upsert into per-track/season namespaces for routed stream queries
+PARTITION_BY_TRACK = os.getenv("PARTITION_BY_TRACK", "0") == "1"
+# Merge near-duplicate vectors within this per-feature epsilon (0 = off)
+COMPACT_EPS = float(os.getenv("COMPACT_EPS", "0"))
 
 OUTPUT_CSV_TEMPLATE = "undercut_laps_{}_williams.csv"
 YEARS = [2020, 2021, 2022, 2023, 2024]
@@ -47,7 +55,8 @@ for year in YEARS:
         print(f"⚠️ File not found: {path}, skipping...")
         continue
 
-    df = pd.read_csv(path)
+    with span("cuts_upload.read_csv", year=year):
+        df = pd.read_csv(path)
     df["Year"] = year
 
     # Map numeric normalization for compounds if needed
@@ -70,12 +79,22 @@ combined = pd.concat(dfs, ignore_index=True)
 print(f"✅ Combined shape: {combined.shape}")
 
 # ---------- Step 2: Global Normalization ----------
-scaler = MinMaxScaler()
-cols_to_scale = ['LapNumber', 'Position', 'NewTireCompound', 'Rival_Compound', 'Rival_TyreLife', 'GapToRival_BeforePit', 'TrackTemp', 'Rainfall']
-combined[cols_to_scale] = scaler.fit_transform(combined[cols_to_scale])
+with span("cuts_upload.normalize", rows=len(combined)):
+    scaler = MinMaxScaler()
+    cols_to_scale = ['LapNumber', 'Position', 'NewTireCompound', 'Rival_Compound', 'Rival_TyreLife', 'GapToRival_BeforePit', 'TrackTemp', 'Rainfall']
+    combined[cols_to_scale] = scaler.fit_transform(combined[cols_to_scale])
+
+# ---------- Step 2b: Near-duplicate Compaction ----------
+if COMPACT_EPS > 0:
+    before = len(combined)
+    with span("cuts_upload.compact", rows=before):
+        combined = compact(combined, FEATURE_COLS, COMPACT_EPS, GROUP_COLS["cuts"])
+    METADATA_COLS += ["Weight"] + (["Drivers"] if "Drivers" in combined.columns else [])
+    print(f"🗜️ Compacted {before} → {len(combined)} vectors (eps={COMPACT_EPS})")
 
 # Save combined normalized file for reference
-combined.to_csv("undercut_all_years_combined.csv", index=False)
+with span("cuts_upload.save_csv", rows=len(combined)):
+    combined.to_csv("undercut_all_years_combined.csv", index=False)
 print("💾 Saved normalized data: undercut_all_years_combined.csv")
 
 # ---------- Step 3: Pinecone Setup ----------
@@ -104,10 +123,25 @@ for i in tqdm(range(0, len(vectors), MAX_BATCH), desc="Uploading batches"):
     batch_vecs = vectors[i:i + MAX_BATCH]
     batch_meta = metadata[i:i + MAX_BATCH]
     batch_ids = ids[i:i + MAX_BATCH]
-    index.upsert(vectors=list(zip(batch_ids, batch_vecs, batch_meta)))
+    with span("cuts_upload.upsert", rows=len(batch_ids)):
+        index.upsert(vectors=list(zip(batch_ids, batch_vecs, batch_meta)))
 
 print("✅ All vectors uploaded successfully!")
 
+# ---------- Step 4b: Per-track / season namespaces ----------
+if PARTITION_BY_TRACK:
+    for (track, year), group in combined.groupby(["TrackName", "Year"]):
+        namespace = partition_key(track, year)
+        rows = group.index.tolist()
+        for i in tqdm(range(0, len(rows), MAX_BATCH), desc=f"Uploading {namespace}"):
+            batch = rows[i:i + MAX_BATCH]
+            with span("cuts_upload.upsert", namespace=namespace, rows=len(batch)):
+                index.upsert(
+                    vectors=[(ids[r], vectors[r], metadata[r]) for r in batch],
+                    namespace=namespace
+                )
+    print("✅ Partitioned namespaces uploaded!")
+
 # ---------- Step 5: Stats ----------
 stats = index.describe_index_stats()
 print("\n📊 Pinecone Index Stats:")
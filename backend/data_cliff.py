@@ -2,6 +2,8 @@ import fastf1
 import pandas as pd
 import numpy as np
 
+from tracing import span, traced
+
 # ------------------------------
 # Config
 # ------------------------------
@@ -36,9 +38,11 @@ COMPOUND_MAP = {
 def get_race_session(year, race_name):
     fastf1.Cache.enable_cache("fastf1_cache")
     session = fastf1.get_session(year, race_name, 'R')
-    session.load()
+    with span("data_cliff.session_load", year=year, race=race_name):
+        session.load()
     return session
 
+@traced("data_cliff.extract")
 def extract_tire_cliff_laps(year, session, drop_threshold_sec=2.0):
     laps_all = session.laps.copy()
     weather = session.weather_data.copy()
@@ -101,7 +105,8 @@ def main():
         if all_race_dfs:
             df_year = pd.concat(all_race_dfs, ignore_index=True)
             output_file = OUTPUT_CSV_TEMPLATE.format(year)
-            df_year.to_csv(output_file, index=False)
+            with span("data_cliff.save_csv", rows=len(df_year)):
+                df_year.to_csv(output_file, index=False)
             print(f"✅ Saved {len(df_year)} tire cliff laps for {year} → {output_file}")
         else:
             print(f"⚠️ No tire cliffs found for {year}")
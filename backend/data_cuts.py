@@ -2,6 +2,8 @@ import fastf1
 import pandas as pd
 import numpy as np
 
+from tracing import span, traced
+
 # ------------------------------
 # Config
 # ------------------------------
@@ -36,9 +38,11 @@ COMPOUND_MAP = {
 def get_race_session(year, race_name):
     fastf1.Cache.enable_cache("fastf1_cache")
     session = fastf1.get_session(year, race_name, 'R')
-    session.load()
+    with span("data_cuts.session_load", year=year, race=race_name):
+        session.load()
     return session
 
+@traced("data_cuts.extract")
 def extract_undercut_laps(year, session):
     laps_all = session.laps.copy()
     weather = session.weather_data.copy()
@@ -107,7 +111,8 @@ def main():
         if all_race_dfs:
             df_year = pd.concat(all_race_dfs, ignore_index=True)
             output_file = OUTPUT_CSV_TEMPLATE.format(year)
-            df_year.to_csv(output_file, index=False)
+            with span("data_cuts.save_csv", rows=len(df_year)):
+                df_year.to_csv(output_file, index=False)
             print(f"✅ Saved {len(df_year)} undercut laps for {year} → {output_file}")
         else:
             print(f"⚠️ No undercut laps found for {year}")
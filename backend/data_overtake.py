@@ -1,6 +1,8 @@
 import fastf1
 import pandas as pd
 
+from tracing import span, traced
+
 # ------------------------------
 # Config
 # ------------------------------
@@ -38,10 +40,12 @@ def get_race_session(year, race_name):
     """Load and cache the race session data."""
     fastf1.Cache.enable_cache("fastf1_cache")
     session = fastf1.get_session(year, race_name, 'R')
-    session.load()
+    with span("data_overtake.session_load", year=year, race=race_name):
+        session.load()
     return session
 
 
+@traced("data_overtake.extract")
 def extract_overtake_laps(year, session):
     """Extract laps where an overtake occurred on the following lap."""
     laps_all = session.laps.copy()
@@ -104,7 +108,8 @@ def main():
         if all_race_dfs:
             df_year = pd.concat(all_race_dfs, ignore_index=True)
             output_file = OUTPUT_CSV_TEMPLATE.format(year)
-            df_year.to_csv(output_file, index=False)
+            with span("data_overtake.save_csv", rows=len(df_year)):
+                df_year.to_csv(output_file, index=False)
             print(f"✅ Saved {len(df_year)} overtaking laps for {year} → {output_file}")
         else:
             print(f"⚠️ No overtakes found for {year}")
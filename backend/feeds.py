@@ -0,0 +1,75 @@
+# feeds.py
+"""Shared layout of the cliff, cuts and overtake feeds (index, columns, telemetry jitter)."""
+import random
+import numpy as np
+
+NUM_TRACKS = 60  # for normalizing lap numbers (cuts feed)
+
+# Full grid (FULL_GRID=1 in the cliff and undercut feeds; always used by overtakes)
+GRID_DRIVERS = ["VER", "HAM", "LEC", "ALO", "SAI", "BOT", "MAG", "NOR", "GAS", "RUS",
+                "OCO", "PER", "TSU", "LAT", "RIC", "ZHO", "DEV", "SAI2", "HAM2", "VAR"]
+
+# ---------- Feed Definitions ----------
+# "jitter" mirrors the random.uniform ranges the stream servers apply around
+# BASE_VECTORS; every value is clipped back into [0, 1] afterwards.
+# "kinds" describes each dimension for synthetic corpora:
+#   track    -> one of a few discrete circuit codes
+#   compound -> one of the compound buckets
+#   binary   -> mostly 0, sometimes 1 (Rainfall)
+#   uniform  -> continuous in [0, 1]
+FEEDS = {
+    "cliff": {
+        "index_name": "f1-cliff",
+        "combined_csv": "cliff_all_years_combined.csv",
+        "feature_cols": ["TrackNormalized", "Compound", "TyreLife", "TrackTemp",
+                         "Rainfall", "LapNumber", "Position"],
+        "metadata_cols": ["Driver", "Year", "LapTimeLoss", "TrackName", "Team"],
+        "kinds": ["track", "compound", "uniform", "uniform", "binary", "uniform", "uniform"],
+        "top_k": 30,
+        "base_vector": [0.88, 0.45, 0.70, 0.78, 0.10, 0.80, 0.35],
+        "jitter": [(0, 0), (-0.05, 0.05), (-0.1, 0.1), (-0.1, 0.1),
+                   (0, 0.05), (-0.05, 0.05), (-0.05, 0.05)],
+    },
+    "cuts": {
+        "index_name": "f1-cuts",
+        "combined_csv": "undercut_all_years_combined.csv",
+        "feature_cols": ["TrackNormalized", "LapNumber", "Position", "NewTireCompound",
+                         "Rival_Compound", "Rival_TyreLife", "GapToRival_BeforePit",
+                         "TrackTemp", "Rainfall"],
+        "metadata_cols": ["Driver", "Year", "TrackName", "Team", "Rival_Pitted_Lap"],
+        "kinds": ["track", "uniform", "uniform", "compound", "compound",
+                  "uniform", "uniform", "uniform", "binary"],
+        "top_k": 10,
+        "base_vector": [0.9, 12 / NUM_TRACKS, 0.45, 0.3, 0.2, 0.35, 3.0 / 20, 0.5, 0.0],
+        "jitter": [(0, 0), (-0.05, 0.05), (-0.1, 0.1), (-0.05, 0.05), (-0.05, 0.05),
+                   (-0.1, 0.1), (-0.1, 0.1), (-0.05, 0.05), (0, 0.05)],
+    },
+    "overtake": {
+        "index_name": "f1-overtake",
+        "combined_csv": "overtake_all_years_combined.csv",
+        "feature_cols": ["TrackNormalized", "Position", "Compound", "TyreLife",
+                         "TrackTemp", "Rainfall"],
+        "metadata_cols": ["TrackName", "Year", "Driver", "Team", "LapNumber"],
+        "kinds": ["track", "uniform", "compound", "uniform", "uniform", "binary"],
+        "top_k": 10,
+        "base_vector": [0.9, 0.45, 0.35, 0.42, 0.50, 0.0],
+        "jitter": [(0, 0), (-0.05, 0.05), (-0.05, 0.05), (-0.1, 0.1),
+                   (-0.1, 0.1), (0, 0.1)],
+    },
+}
+
+
+# ---------- Helper Functions ----------
+def jitter_vector(feed, base, rng=random):
+    """Randomize one telemetry vector the way the stream servers do."""
+    return [
+        min(max(value + rng.uniform(low, high), 0), 1)
+        for value, (low, high) in zip(base, FEEDS[feed]["jitter"])
+    ]
+
+
+def jitter_grid(feed, base, rng=np.random):
+    """jitter_vector() for every car at once: base is (n_cars, D), returns a new (n_cars, D) array."""
+    low, high = np.array(FEEDS[feed]["jitter"]).T
+    base = np.asarray(base, dtype=np.float64)
+    return np.clip(base + rng.uniform(low, high, size=base.shape), 0, 1)
@@ -0,0 +1,177 @@
+# frames.py
+"""Negotiated WebSocket frame encodings: JSON (default), MessagePack, compact binary, plus deltas.
+
+Clients opt in with query parameters, e.g. /ws/cliff?proto=binary&delta=1.
+
+Delta streams send a keyframe {"type": "key", "seq", "frame"} every
+KEYFRAME_EVERY ticks and {"type": "delta", "seq", "base", "changed"} in between,
+where "changed" maps dotted paths ("MY_CAR.max_similarity") to values that
+differ from keyframe "base". Deltas are relative to the keyframe, not the
+previous frame, so a client can miss deltas without drifting.
+"""
+import json
+import os
+import struct
+
+try:
+    import msgpack
+except ImportError:  # optional dependency
+    msgpack = None
+
+PROTOCOLS = ("json", "msgpack", "binary")
+KEYFRAME_EVERY = int(os.getenv("KEYFRAME_EVERY", "10"))
+
+# Binary layout: header, then one entry per dotted path (see encode_binary)
+BINARY_MAGIC = b"F1"
+BINARY_VERSION = 2  # 2: "l" string lists
+HEADER = struct.Struct("<2sBBIIH")  # magic, version, kind (0 key / 1 delta), seq, base, entries
+
+
+# ---------- Negotiation ----------
+def negotiate(websocket):
+    """(proto, delta) requested by the client's query string; unknown values fall back to JSON."""
+    proto = websocket.query_params.get("proto", "json")
+    if proto not in PROTOCOLS or (proto == "msgpack" and msgpack is None):
+        print(f"⚠️ Unsupported proto '{proto}', using json")
+        proto = "json"
+    return proto, websocket.query_params.get("delta") == "1"
+
+
+# ---------- Deltas ----------
+def flatten(frame, prefix=""):
+    """{"MY_CAR": {"max_similarity": 0.9}} → {"MY_CAR.max_similarity": 0.9}; lists stay whole."""
+    flat = {}
+    for key, value in frame.items():
+        path = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{path}."))
+        else:
+            flat[path] = value
+    return flat
+
+
+def unflatten(flat):
+    frame = {}
+    for path, value in flat.items():
+        node = frame
+        *parents, leaf = path.split(".")
+        for key in parents:
+            node = node.setdefault(key, {})
+        node[leaf] = value
+    return frame
+
+
+class DeltaEncoder:
+    """Turns successive frames into keyframe / delta messages."""
+
+    def __init__(self, keyframe_every=KEYFRAME_EVERY):
+        self.keyframe_every = keyframe_every
+        self.seq = 0
+        self.key_seq = None
+        self.key_flat = {}
+        self.key_message = None
+
+    def update(self, frame):
+        """Returns (is_keyframe, message) for the next frame."""
+        self.seq += 1
+        flat = flatten(frame)
+        if self.key_seq is None or self.seq - self.key_seq >= self.keyframe_every or flat.keys() != self.key_flat.keys():
+            self.key_seq, self.key_flat = self.seq, flat
+            self.key_message = {"type": "key", "seq": self.seq, "frame": frame}
+            return True, self.key_message
+        changed = {path: value for path, value in flat.items() if self.key_flat[path] != value}
+        return False, {"type": "delta", "seq": self.seq, "base": self.key_seq, "changed": changed}
+
+
+# ---------- Encoding ----------
+def encode(proto, message):
+    """Serialize a frame or delta message; str for JSON, bytes otherwise."""
+    if proto == "msgpack":
+        return msgpack.packb(message)
+    if proto == "binary":
+        return encode_binary(message)
+    return json.dumps(message)
+
+
+def encode_binary(message):
+    """Fixed little-endian layout. After HEADER, each entry is:
+
+    uint8 path length, UTF-8 path, 1-byte tag, then the value:
+      i int32 | f float32 | b uint8 | n (none) | s uint16 length + UTF-8
+      v uint16 count + float16 per element (numeric lists: telemetry vectors)
+      l uint16 count + (uint16 length + UTF-8) per element (other lists, e.g. "_meta.fresh")
+    """
+    if message.get("type") == "delta":
+        kind, seq, base, flat = 1, message["seq"], message["base"], message["changed"]
+    elif message.get("type") == "key":
+        kind, seq, base, flat = 0, message["seq"], message["seq"], flatten(message["frame"])
+    else:
+        seq = int(message.get("refresh_count", 0))
+        kind, base, flat = 0, seq, flatten(message)
+
+    parts = [HEADER.pack(BINARY_MAGIC, BINARY_VERSION, kind, seq, base, len(flat))]
+    for path, value in flat.items():
+        name = path.encode()
+        parts.append(struct.pack("<B", len(name)) + name)
+        if value is None:
+            parts.append(b"n")
+        elif isinstance(value, bool):
+            parts.append(b"b" + struct.pack("<B", value))
+        elif isinstance(value, int):
+            parts.append(b"i" + struct.pack("<i", value))
+        elif isinstance(value, float):
+            parts.append(b"f" + struct.pack("<f", value))
+        elif isinstance(value, (list, tuple)) and all(
+                isinstance(v, (int, float)) and not isinstance(v, bool) for v in value):
+            parts.append(b"v" + struct.pack(f"<H{len(value)}e", len(value), *value))
+        elif isinstance(value, (list, tuple)):
+            items = [str(v).encode() for v in value]
+            parts.append(b"l" + struct.pack("<H", len(items))
+                         + b"".join(struct.pack("<H", len(item)) + item for item in items))
+        else:
+            text = str(value).encode()
+            parts.append(b"s" + struct.pack("<H", len(text)) + text)
+    return b"".join(parts)
+
+
+def decode_binary(data):
+    """Inverse of encode_binary (for clients and load tests): returns a key/delta message."""
+    magic, version, kind, seq, base, count = HEADER.unpack_from(data, 0)
+    if magic != BINARY_MAGIC or version != BINARY_VERSION:
+        raise ValueError("Not an F1 binary frame")
+
+    offset, flat = HEADER.size, {}
+    for _ in range(count):
+        (length,) = struct.unpack_from("<B", data, offset)
+        path = data[offset + 1:offset + 1 + length].decode()
+        offset += 1 + length
+        tag = data[offset:offset + 1]
+        offset += 1
+        if tag == b"n":
+            value = None
+        elif tag == b"b":
+            value, offset = bool(data[offset]), offset + 1
+        elif tag == b"i":
+            (value,), offset = struct.unpack_from("<i", data, offset), offset + 4
+        elif tag == b"f":
+            (value,), offset = struct.unpack_from("<f", data, offset), offset + 4
+        elif tag == b"v":
+            (n,) = struct.unpack_from("<H", data, offset)
+            value = list(struct.unpack_from(f"<{n}e", data, offset + 2))
+            offset += 2 + 2 * n
+        elif tag == b"l":
+            (n,) = struct.unpack_from("<H", data, offset)
+            offset, value = offset + 2, []
+            for _ in range(n):
+                (length,) = struct.unpack_from("<H", data, offset)
+                value.append(data[offset + 2:offset + 2 + length].decode())
+                offset += 2 + length
+        else:
+            (n,) = struct.unpack_from("<H", data, offset)
+            value = data[offset + 2:offset + 2 + n].decode()
+            offset += 2 + n
+        flat[path] = value
+
+    if kind == 1:
+        return {"type": "delta", "seq": seq, "base": base, "changed": flat}
+    return {"type": "key", "seq": seq, "frame": unflatten(flat)}
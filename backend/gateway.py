@@ -0,0 +1,95 @@
+# gateway.py
+"""One process serving every feed, the strategy API and a multiplexed /ws/race channel.
+
+The stream modules share one index client (vector_search.get_index), so the
+gateway replaces the four separate uvicorn processes on :8000-:8010.
+"""
+from fastapi import FastAPI, WebSocket
+from fastapi.middleware.cors import CORSMiddleware
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from broadcast import BroadcastHub, serve
+import cliff_stream
+import cuts_stream
+import overtake_stream
+import FastAPIGemini
+import metrics
+from strategy_pipeline import StrategyPipeline
+
+# Feed name used in /ws/race frames → stream module
+FEED_MODULES = {
+    "overtakes": overtake_stream,
+    "cliff": cliff_stream,
+    "undercuts": cuts_stream,
+}
+
+# ---------- FastAPI Setup ----------
+app = FastAPI()
+
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+
+for module in (*FEED_MODULES.values(), FastAPIGemini, metrics):
+    app.include_router(module.router)
+
+
+# ---------- Multiplexed Race Channel ----------
+# Every feed producer also publishes {"feed": name, "data": frame} here
+race_hub = BroadcastHub()
+for name, module in FEED_MODULES.items():
+    module.producer.add_relay(race_hub, lambda text, name=name: f'{{"feed": "{name}", "data": {text}}}')
+
+
+@app.websocket("/ws/race")
+async def race_stream(websocket: WebSocket):
+    """All three feeds on one socket, each at its own cadence."""
+    await serve(websocket, race_hub, [m.producer for m in FEED_MODULES.values()])
+
+
+@app.get("/ws/race/stats")
+async def race_stats():
+    return race_hub.stats()
+
+
+# ---------- Server-side Strategy ----------
+# Replaces the dashboard's collect-and-POST round trip to /api/strategy
+async def generate_strategy(key, overtake_data, tire_data, pit_data):
+    req = FastAPIGemini.StrategyInput(overtake_data=overtake_data, tire_data=tire_data, pit_data=pit_data)
+    return await FastAPIGemini.model_strategy(key, req)
+
+
+strategy_pipeline = StrategyPipeline(generate_strategy)
+strategy_pipeline.attach({name: module.producer for name, module in FEED_MODULES.items()})
+
+
+@app.websocket("/ws/strategy")
+async def strategy_stream(websocket: WebSocket):
+    """{"type": "local"} recommendations as the situation changes, then {"type": "strategy"} model text."""
+    await serve(websocket, strategy_pipeline.hub, [m.producer for m in FEED_MODULES.values()])
+
+
+@app.get("/ws/strategy/stats")
+async def strategy_stats():
+    return strategy_pipeline.stats()
+
+
+# ---------- Run Server ----------
+# WEB_WORKERS=N serves clients from N processes; one leader computes the ticks (workers.py)
+if __name__ == "__main__":
+    import os
+    import tempfile
+    import uvicorn
+
+    workers = int(os.getenv("WEB_WORKERS", "1"))
+    port = int(os.getenv("GATEWAY_PORT", "8080"))
+    if workers > 1:
+        os.environ.setdefault("STREAM_BUS", os.path.join(tempfile.gettempdir(), f"f1-stream-{port}.sock"))
+        uvicorn.run("gateway:app", host="0.0.0.0", port=port, workers=workers)
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=port)
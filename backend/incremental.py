@@ -0,0 +1,69 @@
+# incremental.py
+"""Change-driven recompute for the stream servers: re-query a driver only when their state moved.
+
+A driver is stale when any feature moved more than its epsilon since that
+driver's last query, or when a lap boundary passed (replay). Continuous
+features use RECOMPUTE_EPS. Compounds count as moved past half the 0.2 gap
+between compound codes, Rainfall past 0.5, and the track on any change.
+Everyone else reuses their cached result, so query volume follows race
+events instead of tick rate × drivers. RECOMPUTE_EPS=0 only reuses results
+for identical vectors.
+
+This only pays off under replay. Random telemetry re-draws every continuous
+feature each tick by more than RECOMPUTE_EPS, so every driver would count as
+moved. The streams create the cache with enabled=False then, and every driver
+is queried without comparing vectors.
+"""
+import os
+import numpy as np
+
+from feeds import FEEDS
+from metrics import CACHE
+
+RECOMPUTE_EPS = float(os.getenv("RECOMPUTE_EPS", "0.02"))
+# Moves below these are jitter, not a new compound / a change in the weather
+KIND_EPS = {"compound": 0.1, "binary": 0.5, "track": 0.0}
+
+
+class QueryCache:
+    """Per-driver last query vector, lap and result."""
+
+    def __init__(self, feed, eps=RECOMPUTE_EPS, name=None, enabled=True):
+        self.name = name or feed  # metrics label, e.g. the producer name "undercuts"
+        self.eps = np.array([KIND_EPS.get(kind, eps) for kind in FEEDS[feed]["kinds"]])
+        self.enabled = enabled
+        self.vectors = {}
+        self.laps = {}
+        self.results = {}
+        self.queried = 0
+        self.reused = 0
+
+    def stale(self, names, vectors, lap=None):
+        """The names whose result must be recomputed this tick."""
+        known = [self.enabled and name in self.vectors and self.laps[name] == lap for name in names]
+        moved = [True] * len(names)
+        if any(known):
+            current = np.asarray(vectors, dtype=np.float64)
+            last = np.array([self.vectors[name] if k else row for name, k, row in zip(names, known, current)])
+            moved = (np.abs(current - last) > self.eps).any(axis=1)
+        stale = [name for name, k, m in zip(names, known, moved) if not k or m]
+        self.queried += len(stale)
+        self.reused += len(names) - len(stale)
+        CACHE.inc(len(stale), feed=self.name, result="miss")
+        CACHE.inc(len(names) - len(stale), feed=self.name, result="hit")
+        return stale
+
+    def store(self, names, vectors, results, lap=None):
+        for name, vector, result in zip(names, vectors, results):
+            self.vectors[name] = np.asarray(vector, dtype=np.float64)
+            self.laps[name] = lap
+            self.results[name] = result
+
+    def stats(self):
+        total = self.queried + self.reused
+        return {
+            "enabled": self.enabled,
+            "queried": self.queried,
+            "reused": self.reused,
+            "reuse_rate": round(self.reused / total, 3) if total else None,
+        }
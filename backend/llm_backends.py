@@ -0,0 +1,138 @@
+# llm_backends.py
+"""Strategy text generators behind one interface, so the strategy API can run offline.
+
+A backend has two coroutines, both shaped like the google-genai async client:
+    generate(prompt) → response with .text and .usage_metadata
+    stream(prompt)   → async iterator of chunks with .text (the last carries usage_metadata)
+
+LLM_BACKEND picks the implementation:
+    gemini - google-genai with GEMINI_API_KEY (default)
+    stub   - local generator with a configurable latency distribution, token
+             rate and error rate, for load tests (see loadtest.py):
+             STUB_LATENCY_MS       median time to first token (300)
+             STUB_LATENCY_DIST     fixed | uniform | exponential | lognormal (lognormal)
+             STUB_LATENCY_SPREAD   lognormal sigma, or uniform ± fraction (0.5)
+             STUB_TOKENS_PER_S     output rate after the first token, 0 = instant (50)
+             STUB_RESPONSE_TOKENS  tokens per answer (40)
+             STUB_ERROR_RATE       fraction of calls that fail (0)
+             STUB_SEED             seed for repeatable runs (unset = random)
+"""
+import asyncio
+import math
+import os
+import random
+import zlib
+
+from prompts import estimate_tokens
+
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.0-flash")
+
+
+# ---------- Gemini ----------
+class GeminiBackend:
+    name = "gemini"
+
+    def __init__(self, api_key=None, model=GEMINI_MODEL):
+        from google import genai  # only needed when the real model is used
+
+        self.client = genai.Client(api_key=api_key or os.getenv("GEMINI_API_KEY"))
+        self.model = model
+
+    async def generate(self, prompt):
+        return await self.client.aio.models.generate_content(model=self.model, contents=prompt)
+
+    async def stream(self, prompt):
+        return await self.client.aio.models.generate_content_stream(model=self.model, contents=prompt)
+
+
+# ---------- Local stub ----------
+class StubUsage:
+    def __init__(self, prompt_token_count, candidates_token_count):
+        self.prompt_token_count = prompt_token_count
+        self.candidates_token_count = candidates_token_count
+
+
+class StubResponse:
+    def __init__(self, text, usage_metadata=None):
+        self.text = text
+        self.usage_metadata = usage_metadata
+
+
+class StubBackend:
+    """Canned strategy text with Gemini-like timing and failures."""
+
+    name = "stub"
+    WORDS = ("box", "this", "lap", "to", "cover", "the", "undercut", "and", "protect", "track", "position")
+
+    def __init__(self, latency_ms=None, dist=None, spread=None, tokens_per_s=None,
+                 response_tokens=None, error_rate=None, seed=None):
+        env = os.getenv
+        self.latency_ms = float(env("STUB_LATENCY_MS", "300") if latency_ms is None else latency_ms)
+        self.dist = dist or env("STUB_LATENCY_DIST", "lognormal")
+        self.spread = float(env("STUB_LATENCY_SPREAD", "0.5") if spread is None else spread)
+        self.tokens_per_s = float(env("STUB_TOKENS_PER_S", "50") if tokens_per_s is None else tokens_per_s)
+        self.response_tokens = int(env("STUB_RESPONSE_TOKENS", "40") if response_tokens is None else response_tokens)
+        self.error_rate = float(env("STUB_ERROR_RATE", "0") if error_rate is None else error_rate)
+        seed = env("STUB_SEED") if seed is None else seed
+        self.rng = random.Random(None if seed is None else int(seed))
+        if self.dist not in ("fixed", "uniform", "exponential", "lognormal"):
+            raise ValueError(f"Unknown STUB_LATENCY_DIST: {self.dist}")
+
+    def first_token_delay(self):
+        median = self.latency_ms / 1000
+        if self.dist == "fixed":
+            return median
+        if self.dist == "uniform":
+            return median * self.rng.uniform(1 - self.spread, 1 + self.spread)
+        if self.dist == "exponential":
+            return self.rng.expovariate(math.log(2) / median) if median > 0 else 0.0
+        return median * self.rng.lognormvariate(0, self.spread)
+
+    def token_delay(self):
+        return 1 / self.tokens_per_s if self.tokens_per_s > 0 else 0.0
+
+    def answer(self, prompt):
+        """Deterministic text per prompt, response_tokens words long."""
+        offset = zlib.crc32(prompt.encode())
+        return [self.WORDS[(offset + i) % len(self.WORDS)] for i in range(max(self.response_tokens, 1))]
+
+    def usage(self, prompt):
+        return StubUsage(estimate_tokens(prompt), self.response_tokens)
+
+    def maybe_fail(self):
+        if self.rng.random() < self.error_rate:
+            raise RuntimeError(f"stub backend error (STUB_ERROR_RATE={self.error_rate:g})")
+
+    async def generate(self, prompt):
+        words = self.answer(prompt)
+        await asyncio.sleep(self.first_token_delay() + self.token_delay() * (len(words) - 1))
+        self.maybe_fail()
+        return StubResponse(" ".join(words).capitalize() + ".", self.usage(prompt))
+
+    async def stream(self, prompt):
+        words = self.answer(prompt)
+        delay = self.first_token_delay()
+        self.maybe_fail()
+
+        async def chunks():
+            await asyncio.sleep(delay)
+            for i, word in enumerate(words):
+                if i:
+                    await asyncio.sleep(self.token_delay())
+                last = i == len(words) - 1
+                text = (word.capitalize() if i == 0 else " " + word) + ("." if last else "")
+                yield StubResponse(text, self.usage(prompt) if last else None)
+
+        return chunks()
+
+
+# ---------- Factory ----------
+BACKENDS = {"gemini": GeminiBackend, "stub": StubBackend}
+
+
+def get_backend(name=None):
+    """Backend named by LLM_BACKEND (gemini by default)."""
+    name = name or os.getenv("LLM_BACKEND", "gemini")
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown LLM_BACKEND: {name}")
+    return BACKENDS[name]()
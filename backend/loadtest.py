@@ -0,0 +1,132 @@
+# loadtest.py
+"""Open-loop load test for POST /api/strategy: target RPS in, throughput and tail latency out.
+
+Requests are sent on schedule whether or not earlier ones have finished, so
+queueing behind the model shows up in the latency percentiles. Run the
+service on the stub backend to tune caching, coalescing and concurrency
+limits without Gemini:
+
+    LLM_BACKEND=stub STUB_LATENCY_MS=400 GEMINI_CONCURRENCY=4 python FastAPIGemini.py
+    python loadtest.py --rps 50 --duration 30 --situations 20 --sessions 10
+
+--situations is how many distinct race situations the requests cycle
+through (0 = every request is new, so nothing can be cached or coalesced).
+"""
+import argparse
+import asyncio
+import random
+import time
+import numpy as np
+import httpx
+
+from feeds import GRID_DRIVERS
+
+
+# ---------- Workload ----------
+def build_situation(rng):
+    """A random /api/strategy body like the dashboard posts."""
+    total = rng.randint(0, 10)
+    return {
+        "overtake_data": {driver: rng.randint(0, 10) for driver in rng.sample(GRID_DRIVERS, 5)},
+        "tire_data": {"risk_detected": rng.random() < 0.3, "max_similarity": round(rng.uniform(0.6, 1.0), 3)},
+        "pit_data": {"total_matches": total, "relevant_matches": rng.randint(0, total)},
+    }
+
+
+def arrivals(rps, duration, poisson, rng):
+    """Send offsets (seconds from start) for the run."""
+    t, offsets = 0.0, []
+    while True:
+        t += rng.expovariate(rps) if poisson else 1 / rps
+        if t >= duration:
+            return offsets
+        offsets.append(t)
+
+
+# ---------- Run ----------
+async def send(client, body, session, wait, results):
+    started = time.perf_counter()
+    try:
+        r = await client.post("/api/strategy", json=body, params={"wait": int(wait)},
+                              headers={"x-session-id": session})
+        elapsed = time.perf_counter() - started
+        data = r.json() if r.status_code == 200 else {}
+        if r.status_code != 200:
+            outcome = f"http_{r.status_code}"
+        elif data.get("error"):
+            outcome = "model_error"  # answered with the local fallback
+        elif not data.get("enriched", True):
+            outcome = "local_only"
+        else:
+            outcome = "ok"
+    except Exception as e:
+        elapsed = time.perf_counter() - started
+        outcome = type(e).__name__
+    results.append((elapsed, outcome))
+
+
+async def run(args):
+    rng = random.Random(args.seed)
+    pool = [build_situation(rng) for _ in range(args.situations)]
+    schedule = arrivals(args.rps, args.duration, args.poisson, rng)
+    limits = httpx.Limits(max_connections=args.connections, max_keepalive_connections=args.connections)
+    results, tasks = [], []
+
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=args.timeout) as client:
+        print(f"🏁 {len(schedule)} requests at {args.rps:g} RPS for {args.duration:g}s → {args.url}")
+        start = time.perf_counter()
+        for offset in schedule:
+            delay = start + offset - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            body = rng.choice(pool) if pool else build_situation(rng)
+            session = f"load-{rng.randrange(args.sessions)}"
+            tasks.append(asyncio.ensure_future(send(client, body, session, args.wait, results)))
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - start
+
+        server = {}
+        for path in ("/api/strategy/cache", "/api/strategy/coalescing"):
+            try:
+                server[path] = (await client.get(path)).json()
+            except Exception as e:
+                server[path] = f"unavailable ({e})"
+
+    report(results, elapsed, server)
+
+
+# ---------- Report ----------
+def report(results, elapsed, server):
+    latencies = np.array([seconds for seconds, _ in results]) * 1000
+    outcomes = {}
+    for _, outcome in results:
+        outcomes[outcome] = outcomes.get(outcome, 0) + 1
+
+    print(f"\n📊 {len(results)} requests in {elapsed:.2f}s → {len(results) / elapsed:.1f} req/s completed")
+    print("   outcomes: " + ", ".join(f"{k}={v}" for k, v in sorted(outcomes.items())))
+    if len(latencies):
+        p50, p90, p99, p999 = np.percentile(latencies, [50, 90, 99, 99.9])
+        print(f"   latency ms: p50 {p50:.1f}  p90 {p90:.1f}  p99 {p99:.1f}  p99.9 {p999:.1f}  max {latencies.max():.1f}")
+    for path, stats in server.items():
+        print(f"   {path}: {stats}")
+
+
+# ---------- Main ----------
+def main():
+    parser = argparse.ArgumentParser(description="Drive /api/strategy at a target RPS and report tail latency.")
+    parser.add_argument("--url", default="http://localhost:8010")
+    parser.add_argument("--rps", type=float, default=20.0)
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds of sending")
+    parser.add_argument("--situations", type=int, default=20, help="distinct situations (0 = all unique)")
+    parser.add_argument("--sessions", type=int, default=10, help="distinct x-session-id values (debounce keys)")
+    parser.add_argument("--poisson", action="store_true", help="exponential inter-arrival times instead of fixed")
+    parser.add_argument("--no-wait", dest="wait", action="store_false",
+                        help="send wait=0 (local answer now, model text in the background)")
+    parser.add_argument("--connections", type=int, default=200)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--seed", type=int, default=0)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,327 @@
+# loadtest_streams.py
+"""End-to-end WebSocket load test for the feed streams: find where ticks start to slip.
+
+Each simulated dashboard opens /ws/overtakes, /ws/cliff and /ws/undercuts,
+like App.jsx. The number of dashboards ramps through --clients. After a
+warm-up, every step measures:
+    jitter   - |frame inter-arrival - tick period| per client
+    latency  - receive time - time the tick was due (frames stamped via STAMP_FRAMES=1)
+    missed   - refresh_count gaps (dropped frames, skipped ticks) and disconnects
+    delivery - frames received / whole ticks due in the step, across all sockets
+    server   - CPU % and RSS of the server process tree (/proc, Linux)
+The first step that breaks the SLO (--slo-ms latency p99, --max-missed
+frames missed or undelivered, any disconnect) is reported as the saturation point.
+
+By default the gateway is started here with a local search backend, the
+stub LLM and STAMP_FRAMES=1, from the current directory (where the combined
+CSVs live):
+
+    python loadtest_streams.py --search exact --clients 10 50 100 250 500
+    python loadtest_streams.py --search standin --standin-ms 40 --workers 2
+
+--url attaches to a server that is already running instead. Pass --pid to
+get its CPU/memory, and start it with STAMP_FRAMES=1 for latency numbers.
+The harness runs in one process, so its own CPU is reported too: near
+100% it is the bottleneck, not the server.
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+import numpy as np
+import httpx
+import websockets
+
+FEED_PATHS = {"overtakes": "/ws/overtakes", "cliff": "/ws/cliff", "undercuts": "/ws/undercuts"}
+HERE = os.path.dirname(os.path.abspath(__file__))
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+
+
+# ---------- Server Process ----------
+def start_gateway(args):
+    env = {
+        **os.environ,
+        "SEARCH_BACKEND": args.search,
+        "STANDIN_LATENCY_MS": str(args.standin_ms),
+        "LLM_BACKEND": "stub",
+        "STAMP_FRAMES": "1",
+        "WEB_WORKERS": str(args.workers),
+        "GATEWAY_PORT": str(args.port),
+    }
+    process = subprocess.Popen([sys.executable, os.path.join(HERE, "gateway.py")], env=env,
+                               stdout=subprocess.DEVNULL if args.quiet else None, stderr=subprocess.STDOUT)
+    deadline = time.time() + args.startup_timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"❌ gateway exited with code {process.returncode}")
+        try:
+            if httpx.get(f"http://127.0.0.1:{args.port}/health", timeout=1).status_code == 200:
+                return process
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    process.terminate()
+    raise RuntimeError("❌ gateway did not come up in time")
+
+
+def process_tree(pid):
+    """pid plus all of its descendants (uvicorn workers)."""
+    children = {}
+    for entry in os.listdir("/proc"):
+        if entry.isdigit():
+            try:
+                with open(f"/proc/{entry}/stat") as f:
+                    ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+            except (OSError, IndexError, ValueError):
+                continue
+            children.setdefault(ppid, []).append(int(entry))
+    tree, todo = [], [pid]
+    while todo:
+        p = todo.pop()
+        tree.append(p)
+        todo += children.get(p, [])
+    return tree
+
+
+def sample_usage(pid):
+    """(cpu seconds, rss MB) summed over the process tree."""
+    cpu, rss = 0.0, 0.0
+    for p in process_tree(pid):
+        try:
+            with open(f"/proc/{p}/stat") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+            cpu += (int(fields[11]) + int(fields[12])) / CLOCK_TICKS  # utime + stime
+            with open(f"/proc/{p}/status") as f:
+                rss += next(int(line.split()[1]) for line in f if line.startswith("VmRSS:")) / 1024
+        except (OSError, StopIteration, ValueError):
+            continue
+    return cpu, rss
+
+
+# ---------- Clients ----------
+class Step:
+    """Measurements for one ramp step."""
+
+    def __init__(self):
+        self.jitter = {feed: [] for feed in FEED_PATHS}
+        self.latency = {feed: [] for feed in FEED_PATHS}
+        self.frames = 0
+        self.missed = 0
+        self.disconnects = 0
+        self.reasons = {}  # disconnect reason → count
+
+
+class Harness:
+    def __init__(self, url, periods):
+        self.url = url
+        self.periods = periods  # feed → tick period (s)
+        self.step = Step()
+        self.tasks = []
+
+    def add_dashboards(self, n):
+        for _ in range(n):
+            for feed, path in FEED_PATHS.items():
+                self.tasks.append(asyncio.ensure_future(self.client(feed, self.url + path)))
+
+    async def client(self, feed, url):
+        last_at, last_count = None, None
+        try:
+            async with websockets.connect(url, max_size=None, open_timeout=30) as ws:
+                async for message in ws:
+                    now = time.time()
+                    frame = json.loads(message)
+                    count = frame.get("refresh_count")
+                    step = self.step
+                    if last_at is not None and count is not None:
+                        gap = count - last_count
+                        if gap == 1:
+                            step.jitter[feed].append(abs(now - last_at - self.periods[feed]))
+                        step.missed += max(gap - 1, 0)
+                        # The first frame is the hub's seed (up to a period old); later ones are live
+                        if "tick_at" in frame:
+                            step.latency[feed].append(now - frame["tick_at"])
+                    step.frames += 1
+                    last_at, last_count = now, count
+            reason = "closed by server"
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            reason = f"{type(e).__name__}: {e}"[:120]
+        self.step.disconnects += 1
+        self.step.reasons[reason] = self.step.reasons.get(reason, 0) + 1
+
+    async def close(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+
+
+async def tick_periods(http_url):
+    periods = {}
+    async with httpx.AsyncClient(base_url=http_url, timeout=10) as client:
+        for feed, path in FEED_PATHS.items():
+            try:
+                periods[feed] = (await client.get(f"{path}/stats")).json()["ticks"]["period_s"]
+            except Exception:
+                periods[feed] = 2.0
+    return periods
+
+
+async def skipped_ticks(http_url):
+    async with httpx.AsyncClient(base_url=http_url, timeout=10) as client:
+        total = 0
+        for path in FEED_PATHS.values():
+            try:
+                total += (await client.get(f"{path}/stats")).json()["ticks"]["skipped"]
+            except Exception:
+                pass
+    return total
+
+
+# ---------- Ramp ----------
+def percentiles(values):
+    values = np.array(values) * 1000
+    if not len(values):
+        return None, None
+    return float(np.percentile(values, 50)), float(np.percentile(values, 99))
+
+
+async def ramp(args, pid):
+    http_url = args.url.replace("ws://", "http://").replace("wss://", "https://")
+    harness = Harness(args.url, await tick_periods(http_url))
+    rows, connected = [], 0
+    try:
+        for dashboards in args.clients:
+            harness.add_dashboards(dashboards - connected)
+            connected = dashboards
+            await asyncio.sleep(args.warmup)
+
+            harness.step = step = Step()
+            skipped_before = await skipped_ticks(http_url)
+            server_before = sample_usage(pid) if pid else None
+            harness_before = time.process_time()
+            started = time.perf_counter()
+            await asyncio.sleep(args.step_seconds)
+            wall = time.perf_counter() - started
+            harness.step = Step()  # stop counting into this step
+            due = dashboards * sum(int(wall // period) for period in harness.periods.values())
+
+            all_jitter = [v for values in step.jitter.values() for v in values]
+            all_latency = [v for values in step.latency.values() for v in values]
+            row = {
+                "dashboards": dashboards,
+                "sockets": dashboards * len(FEED_PATHS),
+                "frames_per_s": step.frames / wall,
+                "delivery": min(step.frames / due, 1.0) if due else None,
+                "jitter": percentiles(all_jitter),
+                "latency": percentiles(all_latency),
+                "per_feed_latency_p99": {feed: percentiles(v)[1] for feed, v in step.latency.items()},
+                "missed": step.missed,
+                "skipped_ticks": await skipped_ticks(http_url) - skipped_before,
+                "disconnects": step.disconnects,
+                "disconnect_reasons": step.reasons,
+                "harness_cpu": (time.process_time() - harness_before) / wall * 100,
+            }
+            if server_before:
+                cpu, rss = sample_usage(pid)
+                row["server_cpu"] = (cpu - server_before[0]) / wall * 100
+                row["server_rss_mb"] = rss
+            received = step.frames + step.missed
+            p99 = row["latency"][1] if row["latency"][1] is not None else row["jitter"][1]
+            row["ok"] = (
+                step.disconnects == 0
+                and p99 is not None and p99 <= args.slo_ms
+                and step.missed / received <= args.max_missed
+                and (row["delivery"] is None or row["delivery"] >= 1 - args.max_missed)
+            )
+            rows.append(row)
+            print_row(row)
+            if not row["ok"] and args.stop_at_saturation:
+                break
+    finally:
+        await harness.close()
+    return rows
+
+
+# ---------- Report ----------
+def fmt(value, spec=".1f"):
+    return "-" if value is None else format(value, spec)
+
+
+HEADER = (f"{'dash':>6}{'sockets':>9}{'frames/s':>10}{'deliv%':>8}{'jit p50':>9}{'jit p99':>9}{'lat p50':>9}{'lat p99':>9}"
+          f"{'missed':>8}{'skipped':>8}{'disc':>6}{'srv CPU%':>10}{'RSS MB':>8}{'load CPU%':>10}  ok")
+
+
+def print_row(row):
+    print(f"{row['dashboards']:>6}{row['sockets']:>9}{row['frames_per_s']:>10.1f}{fmt(row['delivery'] and row['delivery'] * 100):>8}"
+          f"{fmt(row['jitter'][0]):>9}{fmt(row['jitter'][1]):>9}{fmt(row['latency'][0]):>9}{fmt(row['latency'][1]):>9}"
+          f"{row['missed']:>8}{row['skipped_ticks']:>8}{row['disconnects']:>6}"
+          f"{fmt(row.get('server_cpu')):>10}{fmt(row.get('server_rss_mb')):>8}{row['harness_cpu']:>10.1f}"
+          f"  {'✅' if row['ok'] else '❌'}")
+    for reason, count in row["disconnect_reasons"].items():
+        print(f"{'':>15}🔌 {count}× {reason}")
+
+
+def print_summary(rows, args):
+    passing = [row for row in rows if row["ok"]]
+    failing = [row for row in rows if not row["ok"]]
+    print()
+    if passing:
+        print(f"🏁 Capacity: {passing[-1]['dashboards']} dashboards ({passing[-1]['sockets']} sockets) "
+              f"within p99 ≤ {args.slo_ms:g} ms, ≤ {args.max_missed:.1%} missed frames, no disconnects")
+    else:
+        print("🏁 No step met the SLO")
+    if failing:
+        first = failing[0]
+        slow = max(first["per_feed_latency_p99"].items(), key=lambda item: item[1] or 0)
+        print(f"🔥 Saturated at {first['dashboards']} dashboards (worst feed p99: {slow[0]} {fmt(slow[1])} ms)")
+        if first["harness_cpu"] > 90:
+            print("⚠️ Load generator CPU was near 100% at saturation; run it from another machine to confirm")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(rows, f, indent=2)
+        print(f"📝 Rows written to {args.json}")
+
+
+# ---------- Main ----------
+def main():
+    parser = argparse.ArgumentParser(description="Ramp WebSocket dashboards against the feed streams.")
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 10, 50, 100, 250, 500],
+                        help="dashboards per step (each opens all three feeds)")
+    parser.add_argument("--step-seconds", type=float, default=20.0)
+    parser.add_argument("--warmup", type=float, default=5.0, help="seconds after connecting before measuring")
+    parser.add_argument("--slo-ms", type=float, default=250.0, help="tick latency p99 budget")
+    parser.add_argument("--max-missed", type=float, default=0.01, help="missed frame fraction budget")
+    parser.add_argument("--stop-at-saturation", action="store_true")
+    parser.add_argument("--url", default=None, help="attach to a running server (e.g. ws://host:8080)")
+    parser.add_argument("--pid", type=int, default=None, help="server pid for CPU/memory with --url")
+    parser.add_argument("--search", default="exact", help="SEARCH_BACKEND for the spawned gateway")
+    parser.add_argument("--standin-ms", type=float, default=25.0, help="STANDIN_LATENCY_MS for --search standin")
+    parser.add_argument("--workers", type=int, default=1, help="WEB_WORKERS for the spawned gateway")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--startup-timeout", type=float, default=120.0)
+    parser.add_argument("--quiet", action="store_true", help="hide the spawned gateway's output")
+    parser.add_argument("--json", default=None, help="also write the rows to this file")
+    args = parser.parse_args()
+
+    process = None
+    if args.url is None:
+        process = start_gateway(args)
+        args.url, args.pid = f"ws://127.0.0.1:{args.port}", process.pid
+    print(f"🏁 Ramping {args.clients} dashboards × {len(FEED_PATHS)} feeds against {args.url}\n")
+    print(HEADER)
+    print("-" * len(HEADER))
+    try:
+        rows = asyncio.run(ramp(args, args.pid))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=30)
+    print_summary(rows, args)
+
+
+if __name__ == "__main__":
+    main()
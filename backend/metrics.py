@@ -0,0 +1,165 @@
+# metrics.py
+"""In-process metrics with a Prometheus text endpoint (GET /metrics on every server).
+
+Histograms: vector query latency, tick duration and lateness, WebSocket send
+latency, Gemini call latency and time to first token. Gauges: connected clients and send queue
+depth, per WebSocket path. Counters: errors, recompute and strategy cache hits/misses,
+dropped frames, skipped ticks, kicked clients and prompt/response tokens. With several workers each
+process reports its own numbers.
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+# Seconds; covers sub-millisecond local search up to slow LLM calls
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+_registry = []
+_lock = threading.Lock()  # Pinecone batches observe from worker threads
+
+
+# ---------- Metric Types ----------
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.values = {}  # label values tuple → value
+        _registry.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels.get(label, "")) for label in self.labels)
+
+    def _format_labels(self, key, extra=()):
+        pairs = list(zip(self.labels, key)) + list(extra)
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+    def samples(self):
+        return [(self.name, self._format_labels(key), value) for key, value in self.values.items()]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines += [f"{name}{labels} {_number(value)}" for name, labels, value in self.samples()]
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with _lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    """Set directly, or computed at scrape time by collect() → {label values tuple: value}."""
+
+    kind = "gauge"
+
+    def __init__(self, name, help, labels=(), collect=None):
+        super().__init__(name, help, labels)
+        self.collect = collect
+
+    def set(self, value, **labels):
+        self.values[self._key(labels)] = value
+
+    def samples(self):
+        if self.collect is not None:
+            self.values = dict(self.collect())
+        return super().samples()
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, seconds, **labels):
+        key = self._key(labels)
+        with _lock:
+            counts, total, n = self.values.get(key, ([0] * len(self.buckets), 0.0, 0))
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    counts[i] += 1
+            self.values[key] = (counts, total + seconds, n + 1)
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self):
+        samples = []
+        for key, (counts, total, n) in self.values.items():
+            for bound, count in zip(self.buckets, counts):
+                samples.append((f"{self.name}_bucket", self._format_labels(key, [("le", _number(bound))]), count))
+            samples.append((f"{self.name}_bucket", self._format_labels(key, [("le", "+Inf")]), n))
+            samples.append((f"{self.name}_sum", self._format_labels(key), total))
+            samples.append((f"{self.name}_count", self._format_labels(key), n))
+        return samples
+
+
+# ---------- Metrics ----------
+QUERY_SECONDS = Histogram("f1_vector_query_seconds", "Vector index query latency per tick batch.", ["feed"])
+TICK_SECONDS = Histogram("f1_tick_seconds", "Time to compute one feed tick.", ["feed"])
+TICK_LATENESS = Histogram("f1_tick_lateness_seconds", "How late a tick started after its deadline.", ["feed"])
+SEND_SECONDS = Histogram("f1_ws_send_seconds", "Time to write one frame to a WebSocket.", ["path"])
+GEMINI_SECONDS = Histogram("f1_gemini_seconds", "Gemini strategy call latency.", ["outcome"])
+GEMINI_TTFT = Histogram("f1_gemini_ttft_seconds", "Time to the first streamed Gemini token.")
+
+ERRORS = Counter("f1_errors_total", "Errors by where they happened.", ["where"])
+CACHE = Counter("f1_recompute_cache_total", "Per-driver result lookups served from cache (hit) or re-queried (miss).",
+                ["feed", "result"])
+DROPPED_FRAMES = Counter("f1_ws_dropped_frames_total", "Frames dropped from full client send queues.", ["path"])
+SKIPPED_TICKS = Counter("f1_ticks_skipped_total", "Ticks skipped because the previous one overran.", ["feed"])
+KICKED = Counter("f1_ws_kicked_total", "Clients disconnected for falling too far behind.", ["path"])
+PROMPT_TOKENS = Counter("f1_prompt_tokens_total", "Strategy prompt tokens (estimated before the call, reported by Gemini after).",
+                        ["source"])
+RESPONSE_TOKENS = Counter("f1_response_tokens_total", "Strategy response tokens reported by Gemini.")
+STRATEGY_COALESCED = Counter("f1_strategy_coalesced_total", "Strategy requests that did not start their own model call.",
+                             ["how"])
+STRATEGY_CACHE = Counter("f1_strategy_cache_total", "Strategy requests answered from cache (hit) or the model (miss).",
+                         ["result"])
+
+# WebSocket path → live Subscribers, maintained by broadcast.serve()
+connections = {}
+CLIENTS = Gauge("f1_ws_clients", "Connected WebSocket clients.", ["path"],
+                collect=lambda: {(path,): len(subs) for path, subs in connections.items()})
+QUEUE_DEPTH = Gauge("f1_ws_queue_depth", "Frames waiting in client send queues.", ["path"],
+                    collect=lambda: {(path,): sum(len(s.frames) for s in subs) for path, subs in connections.items()})
+
+
+# ---------- Endpoint ----------
+def render():
+    return "\n".join(metric.render() for metric in _registry) + "\n"
+
+
+router = APIRouter()
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus text exposition format."""
+    return PlainTextResponse(render(), media_type="text/plain; version=0.0.4")
+
+
+# ---------- Helper Functions ----------
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
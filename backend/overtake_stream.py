@@ -1,20 +1,32 @@
 # server_overtakes.py
 import asyncio
 import random
-from fastapi import FastAPI, WebSocket
+from fastapi import APIRouter, FastAPI, WebSocket
 from fastapi.middleware.cors import CORSMiddleware
-from pinecone import Pinecone
 from dotenv import load_dotenv
 import os
 
+from broadcast import FeedProducer, serve
+from compaction import match_weight, top_k_fractions
+from feeds import GRID_DRIVERS
+from frames import negotiate
+from incremental import QueryCache
+import metrics
+from metrics import QUERY_SECONDS
+from replay import get_replay
+from risk_grid import RiskGrid
+from tracing import span
+from vector_search import get_routed_index
+
 load_dotenv()
 
-# ---------- Pinecone Setup ----------
-API_KEY = os.getenv("API_KEY")
-INDEX_NAME = "f1-overtake"
+# ---------- Index Setup ----------
+# SEARCH_BACKEND=pinecone (default) | exact | ivf | standin
+# RACE_TRACK / RACE_SEASONS route queries to the current track's partitions
+index = get_routed_index("overtake")
 
-pc = Pinecone(api_key=API_KEY)
-index = pc.Index(INDEX_NAME)
+# Optional precomputed lookup grid (risk_grid.py) answers queries without a search
+grid = RiskGrid.load(os.getenv("OVERTAKE_GRID")) if os.getenv("OVERTAKE_GRID") else None
 
 # ---------- FastAPI Setup ----------
 app = FastAPI()
@@ -26,9 +38,15 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# ---------- Telemetry Source ----------
+# TELEMETRY_SOURCE=replay streams a historical race instead of random jitter
+replay = get_replay()
+
+# Per-driver cached counts: under replay only cars whose telemetry moved are re-queried
+cache = QueryCache("overtake", name="overtakes", enabled=replay is not None)
+
 # ---------- Drivers ----------
-drivers = ["VER", "HAM", "LEC", "ALO", "SAI", "BOT", "MAG", "NOR", "GAS", "RUS",
-           "OCO", "PER", "TSU", "LAT", "RIC", "ZHO", "DEV", "SAI2", "HAM2", "VAR"]
+drivers = list(GRID_DRIVERS)
 
 # Base vector template: TrackNormalized fixed, others will randomize
 BASE_VECTORS = {driver: [0.9, 0.45, 0.35, 0.42, 0.50, 0.0] for driver in drivers}
@@ -36,52 +54,86 @@ BASE_VECTORS = {driver: [0.9, 0.45, 0.35, 0.42, 0.50, 0.0] for driver in drivers
 # ---------- Helper Function ----------
 async def query_pinecone(driver, vector):
     """Query Pinecone and count how often this driver appears in top matches."""
-    results = index.query(
+    if grid is not None:
+        return round(grid.lookup(vector).get(driver, 0))
+
+    # Search backends are blocking; keep the event loop free for the other feeds and the API
+    results = await asyncio.to_thread(
+        index.query,
         vector=vector,
         top_k=10,
         include_metadata=True
     )
     matches = results.get("matches", [])
-    count = sum(1 for m in matches if m.get("metadata", {}).get("Driver") == driver)
+    # Compacted vectors count once per merged record, up to top_k records
+    fractions = top_k_fractions([match_weight(m) for m in matches], 10)
+    count = round(sum(match_weight(m, driver) * f for m, f in zip(matches, fractions)))
     return count
 
+# ---------- Tick ----------
+TICK_SECONDS = 1
+
+
+async def compute_frame(refresh_count):
+    """One telemetry tick: randomize vectors, query the index, build the frame."""
+    driver_vectors = {}
+    counts = {}
+
+    # --- Telemetry: replayed race lap (every car in the replayed lap) ---
+    if replay is not None:
+        driver_vectors = replay.vectors("overtake", None)
+    else:
+        # --- Randomize telemetry vector per driver ---
+        for driver in drivers:
+            base = BASE_VECTORS[driver]
+            driver_vectors[driver] = [
+                base[0],  # TrackNormalized stays constant
+                min(max(base[1] + random.uniform(-0.05, 0.05), 0), 1),  # Position
+                min(max(base[2] + random.uniform(-0.05, 0.05), 0), 1),  # Compound
+                min(max(base[3] + random.uniform(-0.1, 0.1), 0), 1),    # TyreLife
+                min(max(base[4] + random.uniform(-0.1, 0.1), 0), 1),    # TrackTemp
+                min(max(base[5] + random.uniform(0, 0.1), 0), 1)        # Rainfall
+            ]
+
+    # --- Query Pinecone for each driver whose telemetry moved ---
+    lap = replay.served.get("overtake") if replay is not None else None
+    stale = cache.stale(list(driver_vectors), list(driver_vectors.values()), lap)
+    for driver in stale:
+        vec = driver_vectors[driver]
+        with QUERY_SECONDS.time(feed="overtakes"), span("overtakes.query", cars=1):
+            count = await query_pinecone(driver, vec)
+        cache.store([driver], [vec], [count], lap)
+    for driver in driver_vectors:
+        counts[driver] = cache.results[driver]
+
+    # --- Add refresh count; the drivers recomputed this tick go under "_meta", not beside the counts ---
+    counts["refresh_count"] = refresh_count
+    counts["_meta"] = {"fresh": stale}
+    return counts
+
+
 # ---------- WebSocket Endpoint ----------
-@app.websocket("/ws/overtakes")
+router = APIRouter()
+
+
+# One producer computes each tick; every client receives the same frame
+producer = FeedProducer("overtakes", compute_frame, TICK_SECONDS)
+
+
+@router.websocket("/ws/overtakes")
 async def overtakes_stream(websocket: WebSocket):
-    await websocket.accept()
-    refresh_count = 0
-
-    try:
-        while True:
-            refresh_count += 1
-            driver_vectors = {}
-            counts = {}
-
-            # --- Randomize telemetry vector per driver ---
-            for driver in drivers:
-                base = BASE_VECTORS[driver]
-                driver_vectors[driver] = [
-                    base[0],  # TrackNormalized stays constant
-                    min(max(base[1] + random.uniform(-0.05, 0.05), 0), 1),  # Position
-                    min(max(base[2] + random.uniform(-0.05, 0.05), 0), 1),  # Compound
-                    min(max(base[3] + random.uniform(-0.1, 0.1), 0), 1),    # TyreLife
-                    min(max(base[4] + random.uniform(-0.1, 0.1), 0), 1),    # TrackTemp
-                    min(max(base[5] + random.uniform(0, 0.1), 0), 1)        # Rainfall
-                ]
-
-            # --- Query Pinecone for each driver ---
-            for driver, vec in driver_vectors.items():
-                counts[driver] = await query_pinecone(driver, vec)
-
-            # --- Add refresh count and send JSON to frontend ---
-            counts["refresh_count"] = refresh_count
-            await websocket.send_json(counts)
-
-            # Wait 10 seconds before next telemetry update
-            await asyncio.sleep(1)
-
-    except Exception as e:
-        print("WebSocket closed:", e)
+    # ?proto=json|msgpack|binary&delta=1 (plain JSON by default)
+    await serve(websocket, producer.hub_for(*negotiate(websocket)), [producer])
+
+
+@router.get("/ws/overtakes/stats")
+async def stream_stats():
+    """Tick timing, per-client queue depth, lag and drop counters, and query reuse."""
+    return {**producer.stats(), "recompute": cache.stats()}
+
+
+app.include_router(router)
+app.include_router(metrics.router)
 
 # ---------- Run Server ----------
 if __name__ == "__main__":
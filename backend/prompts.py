@@ -0,0 +1,88 @@
+# prompts.py
+"""Compact, token-budgeted strategy prompts.
+
+Only decision-relevant fields reach the model: the cliff flag and similarity,
+undercut match counts and the top-N overtake counts. Per-tick noise
+(simulated_vector, refresh_count, fresh, _meta) is dropped. Full-grid inputs
+({car: entry} maps from FULL_GRID=1 feeds) are summarized into top-N tables,
+so prompt size does not grow with the grid. PROMPT_TOKEN_BUDGET caps the
+estimated size: tables shrink row by row until the prompt fits.
+"""
+import os
+
+from strategy_cache import NOISE_FIELDS, per_car
+
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "350"))
+PROMPT_TOP_N = int(os.getenv("PROMPT_TOP_N", "5"))
+CHARS_PER_TOKEN = 4  # rough estimate for English + numbers; Gemini reports exact counts afterwards
+
+HEADER = "ROLE: elite Formula 1 Chief Race Strategist.\nRACE SITUATION:"
+TASK = ("TASK: In 1-2 lines, give the strategic call for my car considering "
+        "tyre cliff risk, pit strategy (undercut/overcut) and the optimal next move.")
+
+
+def estimate_tokens(text):
+    return max(1, len(text) // CHARS_PER_TOKEN)
+
+
+# ---------- Sections ----------
+def _undercut_note(relevant, total):
+    if relevant < total:
+        return f"Recommended: Pit (Undercut successful in {relevant}/{total} scenarios)"
+    return "Safe: No similar scenarios where rival is yet to pit"
+
+
+def tyre_section(tire_data, top_n):
+    cars = per_car(tire_data)
+    if cars is None:
+        tire_data = tire_data or {}
+        level = "High" if tire_data.get("risk_detected") else "Low"
+        return f"- Tyre cliff risk: {level} (closest historical cliff similarity {tire_data.get('max_similarity', 0)})"
+    rows = sorted(cars.items(), key=lambda item: -float(item[1].get("max_similarity", 0) or 0))
+    lines = [f"- Tyre cliff risk, top {min(top_n, len(rows))} of {len(rows)} cars (car risk similarity):"]
+    lines += [f"  {car} {'HIGH' if e.get('risk_detected') else 'low'} {e.get('max_similarity', 0)}"
+              for car, e in rows[:top_n]]
+    return "\n".join(lines)
+
+
+def pit_section(pit_data, top_n):
+    cars = per_car(pit_data)
+    if cars is None:
+        pit_data = pit_data or {}
+        relevant, total = pit_data.get("relevant_matches", 0), pit_data.get("total_matches", 0)
+        return f"- Undercut: rival yet to pit in {relevant}/{total} similar stints → {_undercut_note(relevant, total)}"
+    rows = sorted(cars.items(), key=lambda item: -(item[1].get("relevant_matches", 0) or 0))
+    lines = [f"- Undercut chances, top {min(top_n, len(rows))} of {len(rows)} cars (car relevant/total):"]
+    lines += [f"  {car} {e.get('relevant_matches', 0)}/{e.get('total_matches', 0)}" for car, e in rows[:top_n]]
+    return "\n".join(lines)
+
+
+def overtake_section(overtake_data, top_n):
+    counts = {
+        driver: value for driver, value in (overtake_data or {}).items()
+        if driver not in NOISE_FIELDS and isinstance(value, (int, float)) and value > 0
+    }
+    if not counts:
+        return "- Overtakes: none likely"
+    rows = sorted(counts.items(), key=lambda item: (-item[1], item[0]))[:top_n]
+    shown = ", ".join(f"{driver} {value}" for driver, value in rows)
+    return f"- Overtake matches (of top 10), top {len(rows)} of {len(counts)} drivers: {shown}"
+
+
+# ---------- Builder ----------
+def build_prompt(overtake_data, tire_data, pit_data, budget=PROMPT_TOKEN_BUDGET, top_n=PROMPT_TOP_N):
+    """(prompt, estimated_tokens), shrinking the tables until the budget fits."""
+    for n in range(max(top_n, 1), 0, -1):  # PROMPT_TOP_N=0 still shows the top row
+        prompt = "\n".join([
+            HEADER,
+            tyre_section(tire_data, n),
+            pit_section(pit_data, n),
+            overtake_section(overtake_data, n),
+            TASK,
+        ])
+        tokens = estimate_tokens(prompt)
+        if tokens <= budget:
+            break
+    else:
+        print(f"⚠️ Strategy prompt is ~{tokens} tokens, over the {budget} token budget even at top-1")
+    return prompt, tokens
@@ -0,0 +1,213 @@
+# replay.py
+"""Historical race replay as a telemetry source for the stream servers.
+
+Enable with TELEMETRY_SOURCE=replay and pick the race with REPLAY_YEAR /
+REPLAY_TRACK (cached FastF1 session). REPLAY_SPEED sets the pace: 1 = live,
+10 = ten times faster, 0 = as fast as possible (one lap per tick).
+REPLAY_MY_CAR chooses which driver plays "MY_CAR" in the cliff and undercut feeds.
+
+REPLAY_SOURCE=dataset (default) replays the extracted laps in the combined
+CSVs, which are already in index space (the *_upload.py track enumeration,
+compound mapping and min-max scaling). The replayed race is held out of the
+search indexes (see held_out_race), so its laps are not matched against
+themselves. The datasets only hold event laps, so a car missing from a lap
+keeps its last vector (its first one before it appears). REPLAY_SOURCE=session replays every
+lap of the FastF1 session, but in data_*.py space: it gives realistic timing
+and grid shape, not realistic answers, since the uploads' fitted scaling is
+not stored anywhere to reproduce.
+"""
+import bisect
+import os
+import time
+import numpy as np
+
+from feeds import FEEDS
+
+DEFAULT_LAP_SECONDS = 95.0
+REPLAY_TRACK = os.getenv("REPLAY_TRACK", "United States Grand Prix")
+REPLAY_YEAR = int(os.getenv("REPLAY_YEAR", "2024"))
+REPLAY_SOURCE = os.getenv("REPLAY_SOURCE", "dataset")
+
+
+class ReplayLap:
+    def __init__(self, number, drivers, vectors, seconds):
+        self.number = number
+        self.drivers = drivers
+        self.vectors = vectors  # feed → (n_cars, D) array, rows in drivers order
+        self.seconds = seconds
+
+
+# ---------- Feature Building ----------
+def session_laps(session):
+    """Per-lap feature matrices for every car, built for the whole race in one vectorized pass.
+
+    Normalization follows the data_*.py extraction scripts, not the upload
+    stage, so these vectors are off-distribution for the indexes.
+    """
+    import pandas as pd
+    from data_cliff import COMPOUND_MAP, TRACK_MAP
+
+    laps = session.laps[["Driver", "LapNumber", "Position", "Compound", "TyreLife", "Time", "LapTime"]]
+    laps = laps.dropna(subset=["LapNumber", "Time"]).sort_values("Time")
+    weather = session.weather_data[["Time", "TrackTemp", "Rainfall"]].sort_values("Time")
+    laps = pd.merge_asof(laps, weather, on="Time", direction="nearest")
+
+    # Rival = the car one position ahead on the same lap
+    ahead = laps[["LapNumber", "Position", "Compound", "TyreLife", "Time"]].copy()
+    ahead["Position"] += 1
+    laps = laps.merge(ahead, on=["LapNumber", "Position"], how="left", suffixes=("", "_ahead"))
+
+    track = np.full(len(laps), TRACK_MAP.get(session.event["EventName"], 0.5))
+    compound = laps["Compound"].map(COMPOUND_MAP).fillna(0.0).values
+    tyre = laps["TyreLife"].fillna(0).values / 60
+    temp = laps["TrackTemp"].fillna(0).values / 80
+    rain = (laps["Rainfall"].fillna(0) > 0).astype(float).values
+    lap_norm = laps["LapNumber"].values / laps["LapNumber"].max()
+    position = laps["Position"].fillna(20).values / 20
+    rival_compound = laps["Compound_ahead"].map(COMPOUND_MAP).fillna(0.0).values
+    rival_tyre = laps["TyreLife_ahead"].fillna(0).values / 60
+    gap = (laps["Time"] - laps["Time_ahead"]).dt.total_seconds().fillna(20).values / 20
+
+    columns = {
+        "cliff": [track, compound, tyre, temp, rain, lap_norm, position],
+        "overtake": [track, position, compound, tyre, temp, rain],
+        "cuts": [track, lap_norm, position, compound, rival_compound, rival_tyre, gap, temp, rain],
+    }
+    features = {feed: np.clip(np.column_stack(cols), 0, 1).astype(np.float32) for feed, cols in columns.items()}
+    lap_seconds = laps["LapTime"].dt.total_seconds()
+
+    result = []
+    for number, rows in laps.groupby("LapNumber").indices.items():
+        seconds = np.nanmedian(lap_seconds.values[rows]) if len(rows) else np.nan
+        result.append(ReplayLap(
+            int(number),
+            laps["Driver"].values[rows].tolist(),
+            {feed: matrix[rows] for feed, matrix in features.items()},
+            float(seconds) if np.isfinite(seconds) else DEFAULT_LAP_SECONDS,
+        ))
+    return result
+
+
+def dataset_laps(track, year):
+    """Replay the extracted event laps of one race from the combined CSVs.
+
+    The datasets only hold event laps and normalize LapNumber differently, so
+    each feed's laps are taken in LapNumber order and aligned by rank.
+    """
+    from vector_search import load_combined
+
+    per_feed = {}
+    for feed, spec in FEEDS.items():
+        try:
+            combined = load_combined(feed)
+        except FileNotFoundError:
+            continue
+        race = combined[(combined["TrackName"] == track) & (combined["Year"] == year)]
+        per_feed[feed] = [
+            (group["Driver"].tolist(), group[spec["feature_cols"]].fillna(0).values.astype(np.float32))
+            for _, group in race.groupby("LapNumber")
+        ]
+
+    result = []
+    for i in range(max((len(laps) for laps in per_feed.values()), default=0)):
+        present = {feed: laps[i] for feed, laps in per_feed.items() if i < len(laps)}
+        drivers = sorted({d for ds, _ in present.values() for d in ds})
+        vectors = {}
+        for feed, (ds, matrix) in present.items():
+            full = np.full((len(drivers), matrix.shape[1]), np.nan, dtype=np.float32)
+            full[[drivers.index(d) for d in ds]] = matrix
+            vectors[feed] = full
+        result.append(ReplayLap(i + 1, drivers, vectors, DEFAULT_LAP_SECONDS))
+    return result
+
+
+# ---------- Replay Source ----------
+class ReplaySource:
+    """Serves the current lap's per-driver vectors, on a race clock scaled by speed."""
+
+    def __init__(self, laps, speed=1.0, my_car=None):
+        if not laps:
+            raise ValueError("❌ Nothing to replay.")
+        self.laps = laps
+        self.speed = speed
+        # Default MY_CAR: the car present on the most laps
+        counts = {}
+        for lap in laps:
+            for driver in lap.drivers:
+                counts[driver] = counts.get(driver, 0) + 1
+        self.my_car = my_car or max(counts, key=counts.get)
+        self.start = time.monotonic()
+        self.cursors = {}  # feed → lap index, used when speed <= 0
+        self.served = {}   # feed → number of the lap vectors() last served
+        self.last = {}     # (feed, driver) → last vector, for laps the car is missing from
+        self.lap_starts = np.cumsum([0.0] + [lap.seconds for lap in laps[:-1]]).tolist()
+        self.race_seconds = self.lap_starts[-1] + laps[-1].seconds
+
+    def current_lap(self, feed):
+        """Lap to serve now; the replay loops when the race ends."""
+        if self.speed <= 0:
+            index = self.cursors.get(feed, -1) + 1
+            self.cursors[feed] = index % len(self.laps)
+            return self.laps[self.cursors[feed]]
+        elapsed = ((time.monotonic() - self.start) * self.speed) % self.race_seconds
+        return self.laps[bisect.bisect_right(self.lap_starts, elapsed) - 1]
+
+    def vectors(self, feed, drivers=None):
+        """{driver: vector} for this lap; "MY_CAR" maps to REPLAY_MY_CAR, None means every car."""
+        lap = self.current_lap(feed)
+        self.served[feed] = lap.number
+        matrix = lap.vectors.get(feed)
+        rows = {d: i for i, d in enumerate(lap.drivers)} if matrix is not None else {}
+        result = {}
+        for driver in drivers or lap.drivers:
+            car = self.my_car if driver == "MY_CAR" else driver
+            row = rows.get(car)
+            if row is not None and not np.isnan(matrix[row]).any():
+                self.last[feed, car] = matrix[row].tolist()
+            elif (feed, car) not in self.last:
+                self.last[feed, car] = self._first_vector(feed, car)
+            if self.last[feed, car] is not None:
+                result[driver] = self.last[feed, car]
+        return result
+
+    def _first_vector(self, feed, car):
+        """The car's first vector in the race (stands in before its first event lap), else None."""
+        for lap in self.laps:
+            matrix = lap.vectors.get(feed)
+            if matrix is not None and car in lap.drivers:
+                row = matrix[lap.drivers.index(car)]
+                if not np.isnan(row).any():
+                    return row.tolist()
+        return None
+
+
+_replay = None
+
+
+def held_out_race():
+    """(TrackName, Year) the dataset replay plays back, else None.
+
+    The local indexes drop these rows and Pinecone queries filter them out;
+    otherwise every replayed lap would find itself at similarity 1.0.
+    """
+    if os.getenv("TELEMETRY_SOURCE", "random") != "replay" or REPLAY_SOURCE != "dataset":
+        return None
+    return REPLAY_TRACK, REPLAY_YEAR
+
+
+def get_replay():
+    """Shared replay source when TELEMETRY_SOURCE=replay, else None."""
+    global _replay
+    if os.getenv("TELEMETRY_SOURCE", "random") != "replay":
+        return None
+    if _replay is None:
+        year, track = REPLAY_YEAR, REPLAY_TRACK
+        if REPLAY_SOURCE == "dataset":
+            laps = dataset_laps(track, year)
+        else:
+            from data_cliff import get_race_session
+            print("⚠️ REPLAY_SOURCE=session vectors are in data_*.py space, not the index's upload space")
+            laps = session_laps(get_race_session(year, track))
+        _replay = ReplaySource(laps, float(os.getenv("REPLAY_SPEED", "1")), os.getenv("REPLAY_MY_CAR"))
+        print(f"📼 Replaying {track} {year}: {len(laps)} laps at {f'{_replay.speed:g}x' if _replay.speed else 'max speed'}")
+    return _replay
@@ -0,0 +1,193 @@
+# risk_grid.py
+"""Offline precompute of the stream aggregates over a per-track grid, for O(1) live lookups.
+
+Example:
+    python risk_grid.py --feed cliff --track "United States Grand Prix" --points 6 --around-base
+    # then run the stream with CLIFF_GRID=cliff_united-states-grand-prix.grid.npz
+"""
+import argparse
+import itertools
+import json
+import random
+import numpy as np
+
+from compaction import driver_weights, top_k_fractions
+from feeds import FEEDS, NUM_TRACKS, jitter_vector
+from vector_search import ExactIndex, load_combined, metadata_columns, partition_key
+
+CLIFF_THRESHOLD = 0.85
+BATCH = 4096
+
+
+# ---------- Aggregates ----------
+def aggregate(feed, index, queries):
+    """The per-driver answers the stream servers compute, for a batch of query rows.
+
+    cliff    -> max_similarity, matches_found (records above CLIFF_THRESHOLD)
+    cuts     -> total_matches, relevant_matches
+    overtake -> one match count per driver appearing in the metadata
+
+    Counts are weighted by how many records each (compacted) vector stands for,
+    up to top_k records in total.
+    """
+    top_k = FEEDS[feed]["top_k"]
+    scores, positions = index.search(queries, top_k)
+    weights = index.weights[positions]
+    fractions = top_k_fractions(weights, top_k)
+
+    if feed == "cliff":
+        above = (weights * fractions * (scores > CLIFF_THRESHOLD)).sum(axis=1)
+        return ["max_similarity", "matches_found"], np.stack([scores[:, 0].clip(min=0), above], axis=1)
+
+    if feed == "cuts":
+        pitted = np.array([m.get("Rival_Pitted_Lap", 0) for m in index.metadata], dtype=np.float32)
+        relevant = (pitted[positions] / NUM_TRACKS) > queries[:, 1:2]
+        used = weights * fractions
+        return ["total_matches", "relevant_matches"], np.stack([used.sum(axis=1), (used * relevant).sum(axis=1)], axis=1)
+
+    per_record = [driver_weights(m) for m in index.metadata]
+    drivers = sorted({d for w in per_record for d in w})
+    driver_matrix = np.zeros((len(per_record), len(drivers)), dtype=np.float32)
+    for row, w in enumerate(per_record):
+        for d, n in w.items():
+            driver_matrix[row, drivers.index(d)] = n
+    return drivers, (driver_matrix[positions] * fractions[:, :, None]).sum(axis=1)
+
+
+# ---------- Grid ----------
+class RiskGrid:
+    """Aggregates sampled on a regular grid; lookup() interpolates multilinearly."""
+
+    def __init__(self, feed, axes, values, outputs, meta=None):
+        self.feed = feed
+        self.axes = [np.asarray(a, dtype=np.float32) for a in axes]
+        self.values = values
+        self.outputs = list(outputs)
+        self.meta = meta or {}
+        kinds = FEEDS[feed]["kinds"]
+        # Binary dimensions snap to the nearest point; single-point axes are fixed
+        self._interp = [d for d, a in enumerate(self.axes) if len(a) > 1 and kinds[d] != "binary"]
+        self._corners = np.array(list(itertools.product([0, 1], repeat=len(self._interp))), dtype=np.int64)
+
+    def lookup(self, vector):
+        """Aggregates for one query vector, as {output_name: value}."""
+        base_idx = np.zeros(len(self.axes), dtype=np.int64)
+        frac = np.zeros(len(self._interp), dtype=np.float32)
+        for d, axis in enumerate(self.axes):
+            if len(axis) == 1:
+                continue
+            x = min(max(vector[d], axis[0]), axis[-1])
+            if d not in self._interp:
+                base_idx[d] = int(np.abs(axis - x).argmin())
+                continue
+            i = min(int(np.searchsorted(axis, x, side="right")) - 1, len(axis) - 2)
+            base_idx[d] = i
+            frac[self._interp.index(d)] = (x - axis[i]) / (axis[i + 1] - axis[i])
+
+        idx = np.tile(base_idx, (len(self._corners), 1))
+        idx[:, self._interp] += self._corners
+        weights = np.prod(np.where(self._corners == 1, frac, 1 - frac), axis=1)
+        corner_values = self.values[tuple(idx.T)].astype(np.float32)
+        return dict(zip(self.outputs, (weights @ corner_values).tolist()))
+
+    def save(self, path):
+        np.savez_compressed(
+            path,
+            values=self.values,
+            meta=json.dumps({"feed": self.feed, "outputs": self.outputs, **self.meta}),
+            **{f"axis_{d}": a for d, a in enumerate(self.axes)},
+        )
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path)
+        meta = json.loads(str(data["meta"]))
+        axes = [data[f"axis_{d}"] for d in range(len(FEEDS[meta["feed"]]["kinds"]))]
+        return cls(meta.pop("feed"), axes, data["values"], meta.pop("outputs"), meta)
+
+
+def build_axes(feed, points, around_base=False, track_value=None):
+    """One axis per dimension: fixed track, {0, 1} for binary, `points` samples otherwise."""
+    spec = FEEDS[feed]
+    axes = []
+    for d, kind in enumerate(spec["kinds"]):
+        base = spec["base_vector"][d]
+        if kind == "track":
+            axes.append([base if track_value is None else track_value])
+        elif kind == "binary":
+            axes.append([0.0, 1.0])
+        elif around_base:
+            low, high = spec["jitter"][d]
+            axes.append(np.unique(np.linspace(max(base + low, 0), min(base + high, 1), points)))
+        else:
+            axes.append(np.linspace(0, 1, points))
+    return axes
+
+
+def build_grid(feed, index, axes):
+    """Evaluate the aggregates at every grid point with exact search."""
+    shape = [len(a) for a in axes]
+    points = np.stack(np.meshgrid(*axes, indexing="ij"), axis=-1).reshape(-1, len(axes)).astype(np.float32)
+    outputs, chunks = None, []
+    for i in range(0, len(points), BATCH):
+        outputs, values = aggregate(feed, index, points[i:i + BATCH])
+        chunks.append(values)
+    values = np.concatenate(chunks).reshape(shape + [len(outputs)])
+    return RiskGrid(feed, axes, values.astype(np.float16), outputs)
+
+
+def measure_error(grid, index, samples=2000, seed=0):
+    """Interpolation error against exact search on stream-shaped (jittered) queries."""
+    spec = FEEDS[grid.feed]
+    rng = random.Random(seed)
+    base = list(spec["base_vector"])
+    base[0] = float(grid.axes[0][0])
+    queries = np.array([jitter_vector(grid.feed, base, rng) for _ in range(samples)], dtype=np.float32)
+
+    _, exact = aggregate(grid.feed, index, queries)
+    approx = np.array([[grid.lookup(q)[name] for name in grid.outputs] for q in queries])
+    errors = np.abs(approx - exact)
+    report = {"samples": samples, "max_abs_error": float(errors.max()),
+              "p99_abs_error": float(np.percentile(errors, 99))}
+    if grid.feed == "cliff":
+        report["risk_agreement"] = float(np.mean((approx[:, 0] > CLIFF_THRESHOLD) == (exact[:, 0] > CLIFF_THRESHOLD)))
+    return report
+
+
+# ---------- Main ----------
+def main():
+    parser = argparse.ArgumentParser(description="Precompute a per-track risk lookup grid.")
+    parser.add_argument("--feed", choices=sorted(FEEDS), default="cliff")
+    parser.add_argument("--track", required=True, help='e.g. "United States Grand Prix"')
+    parser.add_argument("--points", type=int, default=6, help="grid points per continuous dimension")
+    parser.add_argument("--around-base", action="store_true",
+                        help="span only the stream jitter range around BASE_VECTORS (finer grid)")
+    parser.add_argument("--track-value", type=float, default=None,
+                        help="TrackNormalized used live (defaults to the stream base vector)")
+    parser.add_argument("--samples", type=int, default=2000)
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args()
+
+    spec = FEEDS[args.feed]
+    combined = load_combined(args.feed)
+    track_rows = combined[combined["TrackName"] == args.track]
+    if track_rows.empty:
+        raise ValueError(f"❌ No {args.feed} rows for {args.track}.")
+    index = ExactIndex(track_rows[spec["feature_cols"]].fillna(0).values,
+                       track_rows[metadata_columns(args.feed, track_rows)].to_dict(orient="records"),
+                       weights=track_rows["Weight"].values if "Weight" in track_rows.columns else None)
+
+    axes = build_axes(args.feed, args.points, args.around_base, args.track_value)
+    print(f"🧮 Evaluating {int(np.prod([len(a) for a in axes])):,} grid points over {len(index)} vectors...")
+    grid = build_grid(args.feed, index, axes)
+    grid.meta["track"] = args.track
+    grid.meta["error"] = measure_error(grid, index, args.samples)
+
+    out = args.out or f"{args.feed}_{partition_key(args.track, 0)[:-2]}.grid.npz"
+    grid.save(out)
+    print(f"💾 Saved {out} ({grid.values.nbytes / 1e3:.1f} KB uncompressed)")
+    print(f"📏 Error bound vs exact search: {grid.meta['error']}")
+
+
+if __name__ == "__main__":
+    main()
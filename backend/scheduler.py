@@ -0,0 +1,79 @@
+# scheduler.py
+"""Deadline-based tick scheduling for the feed producers.
+
+Ticks fire at absolute deadlines (start + n * period), so query latency no
+longer stretches the cadence. A tick that finishes after one or more later
+deadlines have already passed skips them (coalesced into the next tick)
+instead of firing a burst to catch up. With ADAPTIVE_TICKS=1 the period grows
+while compute time eats most of it and shrinks back to the configured value
+once load drops.
+"""
+import asyncio
+import os
+import time
+from collections import deque
+
+import numpy as np
+
+ADAPTIVE_TICKS = os.getenv("ADAPTIVE_TICKS", "0") == "1"
+# Adaptive mode keeps compute time under this share of the period
+TARGET_LOAD = float(os.getenv("TICK_TARGET_LOAD", "0.7"))
+# ... and never stretches the period beyond this multiple of the configured one
+MAX_STRETCH = float(os.getenv("TICK_MAX_STRETCH", "4"))
+
+
+class TickScheduler:
+    def __init__(self, period, adaptive=ADAPTIVE_TICKS, history=200):
+        self.base_period = period
+        self.period = period
+        self.adaptive = adaptive
+        self.deadline = None
+        self.ticks = 0
+        self.skipped = 0
+        self.compute = deque(maxlen=history)   # seconds per tick
+        self.lateness = deque(maxlen=history)  # seconds past the deadline when the tick fired
+        self.ewma = 0.0
+
+    async def wait(self):
+        """Sleep until the next deadline; the first tick fires immediately.
+
+        Always yields to the event loop, even when the tick is already late,
+        so an overrunning feed cannot starve every other task.
+        """
+        now = time.monotonic()
+        if self.deadline is None or now >= self.deadline:
+            await asyncio.sleep(0)
+        else:
+            await asyncio.sleep(self.deadline - now)
+        now = time.monotonic()
+        if self.deadline is None:
+            self.deadline = now
+        elif now - self.deadline >= self.period:
+            # Overran by whole periods: drop those ticks rather than bursting
+            missed = int((now - self.deadline) // self.period)
+            self.skipped += missed
+            self.deadline += missed * self.period
+        self.lateness.append(max(now - self.deadline, 0.0))
+        self.ticks += 1
+
+    def record(self, seconds):
+        """Report one tick's compute time and schedule the next deadline."""
+        self.compute.append(seconds)
+        self.ewma = seconds if self.ticks <= 1 else 0.8 * self.ewma + 0.2 * seconds
+        if self.adaptive:
+            wanted = self.ewma / TARGET_LOAD
+            self.period = min(max(wanted, self.base_period), self.base_period * MAX_STRETCH)
+        self.deadline += self.period
+
+    def stats(self):
+        compute = np.array(self.compute) * 1000
+        lateness = np.array(self.lateness) * 1000
+        return {
+            "period_s": round(self.period, 3),
+            "ticks": self.ticks,
+            "skipped": self.skipped,
+            "compute_ms_p50": round(float(np.percentile(compute, 50)), 2) if len(compute) else None,
+            "compute_ms_p99": round(float(np.percentile(compute, 99)), 2) if len(compute) else None,
+            "lateness_ms_mean": round(float(lateness.mean()), 2) if len(lateness) else None,
+            "lateness_ms_max": round(float(lateness.max()), 2) if len(lateness) else None,
+        }
@@ -0,0 +1,127 @@
+# strategy_cache.py
+"""Strategy response cache keyed on a bucketed summary of the race situation.
+
+The dashboard posts new overtake / tire / pit dicts every tick, but the
+strategy only depends on a few coarse facts: the cliff risk flag, the
+undercut match counts, the leading overtake counts and the similarity
+score, quantized to STRATEGY_SCORE_STEP. Noise such as simulated_vector,
+refresh_count and fresh never reaches the key, so a repeated situation is
+answered from memory instead of calling Gemini again.
+
+Full-grid tire / pit inputs ({car: entry}, FULL_GRID=1) are reduced to one
+entry first, by tire_summary() and pit_summary(). strategy_engine uses the
+same reduction, so the key changes exactly when the signals do.
+"""
+import json
+import os
+import time
+from collections import OrderedDict
+
+from metrics import STRATEGY_CACHE
+
+STRATEGY_CACHE_SIZE = int(os.getenv("STRATEGY_CACHE_SIZE", "256"))
+STRATEGY_CACHE_TTL = float(os.getenv("STRATEGY_CACHE_TTL", "30"))  # seconds; 0 = never expire
+STRATEGY_SCORE_STEP = float(os.getenv("STRATEGY_SCORE_STEP", "0.05"))
+STRATEGY_TOP_OVERTAKES = int(os.getenv("STRATEGY_TOP_OVERTAKES", "3"))
+
+# Per-tick bookkeeping the streams add to their frames; never part of the key
+NOISE_FIELDS = {"refresh_count", "fresh", "simulated_vector", "tick_at", "_meta"}
+
+
+# ---------- Grid Inputs ----------
+def per_car(data):
+    """{car: entry} for full-grid inputs, else None."""
+    data = {k: v for k, v in (data or {}).items() if k not in NOISE_FIELDS}
+    if data and all(isinstance(v, dict) for v in data.values()):
+        return data
+    return None
+
+
+def tire_summary(tire_data):
+    """Single-car tire dict; a full grid is represented by its riskiest car."""
+    cars = per_car(tire_data)
+    if cars is None:
+        return tire_data or {}
+    return max(cars.values(), key=lambda e: (bool(e.get("risk_detected")), float(e.get("max_similarity", 0) or 0)))
+
+
+def pit_summary(pit_data):
+    """Single-car pit dict; a full grid is represented by its best undercut chance."""
+    cars = per_car(pit_data)
+    if cars is None:
+        return pit_data or {}
+
+    def chance(e):
+        relevant, total = e.get("relevant_matches", 0) or 0, e.get("total_matches", 0) or 0
+        return (relevant / total if total else 0.0, relevant)
+    return max(cars.values(), key=chance)
+
+
+# ---------- Situation Key ----------
+def situation_key(overtake_data, tire_data, pit_data):
+    """Canonical, bucketed summary of a strategy request (a JSON string)."""
+    tire_data, pit_data = tire_summary(tire_data), pit_summary(pit_data)
+    counts = {
+        driver: value for driver, value in (overtake_data or {}).items()
+        if driver not in NOISE_FIELDS and isinstance(value, (int, float)) and not isinstance(value, bool) and value > 0
+    }
+    top = sorted(counts.items(), key=lambda item: (-item[1], item[0]))[:STRATEGY_TOP_OVERTAKES]
+    score = float(tire_data.get("max_similarity", 0) or 0)
+    return json.dumps({
+        "risk": bool(tire_data.get("risk_detected")),
+        "similarity": round(round(score / STRATEGY_SCORE_STEP) * STRATEGY_SCORE_STEP, 4),
+        "undercut": [int(pit_data.get("relevant_matches", 0) or 0),
+                     int(pit_data.get("total_matches", 0) or 0)],
+        "overtakes": [[driver, round(value)] for driver, value in top],
+    }, sort_keys=True)
+
+
+# ---------- Cache ----------
+class StrategyCache:
+    """LRU cache with a TTL; hit rate is reported by stats() and /metrics."""
+
+    def __init__(self, maxsize=STRATEGY_CACHE_SIZE, ttl=STRATEGY_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries = OrderedDict()  # key → (stored_at, strategy)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is not None and self.ttl and time.monotonic() - entry[0] > self.ttl:
+            del self.entries[key]
+            entry = None
+        if entry is None:
+            self.misses += 1
+            STRATEGY_CACHE.inc(result="miss")
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        STRATEGY_CACHE.inc(result="hit")
+        return entry[1]
+
+    def peek(self, key):
+        """get() without counting a lookup (re-checks after a wait)."""
+        entry = self.entries.get(key)
+        if entry is None or (self.ttl and time.monotonic() - entry[0] > self.ttl):
+            return None
+        return entry[1]
+
+    def put(self, key, strategy):
+        self.entries[key] = (time.monotonic(), strategy)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+        }
@@ -0,0 +1,70 @@
+# strategy_engine.py
+"""Local, deterministic strategy calls from the structured stream signals.
+
+Scores four actions from the same inputs /api/strategy receives:
+    pit now - tyre cliff risk, undercut opportunities (rival yet to pit)
+    extend  - no cliff risk and few undercut opportunities
+    defend  - historical overtakes are likely here, worse on degrading tyres
+    attack  - overtakes are likely here and the tyres are healthy
+Runs in microseconds, so a recommendation is always available even when
+Gemini is slow or down; the model text is an optional refinement on top.
+"""
+from strategy_cache import NOISE_FIELDS, pit_summary, tire_summary
+
+RISK_THRESHOLD = 0.85  # cliff_stream.RISK_THRESHOLD
+OVERTAKE_TOP_K = 10    # overtake counts are out of the top-10 matches
+
+ACTIONS = ("pit now", "extend", "defend", "attack")
+
+
+def signals(overtake_data, tire_data, pit_data):
+    """The few numbers the rules use, each in [0, 1] (full grids reduced as in situation_key)."""
+    tire_data, pit_data = tire_summary(tire_data), pit_summary(pit_data)
+    counts = {
+        driver: value for driver, value in (overtake_data or {}).items()
+        if driver not in NOISE_FIELDS and isinstance(value, (int, float)) and not isinstance(value, bool)
+    }
+    leader = max(counts, key=counts.get) if counts else None
+    total = pit_data.get("total_matches", 0) or 0
+    similarity = float(tire_data.get("max_similarity", 0) or 0)
+    return {
+        "risk": 1.0 if tire_data.get("risk_detected") else 0.0,
+        # How far past the cliff threshold the closest historical cliff is
+        "cliff_margin": min(max((similarity - RISK_THRESHOLD) / (1 - RISK_THRESHOLD), 0.0), 1.0),
+        "undercut": (pit_data.get("relevant_matches", 0) or 0) / total if total else 0.0,
+        "pressure": min((counts[leader] if leader else 0) / OVERTAKE_TOP_K, 1.0),
+        "leader": leader,
+    }
+
+
+def recommend(overtake_data, tire_data, pit_data):
+    """Ranked actions with scores and reasons, plus a one-line summary."""
+    s = signals(overtake_data, tire_data, pit_data)
+    risk, undercut, pressure = s["risk"], s["undercut"], s["pressure"]
+
+    scores = {
+        "pit now": 0.5 * risk + 0.15 * risk * s["cliff_margin"] + 0.35 * undercut,
+        "extend": 0.6 * (1 - risk) * (1 - undercut) + 0.1 * (1 - pressure),
+        "defend": pressure * (0.45 + 0.35 * risk),
+        "attack": pressure * (1 - risk) * 0.7,
+    }
+    reasons = {
+        "pit now": [r for r in (
+            "tyre cliff risk detected" if risk else None,
+            f"undercut worked in {undercut:.0%} of similar stints" if undercut else None,
+        ) if r],
+        "extend": [r for r in (
+            "no tyre cliff risk" if not risk else None,
+            "few undercut opportunities" if undercut < 0.5 else None,
+        ) if r],
+        "defend": [f"{s['leader']} overtakes in {pressure:.0%} of similar situations"] if pressure else [],
+        "attack": ["overtakes are common here and tyres are healthy"] if pressure and not risk else [],
+    }
+
+    ranked = sorted(
+        ({"action": action, "score": round(scores[action], 3), "reasons": reasons[action]} for action in ACTIONS),
+        key=lambda item: -item["score"],
+    )
+    best = ranked[0]
+    summary = f"{best['action'].capitalize()}" + (f": {', '.join(best['reasons'])}." if best["reasons"] else ".")
+    return {"call": best["action"], "summary": summary, "ranked": ranked, "signals": s}
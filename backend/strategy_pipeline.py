@@ -0,0 +1,110 @@
+# strategy_pipeline.py
+"""Server-side strategy stage: subscribes to the feed producers, pushes calls on /ws/strategy.
+
+Instead of the dashboard collecting three feeds and POSTing them back to
+/api/strategy, the gateway relays every overtake, cliff and undercut frame
+here. Strategy is recomputed only when the combined situation_key changes.
+The local recommendation is pushed at once as {"type": "local", ...}. The
+Gemini text follows as {"type": "strategy", ...}, with at most one model call
+in flight: a newer situation waits for it, then the latest one is generated.
+The producers tick for this stage only while /ws/strategy has clients, and
+frames from ticks run for other clients are only stored, not evaluated.
+
+A client joining mid-session is seeded with the latest local call and the
+latest model text. Once the last client leaves the key is forgotten, so the
+next client gets a fresh local call even if the situation has not changed.
+"""
+import asyncio
+import json
+import os
+
+from broadcast import BroadcastHub
+from strategy_cache import NOISE_FIELDS, per_car, situation_key
+from strategy_engine import recommend
+
+# Which car the pipeline advises. Under FULL_GRID=1 set it to a driver code; if that car is
+# not in the frame, the whole grid is passed on and reduced by situation_key / recommend.
+STRATEGY_CAR = os.getenv("STRATEGY_CAR", "MY_CAR")
+
+
+class PipelineRelay:
+    """Producer relay target feeding one feed's frames into the pipeline."""
+
+    def __init__(self, pipeline, feed):
+        self.pipeline = pipeline
+        self.feed = feed
+
+    def __len__(self):
+        return len(self.pipeline.hub)
+
+    def publish(self, payload, keyframe=True):
+        self.pipeline.update(self.feed, json.loads(payload))
+
+
+class StrategyPipeline:
+    def __init__(self, generate):
+        self.generate = generate  # async (key, overtake_data, tire_data, pit_data) → strategy text
+        self.hub = BroadcastHub()
+        self.latest = {"overtakes": {}, "cliff": {}, "undercuts": {}}
+        self.key = None
+        self.task = None
+        self.updates = 0
+        self.recomputes = 0
+
+    def attach(self, producers):
+        """Subscribe to {feed name: FeedProducer}."""
+        for name, producer in producers.items():
+            producer.add_relay(PipelineRelay(self, name), lambda text: text)
+
+    def inputs(self):
+        """(overtake_data, tire_data, pit_data) in the /api/strategy request shape."""
+        def car(frame):
+            cars = per_car(frame)
+            if cars is None:
+                return {k: v for k, v in frame.items() if k not in NOISE_FIELDS}
+            return cars.get(STRATEGY_CAR, cars)
+
+        overtake = {k: v for k, v in self.latest["overtakes"].items() if k not in NOISE_FIELDS}
+        return overtake, car(self.latest["cliff"]), car(self.latest["undercuts"])
+
+    def update(self, feed, frame):
+        self.updates += 1
+        self.latest[feed] = frame
+        if not len(self.hub):
+            self.key = None  # advise from scratch when a client reconnects
+            return  # the producers also tick for other clients; only advise while /ws/strategy is open
+        overtake, tire, pit = self.inputs()
+        key = situation_key(overtake, tire, pit)
+        if key == self.key and self.hub.seed:
+            return  # an empty seed means every client left since the last call was published
+        self.key = key
+        self.recomputes += 1
+        self.hub.publish(json.dumps({"type": "local", "key": key, **recommend(overtake, tire, pit)}))
+        if self.task is None or self.task.done():
+            self.task = asyncio.ensure_future(self._enrich())
+
+    async def _enrich(self):
+        while True:
+            key, inputs = self.key, self.inputs()
+            try:
+                text = await self.generate(key, *inputs)
+            except Exception as e:
+                text = f"Error: {e}"
+            message = {"type": "strategy", "key": key, "current": key == self.key}
+            if text.startswith("Error:"):
+                message["error"] = text
+            else:
+                message["strategy"] = text
+            if len(self.hub):
+                # Seed = [latest local, latest strategy], so a joining client gets both
+                self.hub.publish(json.dumps(message), keyframe=False)
+            if self.key in (key, None):
+                return  # up to date, or every client left
+
+    def stats(self):
+        return {
+            "frames_seen": self.updates,
+            "recomputes": self.recomputes,
+            "model_call_in_flight": self.task is not None and not self.task.done(),
+            "clients": self.hub.stats(),
+        }
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Backend modules import each other by bare name (python cliff_stream.py, uvicorn gateway:app)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
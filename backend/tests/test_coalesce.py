@@ -0,0 +1,144 @@
+import asyncio
+import gc
+
+import pytest
+
+from coalesce import Debouncer, SingleFlight, StreamFlight
+
+
+def counting_stream(calls, words, delay=0.01, fail_after=None):
+    async def chunks():
+        calls.append(1)
+        for i, word in enumerate(words):
+            if fail_after is not None and i == fail_after:
+                raise RuntimeError("model failed")
+            await asyncio.sleep(delay)
+            yield word
+    return chunks
+
+
+async def read(flight, key, factory):
+    return [text async for text in flight.stream(key, factory)]
+
+
+# ---------- SingleFlight ----------
+def test_single_flight_shares_one_call_per_key():
+    async def run():
+        flight, calls = SingleFlight(), []
+
+        async def generate():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return "box"
+
+        results = await asyncio.gather(*(flight.run("k", generate) for _ in range(5)), flight.run("other", generate))
+        assert results == ["box"] * 6
+        assert len(calls) == 2 and flight.stats()["coalesced"] == 4
+
+    asyncio.run(run())
+
+
+def test_single_flight_cancels_only_when_every_waiter_left():
+    async def run():
+        flight, started = SingleFlight(), asyncio.Event()
+
+        async def generate():
+            started.set()
+            await asyncio.sleep(10)
+
+        first = asyncio.ensure_future(flight.run("k", generate))
+        second = asyncio.ensure_future(flight.run("k", generate))
+        await started.wait()
+        task = flight.inflight["k"][0]
+        first.cancel()
+        await asyncio.sleep(0)
+        assert not task.cancelled()
+        second.cancel()
+        await asyncio.gather(first, second, return_exceptions=True)
+        await asyncio.sleep(0)
+        assert task.cancelled()
+
+    asyncio.run(run())
+
+
+# ---------- StreamFlight ----------
+def test_concurrent_streams_share_one_model_stream():
+    async def run():
+        flight, calls = StreamFlight(), []
+        factory = counting_stream(calls, ["box", " this", " lap"])
+        first = asyncio.ensure_future(read(flight, "k", factory))
+        await asyncio.sleep(0.015)  # the second reader joins mid-stream
+        second = asyncio.ensure_future(read(flight, "k", factory))
+        assert await first == await second == ["box", " this", " lap"]
+        assert len(calls) == 1 and flight.stats()["coalesced"] == 1
+        assert flight.inflight == {}
+
+    asyncio.run(run())
+
+
+def test_stream_error_reaches_every_reader():
+    async def run():
+        flight, calls = StreamFlight(), []
+        factory = counting_stream(calls, ["box", " now"], fail_after=1)
+        results = await asyncio.gather(read(flight, "k", factory), read(flight, "k", factory),
+                                       return_exceptions=True)
+        assert [str(r) for r in results] == ["model failed", "model failed"]
+
+    asyncio.run(run())
+
+
+def test_stream_is_cancelled_when_the_last_reader_leaves():
+    async def run():
+        flight, calls = StreamFlight(), []
+        readers = [flight.stream("k", counting_stream(calls, ["a"] * 100)) for _ in range(2)]
+        for reader in readers:
+            await reader.__anext__()
+        shared = flight.inflight["k"]
+        await readers[0].aclose()
+        assert not shared.task.done()
+        await readers[1].aclose()
+        with pytest.raises(asyncio.CancelledError):
+            await shared.task
+
+    asyncio.run(run())
+
+
+# ---------- Debouncer ----------
+def test_debouncer_answers_the_whole_window_with_the_latest_request():
+    async def run():
+        debouncer, generated = Debouncer(window_ms=20), []
+
+        def request(situation):
+            async def generate():
+                generated.append(situation)
+                return f"call for {situation}"
+            return generate
+
+        answers = await asyncio.gather(*(debouncer.submit("s", request(n)) for n in range(3)),
+                                       debouncer.submit("other", request(9)))
+        assert answers == ["call for 2"] * 3 + ["call for 9"]
+        assert sorted(generated) == [2, 9] and debouncer.stats()["superseded"] == 2
+        assert debouncer.flushes == set()
+
+    asyncio.run(run())
+
+
+def test_debouncer_failure_with_no_waiters_left_is_not_unhandled():
+    async def run():
+        loop, unhandled = asyncio.get_running_loop(), []
+        loop.set_exception_handler(lambda _, context: unhandled.append(context))
+        debouncer = Debouncer(window_ms=10)
+
+        async def generate():
+            raise RuntimeError("model failed")
+
+        waiter = asyncio.ensure_future(debouncer.submit("s", generate))
+        await asyncio.sleep(0)
+        assert len(debouncer.flushes) == 1  # the flush is referenced while pending
+        waiter.cancel()
+        await asyncio.sleep(0.05)
+        gc.collect()
+        assert debouncer.flushes == set()
+        assert unhandled == []
+
+    asyncio.run(run())
@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from compaction import compact, driver_weights, match_weight, top_k_fractions
+
+
+def laps():
+    return pd.DataFrame([
+        {"TrackName": "Monaco", "Year": 2023, "Driver": "VER", "a": 0.101, "b": 0.50, "LapTimeLoss": 0.2},
+        {"TrackName": "Monaco", "Year": 2023, "Driver": "VER", "a": 0.105, "b": 0.51, "LapTimeLoss": 0.4},
+        {"TrackName": "Monaco", "Year": 2023, "Driver": "HAM", "a": 0.109, "b": 0.52, "LapTimeLoss": 0.6},
+        {"TrackName": "Monaco", "Year": 2024, "Driver": "HAM", "a": 0.102, "b": 0.50, "LapTimeLoss": 1.0},
+        {"TrackName": "Monaco", "Year": 2023, "Driver": "LEC", "a": 0.900, "b": 0.50, "LapTimeLoss": 0.1},
+    ])
+
+
+def test_compact_merges_one_cell_into_a_weighted_mean():
+    merged = compact(laps(), ["a", "b"], eps=0.05, group_cols=("TrackName", "Year"))
+    assert len(merged) == 3
+    cell = merged[(merged.Year == 2023) & (merged.Weight == 3)].iloc[0]
+    assert cell.a == pytest.approx(0.105) and cell.b == pytest.approx(0.51)
+    assert cell.LapTimeLoss == pytest.approx(0.4)
+    assert cell.Driver == "VER" and cell.Drivers == "VER:2|HAM:1"
+    assert merged.Weight.sum() == len(laps())
+
+
+def test_compact_never_merges_across_seasons():
+    merged = compact(laps(), ["a", "b"], eps=0.05, group_cols=("TrackName", "Year"))
+    assert sorted(merged[merged.Driver == "HAM"].Year) == [2024]
+    assert set(merged.Year) == {2023, 2024}
+
+
+def test_compact_is_a_no_op_without_eps():
+    df = laps()
+    assert compact(df, ["a", "b"], eps=0) is df
+
+
+def test_driver_weights_prefer_the_merged_summary():
+    assert driver_weights({"Drivers": "VER:2|HAM:1", "Driver": "VER", "Weight": 3}) == {"VER": 2, "HAM": 1}
+    assert driver_weights({"Driver": "LEC", "Weight": 4}) == {"LEC": 4}
+    assert driver_weights({}) == {}
+    match = {"metadata": {"Drivers": "VER:2|HAM:1", "Weight": 3}}
+    assert match_weight(match) == 3 and match_weight(match, "HAM") == 1 and match_weight(match, "SAI") == 0
+
+
+def test_top_k_fractions_cover_exactly_the_first_top_k_records():
+    fractions = top_k_fractions([3, 4, 5, 2], top_k=10)
+    assert fractions == pytest.approx([1.0, 1.0, 0.6, 0.0])
+    assert float(np.dot(fractions, [3, 4, 5, 2])) == pytest.approx(10)
+    assert top_k_fractions([1, 1, 1], top_k=10) == pytest.approx([1, 1, 1])
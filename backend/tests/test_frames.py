@@ -0,0 +1,130 @@
+import json
+
+from broadcast import FeedProducer
+from frames import DeltaEncoder, decode_binary, encode_binary, flatten, unflatten
+
+
+def frame(tick, similarity=0.9):
+    return {
+        "MY_CAR": {"matches_found": 3, "max_similarity": similarity, "risk_detected": True,
+                   "simulated_vector": [0.88, 0.5, 0.25]},
+        "refresh_count": tick,
+    }
+
+
+def apply(message, state):
+    """Client-side delta decoding: returns the full frame a message stands for."""
+    if message["type"] == "key":
+        state["base"], state["flat"] = message["seq"], flatten(message["frame"])
+        return message["frame"]
+    assert message["base"] == state["base"], "delta against a keyframe the client never saw"
+    return unflatten({**state["flat"], **message["changed"]})
+
+
+# ---------- DeltaEncoder ----------
+def test_delta_round_trip_reconstructs_every_frame():
+    encoder, state = DeltaEncoder(keyframe_every=4), {}
+    for tick in range(1, 12):
+        original = frame(tick, similarity=0.9 + tick / 100)
+        _, message = encoder.update(original)
+        assert apply(message, state) == original
+
+
+def test_keyframe_on_cadence_and_on_shape_change():
+    encoder = DeltaEncoder(keyframe_every=3)
+    kinds = [encoder.update(frame(tick))[0] for tick in range(1, 7)]
+    assert kinds == [True, False, False, True, False, False]
+    grown = {**frame(7), "HAM": {"max_similarity": 0.5}}
+    assert encoder.update(grown)[0]
+
+
+def test_delta_only_carries_changed_paths():
+    encoder = DeltaEncoder()
+    encoder.update(frame(1, 0.9))
+    _, message = encoder.update(frame(2, 0.9))
+    assert message["changed"] == {"refresh_count": 2}
+
+
+# ---------- Binary ----------
+def test_binary_round_trip_keyframe():
+    original = frame(5)
+    decoded = decode_binary(encode_binary({"type": "key", "seq": 5, "frame": original}))
+    assert decoded["type"] == "key" and decoded["seq"] == 5
+    car = decoded["frame"]["MY_CAR"]
+    assert car["matches_found"] == 3 and car["risk_detected"] is True
+    assert abs(car["max_similarity"] - 0.9) < 1e-6
+    assert [round(v, 2) for v in car["simulated_vector"]] == [0.88, 0.5, 0.25]  # float16
+
+
+def test_binary_round_trip_delta():
+    message = {"type": "delta", "seq": 7, "base": 4, "changed": {"refresh_count": 7, "MY_CAR.note": None}}
+    assert decode_binary(encode_binary(message)) == message
+
+
+def test_binary_plain_frame_is_a_keyframe():
+    decoded = decode_binary(encode_binary(frame(9)))
+    assert decoded["seq"] == 9 and decoded["frame"]["refresh_count"] == 9
+
+
+# ---------- Producer fan-out ----------
+async def noop(refresh_count):
+    return {}
+
+
+def test_delta_client_rejoining_an_emptied_hub_gets_the_current_keyframe():
+    producer = FeedProducer("test", noop, 1)
+    producer.deltas = DeltaEncoder(keyframe_every=100)
+    hub = producer.hub_for("json", True)
+
+    first = hub.subscribe()
+    for tick in range(1, 6):
+        producer.publish(frame(tick))
+    hub.unsubscribe(first)
+
+    for tick in range(6, 21):  # nobody on the delta hub: producer skips it
+        producer.publish(frame(tick))
+
+    second = hub.subscribe()
+    producer.publish(frame(21))
+    producer.publish(frame(22))
+    messages = [json.loads(payload) for _, payload, _ in second.frames]
+    state = {}
+    assert messages[0]["type"] == "key"
+    assert [apply(m, state)["refresh_count"] for m in messages] == [1, 21, 22]
+
+
+def test_binary_round_trip_string_lists():
+    # overtake frames carry "_meta": {"fresh": [driver codes]}
+    original = {"VER": 3, "_meta": {"fresh": ["VER", "HAM"]}, "empty": [], "refresh_count": 4}
+    decoded = decode_binary(encode_binary(original))
+    assert decoded["frame"]["_meta"]["fresh"] == ["VER", "HAM"]
+    assert decoded["frame"]["empty"] == []
+
+
+def test_encode_failure_does_not_stop_other_hubs(monkeypatch):
+    import broadcast
+
+    producer = FeedProducer("test", noop, 1)
+    plain = producer.hub.subscribe()
+    producer.hub_for("binary", False).subscribe()
+
+    def broken(proto, message):
+        raise ValueError("cannot encode")
+
+    monkeypatch.setattr(broadcast, "encode", broken)
+    producer.publish(frame(1))
+    producer.publish(frame(2))
+    assert [json.loads(payload)["refresh_count"] for _, payload, _ in plain.frames] == [1, 2]
+
+
+def test_slow_delta_client_never_queues_deltas_without_their_keyframe():
+    producer = FeedProducer("test", noop, 1)
+    producer.deltas = DeltaEncoder(keyframe_every=5)
+    slow = producer.hub_for("json", True).subscribe()
+    for tick in range(1, 9):  # queue holds 4: the tick-1 keyframe falls out while its deltas are queued
+        producer.publish(frame(tick, similarity=tick / 100))
+    messages = [json.loads(payload) for _, payload, _ in slow.frames]
+    state = {}
+    assert messages[0]["type"] == "key"
+    assert [apply(m, state)["refresh_count"] for m in messages][-1] == 8
+    assert slow.dropped > 0
@@ -0,0 +1,36 @@
+from incremental import QueryCache
+
+BASE = [0.88, 0.45, 0.70, 0.78, 0.0, 0.80, 0.35]  # cliff: track, compound, 3 uniform, rain, position
+
+
+def moved(vector, **changes):
+    names = ["TrackNormalized", "Compound", "TyreLife", "TrackTemp", "Rainfall", "LapNumber", "Position"]
+    return [changes.get(name, value) for name, value in zip(names, vector)]
+
+
+def test_jitter_below_each_kinds_threshold_reuses_the_result():
+    cache = QueryCache("cliff", eps=0.02)
+    cache.store(["VER"], [BASE], ["result"])
+    jittered = moved(BASE, Compound=0.49, Rainfall=0.04, TyreLife=0.71)
+    assert cache.stale(["VER"], [jittered]) == []
+
+
+def test_real_changes_are_requeried():
+    cache = QueryCache("cliff", eps=0.02)
+    cache.store(["VER"], [BASE], ["result"])
+    for change in ({"Compound": 0.6}, {"Rainfall": 1.0}, {"TyreLife": 0.75}, {"TrackNormalized": 0.5}):
+        assert cache.stale(["VER"], [moved(BASE, **change)]) == ["VER"], change
+
+
+def test_new_lap_and_unknown_driver_are_stale():
+    cache = QueryCache("cliff")
+    cache.store(["VER"], [BASE], ["result"], lap=3)
+    assert cache.stale(["VER", "HAM"], [BASE, BASE], lap=3) == ["HAM"]
+    assert cache.stale(["VER"], [BASE], lap=4) == ["VER"]
+
+
+def test_disabled_cache_queries_everyone():
+    cache = QueryCache("cliff", enabled=False)
+    cache.store(["VER"], [BASE], ["result"])
+    assert cache.stale(["VER"], [BASE]) == ["VER"]
+    assert cache.stats()["reuse_rate"] == 0.0
@@ -0,0 +1,25 @@
+from prompts import build_prompt, estimate_tokens
+
+
+def test_build_prompt_shows_at_least_one_row_when_top_n_is_not_positive():
+    tire = {"VER": {"risk_detected": True, "max_similarity": 0.9},
+            "HAM": {"risk_detected": False, "max_similarity": 0.5}}
+    for top_n in (0, -3):
+        prompt, tokens = build_prompt({}, tire, {}, top_n=top_n)
+        assert "top 1 of 2 cars" in prompt and "VER HIGH 0.9" in prompt
+        assert tokens == estimate_tokens(prompt)
+
+
+def test_build_prompt_tolerates_missing_single_car_feeds():
+    prompt, _ = build_prompt(None, None, None)
+    assert "Tyre cliff risk: Low (closest historical cliff similarity 0)" in prompt
+    assert "rival yet to pit in 0/0" in prompt
+    assert "Overtakes: none likely" in prompt
+
+
+def test_build_prompt_shrinks_tables_to_fit_the_budget():
+    tire = {f"C{i:02d}": {"risk_detected": False, "max_similarity": i / 100} for i in range(20)}
+    wide, wide_tokens = build_prompt({}, tire, {}, budget=10_000, top_n=20)
+    tight, tight_tokens = build_prompt({}, tire, {}, budget=wide_tokens - 20, top_n=20)
+    assert "top 20 of 20 cars" in wide
+    assert tight_tokens <= wide_tokens - 20 and "top 20 of 20" not in tight
@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+
+import replay
+import vector_search
+from feeds import FEEDS
+from replay import ReplayLap, ReplaySource, dataset_laps
+
+
+def write_cliff_csv(directory):
+    cols = FEEDS["cliff"]["feature_cols"]
+    rows = []
+    for track, year in (("Monaco Grand Prix", 2023), ("United States Grand Prix", 2024)):
+        for lap in (5, 9):
+            row = {c: 0.5 for c in cols}
+            row.update(TrackName=track, Year=year, LapNumber=lap / 60, Driver="VER",
+                       LapTimeLoss=0.4, Team="Red Bull")
+            rows.append(row)
+    pd.DataFrame(rows).to_csv(directory / FEEDS["cliff"]["combined_csv"], index=False)
+
+
+def test_dataset_replay_race_is_held_out_of_the_local_index(tmp_path, monkeypatch):
+    write_cliff_csv(tmp_path)
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("TELEMETRY_SOURCE", "replay")
+    monkeypatch.setattr(replay, "REPLAY_SOURCE", "dataset")
+    monkeypatch.setattr(replay, "REPLAY_TRACK", "United States Grand Prix")
+    monkeypatch.setattr(replay, "REPLAY_YEAR", 2024)
+
+    index = vector_search.load_feed_index("cliff")
+    assert {m["TrackName"] for m in index.metadata} == {"Monaco Grand Prix"}
+    assert index.ids == ["2023_0", "2023_1"]  # upload ids survive the filter
+    assert list(vector_search.load_partitions("cliff")) == ["monaco-grand-prix-2023"]
+    # The replay itself still reads the held-out race
+    assert len(dataset_laps("United States Grand Prix", 2024)) == 2
+
+
+def test_no_hold_out_without_dataset_replay(monkeypatch):
+    monkeypatch.setenv("TELEMETRY_SOURCE", "random")
+    assert replay.held_out_race() is None
+
+
+def test_my_car_is_served_on_every_lap_of_the_replay():
+    laps = [
+        ReplayLap(1, ["HAM"], {"cliff": np.array([[0.3, 0.3]], dtype=np.float32)}, 1),
+        ReplayLap(2, ["VER", "HAM"], {"cliff": np.array([[0.1, 0.1], [0.2, 0.2]], dtype=np.float32)}, 1),
+        ReplayLap(3, ["HAM"], {"cliff": np.array([[0.3, 0.3]], dtype=np.float32)}, 1),
+        ReplayLap(4, ["VER"], {"cliff": np.array([[0.4, 0.4]], dtype=np.float32)}, 1),
+    ]
+    source = ReplaySource(laps, speed=0, my_car="VER")
+    served = [source.vectors("cliff", ["MY_CAR"])["MY_CAR"][0] for _ in laps]
+    assert served == [np.float32(0.1), np.float32(0.1), np.float32(0.1), np.float32(0.4)]
+
+
+def test_default_my_car_is_the_car_on_the_most_laps():
+    laps = [ReplayLap(i, drivers, {}, 1) for i, drivers in enumerate((["ALO"], ["HAM", "ALO"], ["HAM"], ["HAM"]))]
+    assert ReplaySource(laps).my_car == "HAM"
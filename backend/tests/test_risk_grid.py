@@ -0,0 +1,67 @@
+import itertools
+
+import numpy as np
+import pytest
+
+from risk_grid import RiskGrid, aggregate, build_axes, build_grid
+from vector_search import ExactIndex, synthetic_corpus
+
+
+def linear_grid():
+    """Cliff-shaped grid whose values are a known linear function of the query."""
+    axes = build_axes("cliff", points=5)
+    coefficients = np.array([0, 1, 2, -1, 3, 0.5, 1.5], dtype=np.float32)
+    shape = [len(a) for a in axes]
+    values = np.zeros(shape + [2], dtype=np.float32)
+    for idx in itertools.product(*(range(n) for n in shape)):
+        point = np.array([axes[d][i] for d, i in enumerate(idx)])
+        values[idx] = [point @ coefficients, 1.0]
+    return RiskGrid("cliff", axes, values, ["score", "one"]), coefficients
+
+
+def test_lookup_is_exact_at_grid_points_and_linear_between_them():
+    grid, coefficients = linear_grid()
+    rng = np.random.default_rng(0)
+    for _ in range(50):
+        vector = rng.random(7).astype(np.float32)
+        vector[0] = grid.axes[0][0]
+        vector[4] = round(vector[4])
+        answer = grid.lookup(vector)
+        assert answer["score"] == pytest.approx(float(vector @ coefficients), abs=1e-4)
+        assert answer["one"] == pytest.approx(1.0)
+
+
+def test_lookup_snaps_binary_dims_and_clamps_out_of_range():
+    grid, coefficients = linear_grid()
+    vector = np.array([grid.axes[0][0], 0.5, 0.5, 0.5, 0.8, 0.5, 0.5], dtype=np.float32)
+    snapped = vector.copy()
+    snapped[4] = 1.0
+    assert grid.lookup(vector)["score"] == pytest.approx(float(snapped @ coefficients), abs=1e-4)
+    beyond = vector.copy()
+    beyond[1] = 1.7
+    edge = snapped.copy()
+    edge[1] = 1.0
+    assert grid.lookup(beyond)["score"] == pytest.approx(float(edge @ coefficients), abs=1e-4)
+
+
+def test_save_load_round_trip(tmp_path):
+    grid, _ = linear_grid()
+    grid.meta = {"track": "Monaco"}
+    path = tmp_path / "cliff.grid.npz"
+    grid.save(path)
+    loaded = RiskGrid.load(path)
+    assert loaded.outputs == grid.outputs and loaded.meta == {"track": "Monaco"}
+    vector = np.array([grid.axes[0][0], 0.3, 0.6, 0.1, 0, 0.9, 0.4], dtype=np.float32)
+    assert loaded.lookup(vector) == pytest.approx(grid.lookup(vector))
+
+
+def test_built_grid_matches_exact_aggregates_at_its_points():
+    index = ExactIndex(synthetic_corpus("cliff", 500, seed=6))
+    axes = build_axes("cliff", points=2)
+    grid = build_grid("cliff", index, axes)
+    point = np.array([a[-1] for a in axes], dtype=np.float32)
+    outputs, values = aggregate("cliff", index, point[None, :])
+    assert outputs == ["max_similarity", "matches_found"]
+    answer = grid.lookup(point)
+    assert answer["max_similarity"] == pytest.approx(values[0, 0], abs=1e-3)  # float16 storage
+    assert answer["matches_found"] == pytest.approx(values[0, 1], abs=0.05)
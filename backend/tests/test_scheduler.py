@@ -0,0 +1,66 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import scheduler
+from scheduler import TickScheduler
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Virtual monotonic clock; sleeping advances it and records the request."""
+    state = SimpleNamespace(now=100.0, sleeps=[])
+
+    async def sleep(seconds):
+        state.sleeps.append(seconds)
+        state.now += seconds
+
+    monkeypatch.setattr(scheduler, "time", SimpleNamespace(monotonic=lambda: state.now))
+    monkeypatch.setattr(scheduler, "asyncio", SimpleNamespace(sleep=sleep))
+    return state
+
+
+def tick(ticks, clock, compute):
+    asyncio.run(ticks.wait())
+    clock.now += compute
+    ticks.record(compute)
+
+
+def test_ticks_fire_at_absolute_deadlines(clock):
+    ticks = TickScheduler(period=1.0, adaptive=False)
+    for _ in range(4):
+        tick(ticks, clock, compute=0.3)
+    # Compute time is absorbed into the period instead of stretching the cadence
+    assert clock.sleeps == pytest.approx([0, 0.7, 0.7, 0.7])
+    assert clock.now == pytest.approx(103.3)
+    assert ticks.skipped == 0 and ticks.stats()["ticks"] == 4
+
+
+def test_overrun_skips_missed_ticks_instead_of_bursting(clock):
+    ticks = TickScheduler(period=1.0, adaptive=False)
+    tick(ticks, clock, compute=2.5)  # runs past the deadlines at 101 and 102
+    asyncio.run(ticks.wait())
+    assert ticks.skipped == 1  # one tick fires for both
+    assert ticks.deadline == pytest.approx(102.0)
+    assert ticks.lateness[-1] == pytest.approx(0.5)
+
+
+def test_wait_yields_even_when_late(clock):
+    ticks = TickScheduler(period=1.0, adaptive=False)
+    tick(ticks, clock, compute=1.5)
+    asyncio.run(ticks.wait())
+    assert clock.sleeps == [0, 0]  # first tick and the late tick both yield to the loop
+
+
+def test_adaptive_period_stretches_under_load_within_bounds(clock, monkeypatch):
+    monkeypatch.setattr(scheduler, "TARGET_LOAD", 0.5)
+    monkeypatch.setattr(scheduler, "MAX_STRETCH", 2.0)
+    ticks = TickScheduler(period=1.0, adaptive=True)
+    tick(ticks, clock, compute=0.75)
+    assert ticks.period == pytest.approx(1.5)
+    tick(ticks, clock, compute=5.0)
+    assert ticks.period == pytest.approx(2.0)
+    for _ in range(30):
+        tick(ticks, clock, compute=0.01)
+    assert ticks.period == pytest.approx(1.0)
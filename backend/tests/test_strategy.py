@@ -0,0 +1,94 @@
+import asyncio
+import json
+
+import strategy_pipeline
+from strategy_cache import situation_key
+from strategy_engine import signals
+from strategy_pipeline import StrategyPipeline
+
+
+def grid(**cars):
+    return {"refresh_count": 7, "_meta": {"fresh": ["VER"]}, **cars}
+
+
+def test_grid_key_reflects_the_riskiest_car_and_best_undercut():
+    tire = grid(VER={"risk_detected": False, "max_similarity": 0.7},
+                HAM={"risk_detected": True, "max_similarity": 0.93})
+    pit = grid(VER={"relevant_matches": 2, "total_matches": 10},
+               HAM={"relevant_matches": 6, "total_matches": 8})
+    key = json.loads(situation_key({}, tire, pit))
+    assert key["risk"] is True
+    assert key["similarity"] == 0.95
+    assert key["undercut"] == [6, 8]
+
+
+def test_grid_key_changes_when_one_car_changes():
+    calm = grid(VER={"risk_detected": False, "max_similarity": 0.7},
+                HAM={"risk_detected": False, "max_similarity": 0.6})
+    worse = grid(VER={"risk_detected": False, "max_similarity": 0.7},
+                 HAM={"risk_detected": True, "max_similarity": 0.9})
+    pit = grid(VER={"relevant_matches": 0, "total_matches": 10})
+    assert situation_key({}, calm, pit) != situation_key({}, worse, pit)
+
+
+def test_grid_signals_match_the_single_car_they_reduce_to():
+    tire = grid(VER={"risk_detected": False, "max_similarity": 0.7},
+                HAM={"risk_detected": True, "max_similarity": 0.93})
+    pit = grid(VER={"relevant_matches": 2, "total_matches": 10},
+               HAM={"relevant_matches": 6, "total_matches": 8})
+    single = signals({}, tire["HAM"], pit["HAM"])
+    assert signals({}, tire, pit) == single
+    assert single["risk"] == 1.0 and single["undercut"] == 0.75
+    assert situation_key({}, tire, pit) == situation_key({}, tire["HAM"], pit["HAM"])
+
+
+def test_pipeline_key_follows_a_full_grid_without_strategy_car():
+    pipeline = StrategyPipeline(generate=None)
+    pipeline.latest["cliff"] = grid(VER={"risk_detected": False, "max_similarity": 0.7},
+                                    HAM={"risk_detected": False, "max_similarity": 0.6})
+    pipeline.latest["undercuts"] = grid(VER={"relevant_matches": 1, "total_matches": 10})
+    calm = situation_key(*pipeline.inputs())
+    pipeline.latest["cliff"]["HAM"] = {"risk_detected": True, "max_similarity": 0.92}
+    assert situation_key(*pipeline.inputs()) != calm
+
+
+def test_pipeline_advises_strategy_car_when_it_is_in_the_grid(monkeypatch):
+    monkeypatch.setattr(strategy_pipeline, "STRATEGY_CAR", "VER")
+    pipeline = StrategyPipeline(generate=None)
+    pipeline.latest["cliff"] = grid(VER={"risk_detected": False, "max_similarity": 0.7},
+                                    HAM={"risk_detected": True, "max_similarity": 0.92})
+    _, tire, _ = pipeline.inputs()
+    assert tire == {"risk_detected": False, "max_similarity": 0.7}
+
+
+def pipeline_frames(pipeline):
+    pipeline.latest["cliff"] = grid(MY_CAR={"risk_detected": True, "max_similarity": 0.9})
+    pipeline.update("undercuts", grid(MY_CAR={"relevant_matches": 3, "total_matches": 10}))
+
+
+def received(subscriber):
+    return [json.loads(text)["type"] for _, text, _ in subscriber.frames]
+
+
+def test_pipeline_seeds_joiners_and_readvises_after_everyone_left():
+    async def generate(key, overtake, tire, pit):
+        return "Box now."
+
+    async def run():
+        pipeline = StrategyPipeline(generate)
+        first = pipeline.hub.subscribe()
+        pipeline_frames(pipeline)
+        await pipeline.task
+        assert received(first) == ["local", "strategy"]
+
+        # A client joining mid-session gets the local call and the model text
+        assert received(pipeline.hub.subscribe()) == ["local", "strategy"]
+
+        for subscriber in list(pipeline.hub.subscribers):
+            pipeline.hub.unsubscribe(subscriber)
+        again = pipeline.hub.subscribe()
+        pipeline_frames(pipeline)  # same situation as before
+        await pipeline.task
+        assert received(again) == ["local", "strategy"]
+
+    asyncio.run(run())
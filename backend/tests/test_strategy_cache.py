@@ -0,0 +1,51 @@
+import json
+from types import SimpleNamespace
+
+import strategy_cache
+from strategy_cache import StrategyCache, situation_key
+
+
+def test_key_ignores_per_tick_noise():
+    tire = {"risk_detected": True, "max_similarity": 0.91}
+    pit = {"relevant_matches": 2, "total_matches": 10}
+    quiet = situation_key({"VER": 3}, tire, pit)
+    noisy = situation_key({"VER": 3, "refresh_count": 99, "_meta": {"fresh": ["VER"]}},
+                          {**tire, "simulated_vector": [0.1], "tick_at": 12.5},
+                          {**pit, "refresh_count": 4})
+    assert quiet == noisy
+
+
+def test_key_buckets_similarity_to_the_score_step():
+    tire = lambda score: {"risk_detected": False, "max_similarity": score}
+    assert situation_key({}, tire(0.911), {}) == situation_key({}, tire(0.924), {})
+    assert situation_key({}, tire(0.924), {}) != situation_key({}, tire(0.926), {})
+    assert json.loads(situation_key({}, tire(0.926), {}))["similarity"] == 0.95
+
+
+def test_key_keeps_only_the_leading_overtakes():
+    overtakes = {"VER": 5, "HAM": 4, "LEC": 4, "SAI": 1, "NOR": 0, "flag": True}
+    key = json.loads(situation_key(overtakes, {}, {}))
+    assert key["overtakes"] == [["VER", 5], ["HAM", 4], ["LEC", 4]]
+    assert situation_key({**overtakes, "SAI": 2}, {}, {}) == situation_key(overtakes, {}, {})
+
+
+def test_cache_evicts_least_recently_used():
+    cache = StrategyCache(maxsize=2, ttl=0)
+    cache.put("a", "A")
+    cache.put("b", "B")
+    assert cache.get("a") == "A"  # "b" is now the oldest
+    cache.put("c", "C")
+    assert cache.get("b") is None and cache.get("a") == "A" and cache.get("c") == "C"
+    assert cache.stats() == {"entries": 2, "hits": 3, "misses": 1, "evictions": 1, "hit_rate": 0.75}
+
+
+def test_cache_entries_expire_after_the_ttl(monkeypatch):
+    clock = SimpleNamespace(now=0.0)
+    monkeypatch.setattr(strategy_cache, "time", SimpleNamespace(monotonic=lambda: clock.now))
+    cache = StrategyCache(maxsize=4, ttl=30)
+    cache.put("a", "A")
+    clock.now = 29
+    assert cache.peek("a") == "A" and cache.get("a") == "A"
+    clock.now = 31
+    assert cache.peek("a") is None and cache.get("a") is None
+    assert cache.stats()["entries"] == 0
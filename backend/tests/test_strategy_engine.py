@@ -0,0 +1,39 @@
+from strategy_engine import ACTIONS, recommend
+
+
+def tire(risk, similarity):
+    return {"risk_detected": risk, "max_similarity": similarity}
+
+
+def pit(relevant, total=10):
+    return {"relevant_matches": relevant, "total_matches": total}
+
+
+def test_pit_now_on_cliff_risk_and_undercut():
+    result = recommend({}, tire(True, 0.95), pit(8))
+    assert result["call"] == "pit now"
+    assert result["summary"] == "Pit now: tyre cliff risk detected, undercut worked in 80% of similar stints."
+
+
+def test_extend_when_calm():
+    result = recommend({"refresh_count": 7}, tire(False, 0.4), pit(0))
+    assert result["call"] == "extend"
+    assert result["signals"]["pressure"] == 0.0 and result["signals"]["leader"] is None
+
+
+def test_attack_under_overtake_pressure_on_healthy_tyres():
+    result = recommend({"HAM": 10, "VER": 2}, tire(False, 0.5), pit(0))
+    assert result["call"] == "attack"
+    assert result["signals"]["leader"] == "HAM"
+
+
+def test_defend_under_pressure_on_degrading_tyres():
+    result = recommend({"HAM": 10}, tire(True, 0.86), pit(0))
+    assert result["call"] == "defend"
+    assert result["summary"] == "Defend: HAM overtakes in 100% of similar situations."
+
+
+def test_every_action_is_ranked_best_first():
+    ranked = recommend({"HAM": 4}, tire(True, 0.9), pit(3))["ranked"]
+    assert sorted(r["action"] for r in ranked) == sorted(ACTIONS)
+    assert [r["score"] for r in ranked] == sorted((r["score"] for r in ranked), reverse=True)
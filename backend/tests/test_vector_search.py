@@ -0,0 +1,88 @@
+import numpy as np
+
+import vector_search
+from vector_search import ExactIndex, PineconeIndex, get_routed_index, synthetic_corpus
+
+
+def brute_force(index, vector, threshold, limit=None):
+    q = np.asarray(vector, dtype=np.float32)
+    scores = index.unit @ (q / np.linalg.norm(q))
+    count = int(index.weights[scores > threshold].sum())
+    return (min(count, limit) if limit else count), float(scores.max())
+
+
+def corpus(n=3000, seed=0):
+    vectors = synthetic_corpus("cliff", n, seed=seed)
+    weights = np.random.default_rng(seed).integers(1, 4, size=n)
+    return vectors, weights
+
+
+class FakePinecone:
+    """Answers Pinecone-style queries from a local index, Weight in metadata as uploaded."""
+
+    def __init__(self, index):
+        self.local = index
+
+    def query(self, vector, top_k, include_metadata, **kwargs):
+        return self.local.query(vector, top_k=top_k, include_metadata=include_metadata)
+
+
+def test_count_above_matches_brute_force():
+    vectors, weights = corpus()
+    index = ExactIndex(vectors, weights=weights)
+    queries = synthetic_corpus("cliff", 20, seed=1)
+    for threshold in (0.9, 0.97, 0.995):
+        for limit in (None, 1, 30):
+            for q in queries:
+                count, best = index.count_above(q, threshold, limit)
+                expected_count, expected_best = brute_force(index, q, threshold, limit)
+                assert count == expected_count
+                assert abs(best - expected_best) < 1e-5
+
+
+def test_count_above_many_matches_count_above():
+    vectors, weights = corpus()
+    index = ExactIndex(vectors, weights=weights)
+    queries = synthetic_corpus("cliff", 20, seed=2)
+    for limit in (None, 1, 30):
+        batch = index.count_above_many(queries, 0.97, limit)
+        single = [index.count_above(q, 0.97, limit) for q in queries]
+        assert [c for c, _ in batch] == [c for c, _ in single]
+        assert np.allclose([b for _, b in batch], [b for _, b in single], atol=1e-5)
+
+
+def test_count_above_handles_duplicate_heavy_corpora():
+    # Few distinct vectors → most k-means blocks stay empty
+    vectors = np.repeat(synthetic_corpus("cliff", 3, seed=3), 1000, axis=0)
+    index = ExactIndex(vectors)
+    count, best = index.count_above(vectors[0], 0.999)
+    assert count == brute_force(index, vectors[0], 0.999)[0]
+    assert abs(best - 1.0) < 1e-5
+
+
+def test_pinecone_counts_compacted_weight_like_the_local_index():
+    vectors, weights = corpus(n=500)
+    metadata = [{"Weight": int(w)} for w in weights]
+    local = ExactIndex(vectors, metadata, weights=weights)
+    remote = PineconeIndex(FakePinecone(ExactIndex(vectors, metadata)))
+    queries = synthetic_corpus("cliff", 10, seed=4)
+    for threshold in (0.97, 0.995):
+        expected = [local.count_above(q, threshold, 30)[0] for q in queries]
+        assert [c for c, _ in remote.count_above_many(queries, threshold, 30)] == expected
+        assert [remote.count_above(q, threshold, 30)[0] for q in queries] == expected
+
+
+def test_routing_skips_namespaces_without_a_season_suffix(monkeypatch, capsys):
+    vectors = synthetic_corpus("cliff", 10, seed=5)
+    shards = {name: ExactIndex(vectors) for name in (
+        "emilia-2023", "emilia-2024", "emilia-romagna-grand-prix-2024", "emilia-backup")}
+    monkeypatch.setattr(vector_search, "_indexes", {("cliff", "exact", "partitions"): shards})
+
+    routed = get_routed_index("cliff", track="Emilia", seasons=[2024], fallback=False, backend="exact")
+    assert routed.shards == [shards["emilia-2024"]]
+    assert get_routed_index("cliff", track="Emilia", fallback=False, backend="exact").shards == [
+        shards["emilia-2023"], shards["emilia-2024"]]
+
+    # Built once per (feed, backend, track, seasons): repeat calls reuse it without logging again
+    assert get_routed_index("cliff", track="Emilia", seasons=[2024], fallback=False, backend="exact") is routed
+    assert capsys.readouterr().out.count("🧭") == 2
@@ -0,0 +1,56 @@
+import asyncio
+
+import workers
+from broadcast import FeedProducer
+
+
+def producer_on(bus, ticks):
+    async def compute_frame(tick):
+        ticks.append(tick)
+        return {"refresh_count": tick}
+
+    producer = FeedProducer("overtakes", compute_frame, period=0.02)
+    producer.bus = bus.register(producer)
+    return producer
+
+
+async def wait_until(condition, timeout=2.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline, "timed out"
+        await asyncio.sleep(0.01)
+
+
+def test_leader_ticks_only_while_a_follower_has_clients(tmp_path, monkeypatch):
+    monkeypatch.setattr(workers, "FOLLOWER_REPORT_S", 0.02)
+
+    async def run():
+        path = str(tmp_path / "bus.sock")
+        leader_bus, follower_bus = workers.StreamBus(path), workers.StreamBus(path)
+        leader_ticks, follower_ticks = [], []
+        leader = producer_on(leader_bus, leader_ticks)
+        follower = producer_on(follower_bus, follower_ticks)
+
+        leader.ensure_running()
+        assert leader_bus.leader
+        follower.ensure_running()  # connects without clients
+        await wait_until(lambda: follower_bus.writer is not None)
+        await asyncio.sleep(0.1)
+        assert leader_ticks == []  # a connected follower alone does not keep the feed ticking
+
+        subscriber = follower.hub.subscribe()
+        follower.ensure_running()
+        await asyncio.wait_for(subscriber.get(), timeout=2)
+        assert follower_ticks == [] and leader_ticks
+
+        follower.hub.unsubscribe(subscriber)
+        await wait_until(lambda: leader.task.done())
+        stopped_at = len(leader_ticks)
+        await asyncio.sleep(0.1)
+        assert len(leader_ticks) == stopped_at
+
+        for bus in (leader_bus, follower_bus):
+            bus.task.cancel()
+        await asyncio.gather(leader_bus.task, follower_bus.task, return_exceptions=True)
+
+    asyncio.run(run())
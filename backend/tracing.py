@@ -0,0 +1,188 @@
+# tracing.py
+"""Stage-level tracing spans, exported as a Chrome trace (chrome://tracing or ui.perfetto.dev).
+
+    with span("cliff.query", cars=20):
+        ...
+
+    @traced("data_cliff.extract")
+    def extract_tire_cliff_laps(...):
+        ...
+
+TRACE_FILE=trace.json turns tracing on. The file is written at exit (or by
+flush()); "{pid}" in the name gives each worker process its own file. Spans
+from concurrent asyncio tasks go on one row per task, so ticks, sends and
+model calls that overlap don't tangle. Per-stage aggregates (count, total,
+mean and max ms) are printed at exit and returned by stats(); past
+TRACE_MAX_EVENTS spans only the aggregates keep growing.
+
+With TRACE_FILE unset, span() returns one shared no-op object and traced()
+returns the function itself, so instrumented code costs a function call.
+"""
+import asyncio
+import atexit
+import functools
+import json
+import os
+import threading
+import time
+
+TRACE_FILE = os.getenv("TRACE_FILE", "")
+TRACE_MAX_EVENTS = int(os.getenv("TRACE_MAX_EVENTS", "1000000"))
+ENABLED = bool(TRACE_FILE)
+
+_events = []
+_totals = {}  # name → [count, total_s, max_s]
+_rows = set()  # tids that already have a name event
+_lock = threading.Lock()
+_origin = time.perf_counter()
+
+
+# ---------- Recording ----------
+def _row():
+    """Trace row (tid) and its label: the running asyncio task, else the thread."""
+    try:
+        task = asyncio.current_task()
+    except RuntimeError:
+        task = None
+    if task is not None:
+        return id(task), task.get_name()
+    thread = threading.current_thread()
+    return thread.ident, thread.name
+
+
+def _record(name, start, end, args):
+    seconds = end - start
+    tid, label = _row()
+    with _lock:
+        total = _totals.setdefault(name, [0, 0.0, 0.0])
+        total[0] += 1
+        total[1] += seconds
+        total[2] = max(total[2], seconds)
+        if len(_events) >= TRACE_MAX_EVENTS:
+            return
+        if tid not in _rows:
+            _rows.add(tid)
+            _events.append({"ph": "M", "name": "thread_name", "pid": os.getpid(), "tid": tid, "args": {"name": label}})
+        _events.append({
+            "name": name,
+            "cat": name.split(".", 1)[0],
+            "ph": "X",
+            "ts": round((start - _origin) * 1e6, 1),
+            "dur": round(seconds * 1e6, 1),
+            "pid": os.getpid(),
+            "tid": tid,
+            "args": args,
+        })
+
+
+class Span:
+    __slots__ = ("name", "args", "start")
+
+    def __init__(self, name, args):
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.args["error"] = exc_type.__name__
+        _record(self.name, self.start, time.perf_counter(), self.args)
+        return False
+
+    def set(self, **args):
+        """Attach values learned inside the span (result sizes, cache hits)."""
+        self.args.update(args)
+
+
+class NoSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, **args):
+        pass
+
+
+NO_SPAN = NoSpan()
+
+
+def span(name, **args):
+    """Context manager timing one stage; args show up on the event in the trace viewer."""
+    if not ENABLED:
+        return NO_SPAN
+    return Span(name, args)
+
+
+def traced(name=None):
+    """Decorator form of span() for sync and async functions (named module.function by default)."""
+    def wrap(fn):
+        if not ENABLED:
+            return fn
+        label = name or f"{fn.__module__}.{fn.__qualname__}"
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def run_async(*args, **kwargs):
+                with Span(label, {}):
+                    return await fn(*args, **kwargs)
+            return run_async
+
+        @functools.wraps(fn)
+        def run(*args, **kwargs):
+            with Span(label, {}):
+                return fn(*args, **kwargs)
+        return run
+    return wrap
+
+
+# ---------- Aggregates / Export ----------
+def stats():
+    """{stage: {count, total_ms, mean_ms, max_ms}}, largest total first."""
+    with _lock:
+        totals = sorted(_totals.items(), key=lambda item: -item[1][1])
+    return {
+        name: {
+            "count": count,
+            "total_ms": round(total * 1000, 2),
+            "mean_ms": round(total / count * 1000, 3),
+            "max_ms": round(longest * 1000, 2),
+        }
+        for name, (count, total, longest) in totals
+    }
+
+
+def summary():
+    rows = stats()
+    if not rows:
+        return
+    print(f"\n⏱️ Trace summary ({os.getpid()}):")
+    print(f"{'stage':<36}{'count':>9}{'total ms':>12}{'mean ms':>10}{'max ms':>10}")
+    for name, row in rows.items():
+        print(f"{name:<36}{row['count']:>9}{row['total_ms']:>12.1f}{row['mean_ms']:>10.3f}{row['max_ms']:>10.1f}")
+
+
+def flush(path=None):
+    """Write everything recorded so far as Chrome trace JSON; returns the path."""
+    path = (path or TRACE_FILE).replace("{pid}", str(os.getpid()))
+    with _lock:
+        events = list(_events)
+    with open(path, "w") as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+    return path
+
+
+def _at_exit():
+    if not _totals:
+        return
+    summary()
+    print(f"📝 Trace written to {flush()} ({len(_events)} events)")
+
+
+if ENABLED:
+    atexit.register(_at_exit)
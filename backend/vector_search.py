@@ -0,0 +1,509 @@
+# vector_search.py
+"""Local cosine search backends with the same query() shape as a Pinecone index."""
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+from feeds import FEEDS
+from replay import held_out_race
+
+
+# ---------- Exact (brute force) ----------
+class ExactIndex:
+    """Brute-force cosine search over an in-memory float32 matrix.
+
+    weights (optional) is the number of original records each vector stands
+    for after compaction; count_above() sums them.
+    """
+
+    def __init__(self, vectors, metadata=None, ids=None, weights=None):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        self.unit = vectors / norms
+        self.metadata = metadata if metadata is not None else [{} for _ in range(len(vectors))]
+        self.ids = ids if ids is not None else [str(i) for i in range(len(vectors))]
+        self.weights = np.ones(len(vectors), dtype=np.float32) if weights is None else np.asarray(weights, dtype=np.float32)
+        self._blocks = None
+
+    def __len__(self):
+        return len(self.unit)
+
+    @property
+    def nbytes(self):
+        return self.unit.nbytes
+
+    def search(self, queries, top_k):
+        """Return (scores, positions) of the top_k neighbours for each query row."""
+        queries = _normalize(queries)
+        scores = queries @ self.unit.T
+        return _top_k(scores, top_k)
+
+    def query(self, vector, top_k=10, include_metadata=True, **kwargs):
+        scores, positions = self.search([vector], top_k)
+        return _as_response(self, scores[0], positions[0], include_metadata)
+
+    def query_many(self, vectors, top_k=10, include_metadata=True):
+        """query() for a batch of vectors in one matrix product."""
+        scores, positions = self.search(vectors, top_k)
+        return [_as_response(self, s, p, include_metadata) for s, p in zip(scores, positions)]
+
+    def count_above(self, vector, threshold, limit=None):
+        """Count vectors with cosine similarity > threshold, stopping once limit is reached.
+
+        Vectors are grouped into blocks with a centroid and angular radius, so
+        cos(max(0, angle(q, centroid) - radius)) bounds every score in a block.
+        Blocks are visited best-bound first. Counting ends at the first block
+        whose bound falls below the threshold (or once limit is reached); the
+        scan continues only while a block could still beat the best score, so
+        the returned (count, max_similarity) has the exact max. With limit=1
+        the count is an existence check.
+        """
+        if self._blocks is None:
+            self._build_blocks()
+        blocked, blocked_weights, offsets, centroids, radii = self._blocks
+
+        q = _normalize([vector])[0]
+        angles = np.arccos(np.clip(centroids @ q, -1.0, 1.0))
+        bounds = np.cos(np.maximum(angles - radii, 0.0))
+
+        count, best = 0, 0.0
+        for b in np.argsort(-bounds):
+            counting = bounds[b] > threshold and not (limit and count >= limit)
+            if not counting and bounds[b] <= best:
+                break
+            scores = blocked[offsets[b]:offsets[b + 1]] @ q
+            if not len(scores):
+                continue
+            best = max(best, float(scores.max()))
+            if counting:
+                count += int(blocked_weights[offsets[b]:offsets[b + 1]][scores > threshold].sum())
+        return (min(count, limit) if limit else count), best
+
+    def count_above_many(self, vectors, threshold, limit=None):
+        """count_above() for a batch: each block is scanned once for all queries, best bound first."""
+        if self._blocks is None:
+            self._build_blocks()
+        blocked, blocked_weights, offsets, centroids, radii = self._blocks
+
+        queries = _normalize(vectors)
+        angles = np.arccos(np.clip(queries @ centroids.T, -1.0, 1.0))
+        bounds = np.cos(np.maximum(angles - radii, 0.0))
+
+        counts = np.zeros(len(queries), dtype=np.float32)
+        best = np.zeros(len(queries), dtype=np.float32)
+        block_bounds = bounds.max(axis=0)
+        for b in np.argsort(-block_bounds):
+            done = counts >= limit if limit else np.zeros(len(queries), dtype=bool)
+            if block_bounds[b] <= best.min() and (block_bounds[b] <= threshold or done.all()):
+                break  # no query can count or beat its best score here, nor in any later block
+            counting = (bounds[:, b] > threshold) & ~done
+            if not (counting | (bounds[:, b] > best)).any():
+                continue
+            scores = blocked[offsets[b]:offsets[b + 1]] @ queries.T
+            if not len(scores):
+                continue
+            best = np.maximum(best, scores.max(axis=0))
+            counts += (blocked_weights[offsets[b]:offsets[b + 1]] @ (scores > threshold)) * counting
+        if limit:
+            counts = np.minimum(counts, limit)
+        return [(int(c), float(s)) for c, s in zip(counts, best)]
+
+    def _build_blocks(self, block_size=256, max_blocks=4096):
+        # Past max_blocks (10^6 vectors) blocks grow instead, keeping k-means and assignment tractable
+        n_blocks = min(max(len(self.unit) // block_size, 1), max_blocks)
+        centroids = _kmeans(self.unit, min(n_blocks, len(self.unit)), seed=0)
+        assignment = _assign(self.unit, centroids)
+        order = np.argsort(assignment, kind="stable")
+        offsets = np.searchsorted(assignment[order], np.arange(len(centroids) + 1))
+        blocked = self.unit[order]
+
+        radii = np.zeros(len(centroids), dtype=np.float32)
+        for b in range(len(centroids)):
+            members = blocked[offsets[b]:offsets[b + 1]]
+            if len(members):
+                radii[b] = np.arccos(np.clip((members @ centroids[b]).min(), -1.0, 1.0))
+        # Small slack so float rounding never skips a block that holds a hit
+        self._blocks = (blocked, self.weights[order], offsets, centroids, radii + 1e-4)
+
+
+# ---------- Approximate (IVF) ----------
+class IVFIndex(ExactIndex):
+    """Inverted-file ANN index: k-means coarse lists, exact scoring inside nprobe lists."""
+
+    def __init__(self, vectors, metadata=None, ids=None, weights=None, nlist=64, nprobe=4, seed=0):
+        super().__init__(vectors, metadata, ids, weights)
+        self.nprobe = nprobe
+        self.centroids = _kmeans(self.unit, min(nlist, max(len(self.unit), 1)), seed)
+        assignment = _assign(self.unit, self.centroids)
+        self.lists = [np.flatnonzero(assignment == c) for c in range(len(self.centroids))]
+
+    @property
+    def nbytes(self):
+        return self.unit.nbytes + self.centroids.nbytes + sum(l.nbytes for l in self.lists)
+
+    def search(self, queries, top_k):
+        queries = _normalize(queries)
+        probe = np.argsort(-(queries @ self.centroids.T), axis=1)[:, :self.nprobe]
+        all_scores = np.full((len(queries), top_k), -np.inf, dtype=np.float32)
+        all_positions = np.full((len(queries), top_k), -1, dtype=np.int64)
+
+        for row, lists in enumerate(probe):
+            candidates = np.concatenate([self.lists[c] for c in lists])
+            if len(candidates) == 0:
+                continue
+            scores = self.unit[candidates] @ queries[row]
+            best_scores, best = _top_k(scores[None, :], top_k)
+            n = best.shape[1]
+            all_scores[row, :n] = best_scores[0]
+            all_positions[row, :n] = candidates[best[0]]
+        return all_scores, all_positions
+
+
+# ---------- Remote stand-in ----------
+class LatencyStandIn:
+    """Wrap a local index and add a fixed round trip per query, like a hosted index."""
+
+    def __init__(self, index, latency_ms=25.0):
+        self.index = index
+        self.latency_ms = latency_ms
+
+    def __len__(self):
+        return len(self.index)
+
+    @property
+    def nbytes(self):
+        return self.index.nbytes
+
+    def search(self, queries, top_k):
+        time.sleep(self.latency_ms / 1000 * len(queries))
+        return self.index.search(queries, top_k)
+
+    def query(self, vector, top_k=10, include_metadata=True, **kwargs):
+        time.sleep(self.latency_ms / 1000)
+        return self.index.query(vector, top_k=top_k, include_metadata=include_metadata)
+
+    def count_above(self, vector, threshold, limit=None):
+        time.sleep(self.latency_ms / 1000)
+        return self.index.count_above(vector, threshold, limit)
+
+    # One round trip per batch, like a batched request to a hosted index
+    def query_many(self, vectors, top_k=10, include_metadata=True):
+        time.sleep(self.latency_ms / 1000)
+        return self.index.query_many(vectors, top_k=top_k, include_metadata=include_metadata)
+
+    def count_above_many(self, vectors, threshold, limit=None):
+        time.sleep(self.latency_ms / 1000)
+        return self.index.count_above_many(vectors, threshold, limit)
+
+
+# ---------- Pinecone ----------
+class PineconeIndex:
+    """Pinecone index with the same helper methods as the local backends."""
+
+    def __init__(self, index, namespace=None):
+        self.index = index
+        self.namespace = namespace
+        race = held_out_race()
+        self.filter = None if race is None else {
+            "$or": [{"TrackName": {"$ne": race[0]}}, {"Year": {"$ne": race[1]}}]
+        }
+
+    def query(self, vector, top_k=10, include_metadata=True, **kwargs):
+        if self.namespace:
+            kwargs.setdefault("namespace", self.namespace)
+        if self.filter:
+            kwargs.setdefault("filter", self.filter)
+        return self.index.query(vector=vector, top_k=top_k, include_metadata=include_metadata, **kwargs)
+
+    def count_above(self, vector, threshold, limit=None):
+        """Threshold check via a top-k (Pinecone has no range query), counting compacted Weight."""
+        return self._count(self.query(vector, top_k=limit or 30, include_metadata=True), threshold, limit)
+
+    def query_many(self, vectors, top_k=10, include_metadata=True):
+        """One request per vector, issued concurrently so a batch costs about one round trip."""
+        vectors = [list(map(float, v)) for v in vectors]
+        return list(_query_pool().map(
+            lambda v: self.query(v, top_k=top_k, include_metadata=include_metadata), vectors))
+
+    def count_above_many(self, vectors, threshold, limit=None):
+        results = self.query_many(vectors, top_k=limit or 30, include_metadata=True)
+        return [self._count(result, threshold, limit) for result in results]
+
+    @staticmethod
+    def _count(result, threshold, limit):
+        """(records above threshold, best score) for one response, like ExactIndex.count_above."""
+        matches = result.get("matches", [])
+        count = sum(int((m.get("metadata") or {}).get("Weight", 1)) for m in matches if m.get("score", 0) > threshold)
+        return (min(count, limit) if limit else count), max((m.get("score", 0) for m in matches), default=0)
+
+
+# ---------- Partitions ----------
+def partition_key(track_name, year):
+    """Shard / Pinecone namespace name, e.g. 'united-states-grand-prix-2024'."""
+    slug = "-".join(str(track_name).lower().replace("-", " ").split())
+    return f"{slug}-{int(year)}"
+
+
+class RoutedIndex:
+    """Searches only the shards of one track (optionally some seasons), merging results."""
+
+    def __init__(self, shards, fallback=None):
+        self.shards = shards
+        self.fallback = fallback
+
+    def query(self, vector, top_k=10, include_metadata=True, **kwargs):
+        if not self.shards:
+            return self._fallback().query(vector, top_k=top_k, include_metadata=include_metadata)
+        matches = []
+        for shard in self.shards:
+            matches += shard.query(vector, top_k=top_k, include_metadata=include_metadata).get("matches", [])
+        if not matches and self.fallback is not None:
+            return self.fallback.query(vector, top_k=top_k, include_metadata=include_metadata)
+        matches.sort(key=lambda m: m.get("score", 0), reverse=True)
+        return {"matches": matches[:top_k]}
+
+    def count_above(self, vector, threshold, limit=None):
+        if not self.shards:
+            return self._fallback().count_above(vector, threshold, limit)
+        count, best = 0, 0.0
+        for shard in self.shards:
+            shard_count, shard_best = shard.count_above(vector, threshold, limit and limit - count)
+            count += shard_count
+            best = max(best, shard_best)
+            if limit and count >= limit:
+                break
+        return count, best
+
+    def query_many(self, vectors, top_k=10, include_metadata=True):
+        if not self.shards:
+            return self._fallback().query_many(vectors, top_k=top_k, include_metadata=include_metadata)
+        rows = [[] for _ in vectors]
+        for shard in self.shards:
+            for row, result in zip(rows, shard.query_many(vectors, top_k=top_k, include_metadata=include_metadata)):
+                row += result.get("matches", [])
+        if not any(rows) and self.fallback is not None:
+            return self.fallback.query_many(vectors, top_k=top_k, include_metadata=include_metadata)
+        return [{"matches": sorted(row, key=lambda m: m.get("score", 0), reverse=True)[:top_k]} for row in rows]
+
+    def count_above_many(self, vectors, threshold, limit=None):
+        if not self.shards:
+            return self._fallback().count_above_many(vectors, threshold, limit)
+        counts, best = np.zeros(len(vectors), dtype=np.int64), np.zeros(len(vectors))
+        for shard in self.shards:
+            shard_counts, shard_best = zip(*shard.count_above_many(vectors, threshold, limit))
+            counts += shard_counts
+            best = np.maximum(best, shard_best)
+        if limit:
+            counts = np.minimum(counts, limit)
+        return [(int(c), float(s)) for c, s in zip(counts, best)]
+
+    def _fallback(self):
+        if self.fallback is None:
+            raise LookupError("❌ No partition for this track and global fallback is disabled.")
+        return self.fallback
+
+
+def load_partitions(feed, index_cls=ExactIndex):
+    """Local shards keyed by partition_key(TrackName, Year)."""
+    combined = without_held_out(load_combined(feed))
+    spec = FEEDS[feed]
+    shards = {}
+    for (track, year), group in combined.groupby(["TrackName", "Year"]):
+        ids = [f"{year}_{i}" for i in group.index]
+        shards[partition_key(track, year)] = index_cls(
+            group[spec["feature_cols"]].fillna(0).values,
+            group[metadata_columns(feed, group)].to_dict(orient="records"),
+            ids,
+            group["Weight"].values if "Weight" in group.columns else None,
+        )
+    return shards
+
+
+def get_routed_index(feed, track=None, seasons=None, fallback=None, backend=None):
+    """Index scoped to the current race's partitions.
+
+    RACE_TRACK (e.g. "United States Grand Prix") selects the track, RACE_SEASONS
+    ("2023,2024") optionally narrows the seasons and PARTITION_FALLBACK=0 disables
+    falling back to the global index when the track has no partition. Without a
+    track this is just the global index.
+    """
+    track = track or os.getenv("RACE_TRACK")
+    if not track:
+        return get_index(feed, backend)
+    if seasons is None and os.getenv("RACE_SEASONS"):
+        seasons = [int(s) for s in os.getenv("RACE_SEASONS").split(",")]
+    if fallback is None:
+        fallback = os.getenv("PARTITION_FALLBACK", "1") == "1"
+
+    backend = backend or os.getenv("SEARCH_BACKEND", "pinecone")
+    routed = (feed, backend, "routed", track, tuple(seasons or ()), fallback)
+    if routed in _indexes:
+        return _indexes[routed]
+    prefix = partition_key(track, 0)[:-1]
+    if backend == "pinecone":
+        global_index = get_index(feed, backend)
+        namespaces = global_index.index.describe_index_stats().get("namespaces", {})
+        shards = {ns: PineconeIndex(global_index.index, ns) for ns in namespaces}
+        race = held_out_race()
+        if race is not None:
+            shards.pop(partition_key(*race), None)
+    else:
+        key = (feed, backend, "partitions")
+        if key not in _indexes:
+            _indexes[key] = load_partitions(feed, IVFIndex if backend == "ivf" else ExactIndex)
+        shards = _indexes[key]
+
+    selected = []
+    for name, shard in sorted(shards.items()):
+        season = name[len(prefix):]
+        # "<track>-<year>" only: another track whose slug extends this one (or a stray namespace) is skipped
+        if name.startswith(prefix) and season.isdigit() and (not seasons or int(season) in seasons):
+            selected.append(shard)
+    print(f"🧭 {feed}: routing to {len(selected)} partition(s) for {track}")
+    _indexes[routed] = RoutedIndex(selected, get_index(feed, backend) if fallback else None)
+    return _indexes[routed]
+
+
+# ---------- Backend Selection ----------
+_pinecone_client = None
+_indexes = {}
+_executor = None
+
+
+def _query_pool():
+    """Threads for fanning a batch out to Pinecone (PINECONE_QUERY_THREADS, default 20: one per car)."""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=int(os.getenv("PINECONE_QUERY_THREADS", "20")))
+    return _executor
+
+
+def get_index(feed, backend=None):
+    """Shared index for a feed. SEARCH_BACKEND picks pinecone (default), exact, ivf or standin
+    (exact plus a STANDIN_LATENCY_MS round trip per query, like a hosted index)."""
+    global _pinecone_client
+    backend = backend or os.getenv("SEARCH_BACKEND", "pinecone")
+    key = (feed, backend)
+    if key not in _indexes:
+        if backend == "pinecone":
+            if _pinecone_client is None:
+                from pinecone import Pinecone
+                _pinecone_client = Pinecone(api_key=os.getenv("API_KEY"))
+            _indexes[key] = PineconeIndex(_pinecone_client.Index(FEEDS[feed]["index_name"]))
+        elif backend == "exact":
+            _indexes[key] = load_feed_index(feed)
+        elif backend == "ivf":
+            _indexes[key] = load_feed_index(feed, IVFIndex)
+        elif backend == "standin":
+            _indexes[key] = LatencyStandIn(load_feed_index(feed), float(os.getenv("STANDIN_LATENCY_MS", "25")))
+        else:
+            raise ValueError(f"Unknown SEARCH_BACKEND: {backend}")
+    return _indexes[key]
+
+
+# ---------- Loading ----------
+def load_feed_index(feed, index_cls=ExactIndex, **kwargs):
+    """Build a local index from the combined CSV the *_upload.py script saved."""
+    spec = FEEDS[feed]
+    combined = without_held_out(load_combined(feed))
+    vectors = combined[spec["feature_cols"]].fillna(0).values
+    metadata = combined[metadata_columns(feed, combined)].to_dict(orient="records")
+    # Same ids the upload scripts use, so results line up with the Pinecone index
+    ids = [f"{year}_{i}" for i, year in zip(combined.index, combined["Year"])]
+    weights = combined["Weight"].values if "Weight" in combined.columns else None
+    return index_cls(vectors, metadata, ids, weights, **kwargs)
+
+
+def metadata_columns(feed, df):
+    """Feed metadata columns, plus Weight / Drivers when the corpus was compacted."""
+    return FEEDS[feed]["metadata_cols"] + [c for c in ("Weight", "Drivers") if c in df.columns]
+
+
+def synthetic_corpus(feed, n, seed=0):
+    """Random vectors shaped like a feed's normalized features (see FEEDS kinds)."""
+    rng = np.random.default_rng(seed)
+    columns = []
+    for kind in FEEDS[feed]["kinds"]:
+        if kind == "track":
+            columns.append(rng.choice([0.0, 0.5, 1.0], size=n))
+        elif kind == "compound":
+            columns.append(rng.choice([0.2, 0.4, 0.6, 0.8, 1.0], size=n))
+        elif kind == "binary":
+            columns.append((rng.random(n) < 0.1).astype(float))
+        else:
+            columns.append(rng.beta(2.0, 2.0, size=n))
+    return np.stack(columns, axis=1).astype(np.float32)
+
+
+# ---------- Helper Functions ----------
+def load_combined(feed):
+    import pandas as pd
+
+    path = FEEDS[feed]["combined_csv"]
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"❌ {path} not found. Run the {feed} upload script first.")
+    return pd.read_csv(path)
+
+
+def without_held_out(df):
+    """Drop the race the dataset replay is playing back (replay.held_out_race)."""
+    race = held_out_race()
+    if race is None:
+        return df
+    return df[(df["TrackName"] != race[0]) | (df["Year"] != race[1])]
+
+
+def _normalize(queries):
+    queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+    norms = np.linalg.norm(queries, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return queries / norms
+
+
+def _top_k(scores, top_k):
+    top_k = min(top_k, scores.shape[1])
+    if top_k == 0:
+        return scores[:, :0], np.zeros((len(scores), 0), dtype=np.int64)
+    part = np.argpartition(-scores, top_k - 1, axis=1)[:, :top_k]
+    part_scores = np.take_along_axis(scores, part, axis=1)
+    order = np.argsort(-part_scores, axis=1)
+    return np.take_along_axis(part_scores, order, axis=1), np.take_along_axis(part, order, axis=1)
+
+
+def _as_response(index, scores, positions, include_metadata):
+    matches = []
+    for score, pos in zip(scores, positions):
+        if pos < 0:
+            continue
+        match = {"id": index.ids[pos], "score": float(score)}
+        if include_metadata:
+            match["metadata"] = index.metadata[pos]
+        matches.append(match)
+    return {"matches": matches}
+
+
+def _assign(unit, centroids, chunk_bytes=64 << 20):
+    """Nearest centroid per row, scoring a chunk of rows at a time (never the full N×k matrix)."""
+    rows = max(chunk_bytes // (4 * max(len(centroids), 1)), 1)
+    assignment = np.empty(len(unit), dtype=np.int64)
+    for start in range(0, len(unit), rows):
+        assignment[start:start + rows] = np.argmax(unit[start:start + rows] @ centroids.T, axis=1)
+    return assignment
+
+
+def _kmeans(unit, k, seed, iterations=10, sample=50_000):
+    """Spherical k-means on a sample of the corpus (centroids stay unit length)."""
+    rng = np.random.default_rng(seed)
+    if len(unit) > max(sample, k):
+        unit = unit[rng.choice(len(unit), max(sample, k), replace=False)]
+    centroids = unit[rng.choice(len(unit), k, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = _assign(unit, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, unit)
+        filled = np.bincount(assignment, minlength=k) > 0
+        centroids[filled] = sums[filled]  # empty clusters keep their old centroid
+        centroids = _normalize(centroids)
+    return centroids
@@ -0,0 +1,198 @@
+# workers.py
+"""Multi-worker serving: one leader computes the ticks, every worker serves clients.
+
+Set STREAM_BUS to a Unix socket path (gateway.py does this for WEB_WORKERS > 1).
+The first worker to take the lock next to it becomes the leader. It runs
+the feed producers and pushes every frame over the socket to the other
+workers. Followers never compute: they publish received frames into their
+local hubs, so encodings, deltas and backpressure work as in one process. If
+the leader exits, its lock is released and the next follower to reconnect
+takes over.
+
+Followers report how many local clients each feed has, so the leader ticks
+only while some worker is serving that feed, not merely while followers are
+connected.
+
+Wire format: 4-byte big-endian length, then JSON. Leader → follower:
+{"feed": name, "data": frame}. Follower → leader: {"feed": name, "listeners": n},
+sent on connect and whenever the count changes.
+"""
+import asyncio
+import fcntl
+import json
+import os
+import struct
+
+STREAM_BUS = os.getenv("STREAM_BUS")
+# Frames buffered per follower before it is dropped (it reconnects and gets the latest frame)
+FOLLOWER_BUFFER_BYTES = int(os.getenv("FOLLOWER_BUFFER_BYTES", str(4 * 1024 * 1024)))
+# How often a follower re-checks its listener counts (disconnects are picked up on this cadence)
+FOLLOWER_REPORT_S = float(os.getenv("FOLLOWER_REPORT_S", "0.5"))
+LENGTH = struct.Struct(">I")
+
+
+def tagged(name, text):
+    """One feed frame tagged with its feed name (same shape as the gateway's /ws/race)."""
+    return f'{{"feed": "{name}", "data": {text}}}'
+
+
+class FollowerRelay:
+    """Producer relay target that forwards one feed's frames to the follower workers."""
+
+    def __init__(self, bus, name):
+        self.bus = bus
+        self.name = name
+
+    def __len__(self):
+        return sum(counts.get(self.name, 0) for counts in self.bus.followers.values())
+
+    def publish(self, payload, keyframe=True):
+        self.bus.send(tagged(self.name, payload))
+
+
+class StreamBus:
+    def __init__(self, path):
+        self.path = path
+        self.producers = {}
+        self.followers = {}  # StreamWriter → {feed: listeners}, leader only
+        self.leader = False
+        self.lock = None
+        self.task = None
+        self.received = 0
+        self.writer = None  # connection to the leader, follower only
+        self.reported = {}  # {feed: listeners} last sent to the leader
+
+    def register(self, producer):
+        self.producers[producer.name] = producer
+        producer.add_relay(FollowerRelay(self, producer.name), lambda text: text)
+        return self
+
+    def ensure_running(self):
+        if self.task is None or self.task.done():
+            self._elect()
+            self.task = asyncio.create_task(self._lead() if self.leader else self._follow())
+
+    def stats(self):
+        return {"role": "leader" if self.leader else "follower",
+                "followers": len(self.followers),
+                "follower_listeners": {name: len(FollowerRelay(self, name)) for name in self.producers},
+                "frames_received": self.received}
+
+    # ---------- Election ----------
+    def _elect(self):
+        if self.leader:
+            return
+        lock = open(f"{self.path}.lock", "w")
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock.close()
+            return
+        self.lock, self.leader = lock, True
+        print(f"👑 Worker {os.getpid()} is the stream leader")
+
+    # ---------- Leader ----------
+    async def _lead(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path)  # stale socket from a previous leader
+        server = await asyncio.start_unix_server(self._on_follower, path=self.path)
+        async with server:
+            await server.serve_forever()
+
+    async def _on_follower(self, reader, writer):
+        counts = self.followers[writer] = {}
+        for name, producer in self.producers.items():
+            # Catch the new worker up with the latest frame
+            if producer.hub.seed:
+                self._write(writer, tagged(name, producer.hub.seed[-1]))
+        try:
+            while True:
+                message = await self._read(reader)
+                producer = self.producers.get(message["feed"])
+                if producer is None:
+                    continue
+                counts[message["feed"]] = int(message["listeners"])
+                if counts[message["feed"]]:
+                    producer.ensure_running()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass  # follower exited; its clients no longer count
+        finally:
+            self.followers.pop(writer, None)
+            writer.close()
+
+    def send(self, text):
+        for writer in list(self.followers):
+            if writer.transport.get_write_buffer_size() > FOLLOWER_BUFFER_BYTES:
+                print("🐢 Dropping stalled follower worker")
+                self.followers.pop(writer, None)
+                writer.close()
+                continue
+            self._write(writer, text)
+
+    @staticmethod
+    def _write(writer, text):
+        data = text.encode()
+        writer.write(LENGTH.pack(len(data)) + data)
+
+    @staticmethod
+    async def _read(reader):
+        (length,) = LENGTH.unpack(await reader.readexactly(LENGTH.size))
+        return json.loads(await reader.readexactly(length))
+
+    # ---------- Follower ----------
+    async def _follow(self):
+        while not self.leader:
+            try:
+                reader, writer = await asyncio.open_unix_connection(self.path)
+            except OSError:
+                await asyncio.sleep(0.2)  # leader still starting
+                self._elect()
+                continue
+            self.writer, self.reported = writer, {}
+            reporter = asyncio.create_task(self._report_forever())
+            try:
+                while True:
+                    message = await self._read(reader)
+                    producer = self.producers.get(message["feed"])
+                    if producer is not None:
+                        self.received += 1
+                        producer.publish(message["data"])
+            except (asyncio.IncompleteReadError, ConnectionError):
+                print("⚠️ Stream leader went away, re-electing")
+            finally:
+                reporter.cancel()
+                self.writer = None
+                writer.close()
+            self._elect()
+
+        # Took over as leader: serve the other workers and restart local ticks
+        for producer in self.producers.values():
+            producer.ensure_running()
+        await self._lead()
+
+    def report(self):
+        """Tell the leader about any feed whose local listener count changed."""
+        if self.writer is None or self.writer.is_closing():
+            return
+        for name, producer in self.producers.items():
+            listeners = producer.listeners
+            if self.reported.get(name) != listeners:
+                self.reported[name] = listeners
+                self._write(self.writer, json.dumps({"feed": name, "listeners": listeners}))
+
+    async def _report_forever(self):
+        # New clients report at once (FeedProducer.ensure_running); this catches disconnects
+        while True:
+            self.report()
+            await asyncio.sleep(FOLLOWER_REPORT_S)
+
+
+_bus = None
+
+
+def get_bus():
+    """Shared bus for this worker when STREAM_BUS is set, else None (single process)."""
+    global _bus
+    if STREAM_BUS and _bus is None:
+        _bus = StreamBus(STREAM_BUS)
+    return _bus
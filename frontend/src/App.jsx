@@ -1,4 +1,4 @@
-import { useEffect, useRef, useState } from "react";
+import { useEffect, useState } from "react";
 import "./App.css";
 import carGif from "./assets/car.gif";
 
@@ -8,13 +8,9 @@ function App() {
   const [undercutData, setUndercutData] = useState({});
   const [strategy, setStrategy] = useState("Not enough Data");
 
-  const overtakeRefresh = useRef(0);
-  const cliffRefresh = useRef(0);
-  const undercutRefresh = useRef(0);
-
   // --- WebSocket logic extracted into a separate function ---
   const connectWebSocket = () => {
-    const ws = new WebSocket("ws://localhost:8000/ws/overtakes");
+    const ws = new WebSocket("ws://localhost:8080/ws/overtakes");
 
     ws.onopen = () => console.log("✅ Connected to WebSocket!");
 
@@ -25,13 +21,10 @@ function App() {
       // Filter out "refresh_count" and only keep drivers with value > 0
       const filtered = Object.fromEntries(
         Object.entries(msg).filter(
-          ([key, value]) => key !== "refresh_count" && value > 0
+          ([key, value]) => key !== "refresh_count" && key !== "_meta" && value > 0
         )
       );
       setOvertakeData(filtered);
-      localStorage.setItem("overtake", JSON.stringify(filtered));
-      overtakeRefresh.current = msg.refresh_count || 0;
-      tryCallGemini();
     };
 
     ws.onclose = () => console.log("⚠️ WebSocket closed.");
@@ -41,7 +34,7 @@ function App() {
   };
 
   const cliffProbability = () => {
-    const ws = new WebSocket("ws://localhost:8001/ws/cliff");
+    const ws = new WebSocket("ws://localhost:8080/ws/cliff");
 
     ws.onopen = () => console.log("✅ Connected to cliff!");
 
@@ -56,9 +49,6 @@ function App() {
       console.log("cliff", event.data.refresh_count);
 
       setCliffData(driversData?.MY_CAR);
-      localStorage.setItem("cliff", JSON.stringify(driversData?.MY_CAR));
-      cliffRefresh.current = event.data.refresh_countt || 0;
-      tryCallGemini();
     };
 
     ws.onclose = () => console.log("⚠️ WebSocket closed.");
@@ -68,7 +58,7 @@ function App() {
   };
 
   const undercutProbability = () => {
-    const ws = new WebSocket("ws://localhost:8002/ws/undercuts");
+    const ws = new WebSocket("ws://localhost:8080/ws/undercuts");
 
     ws.onopen = () => console.log("✅ Connected to undercit!");
 
@@ -81,11 +71,8 @@ function App() {
         Object.entries(data).filter(([key]) => key !== "refresh_count")
       );
       console.log("undercut", driversData);
-      undercutRefresh.current = event.data.refresh_count || 0;
 
       setUndercutData(driversData?.MY_CAR);
-      localStorage.setItem("undercuts", JSON.stringify(driversData?.MY_CAR));
-      tryCallGemini();
     };
 
     ws.onclose = () => console.log("⚠️ WebSocket closed.");
@@ -94,49 +81,36 @@ function App() {
     return ws; // Optional: return ws for cleanup
   };
 
-  const callGeminiStrategy = async () => {
-    try {
-      const overtake = JSON.parse(localStorage.getItem("overtake") || "{}");
-      const cliff = JSON.parse(localStorage.getItem("cliff") || "{}");
-      const undercut = JSON.parse(localStorage.getItem("undercuts") || "{}");
-
-      console.log("sending", overtake, cliff, undercut);
-
-      const response = await fetch("http://localhost:8010/api/strategy", {
-        method: "POST",
-        headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({
-          overtake_data: overtake,
-          tire_data: cliff,
-          pit_data: undercut,
-        }),
-      });
-
-      if (!response.ok) throw new Error(`Server returned ${response.status}`);
-      const data = await response.json();
-      console.log("🧠 Gemini Strategy:", data.strategy);
-      setStrategy(data.strategy);
-    } catch (error) {
-      console.error("❌ Gemini API call failed:", error);
-    }
-  };
+  // --- Strategy pushed by the gateway whenever the race situation changes ---
+  const strategyStream = () => {
+    const ws = new WebSocket("ws://localhost:8080/ws/strategy");
+    let key = null;
+    let enriched = false;
 
-  const tryCallGemini = () => {
-    if (
-      overtakeRefresh.current % 10 === 0 &&
-      cliffRefresh.current % 10 === 0 &&
-      undercutRefresh.current % 10 === 0
-    ) {
-      console.log("⏱️ Aggregated 5-refresh snapshot, calling Gemini...");
-      callGeminiStrategy(overtakedata, cliffData, undercutData);
-    } else {
-      console.log(
-        "na",
-        overtakeRefresh.current,
-        cliffRefresh.current,
-        undercutRefresh.current
-      );
-    }
+    ws.onopen = () => console.log("✅ Connected to strategy!");
+
+    ws.onmessage = (event) => {
+      const msg = JSON.parse(event.data);
+      if (msg.type === "local") {
+        // Local call first; the model text for the same situation replaces it
+        key = msg.key;
+        enriched = false;
+        setStrategy(msg.summary);
+      } else if (msg.type === "strategy" && msg.key === key && !enriched) {
+        if (msg.error) {
+          console.error("❌ Gemini strategy failed:", msg.error);
+          return;
+        }
+        console.log("🧠 Gemini Strategy:", msg.strategy);
+        enriched = true;
+        setStrategy(msg.strategy);
+      }
+    };
+
+    ws.onclose = () => console.log("⚠️ WebSocket closed.");
+    ws.onerror = (err) => console.error("❌ WebSocket error:", err);
+
+    return ws;
   };
 
   // --- Initialize WebSocket once ---
@@ -144,11 +118,13 @@ function App() {
     const overtake = connectWebSocket();
     const cliff = cliffProbability();
     const undercut = undercutProbability();
+    const strategyWs = strategyStream();
 
     return () => {
       overtake.close();
       cliff.close();
       undercut.close();
+      strategyWs.close();
     };
   }, []);
 